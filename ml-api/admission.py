@@ -0,0 +1,114 @@
+"""Admission control for /predict-coins.
+
+Each request takes a slot before it reaches the model. It is refused
+(shed) when ``max_in_flight`` requests already hold one, or when its
+predicted completion time exceeds its deadline. The route serves shed
+requests with the rule-based fallback instead of queueing them, so latency
+stays bounded while the service is saturated.
+
+The prediction treats the ``workers`` threads as processor-sharing
+servers. With n requests in flight, each progresses at ``workers / n`` of
+full speed once n exceeds ``workers``. Requests that complete feed an
+exponentially weighted mean of the undisturbed cost, meaning their elapsed
+time scaled back by the sharing they saw. A new request is then expected
+to finish after ``waited + cost * max(n + 1, workers) / workers``.
+"""
+import threading
+import time
+
+from metrics import ADMISSION_IN_FLIGHT, LOAD_SHED
+
+# Weight of the newest sample in the cost estimate and the recent shed rate
+COST_SMOOTHING = 0.1
+SHED_RATE_SMOOTHING = 0.01
+
+
+class Ticket:
+    """An admitted request's slot; reason says why a request was shed (None when admitted)"""
+    __slots__ = ('admitted', 'reason', 'started', 'sharing')
+
+    def __init__(self, admitted, reason=None, started=0.0, sharing=1.0):
+        self.admitted = admitted
+        self.reason = reason
+        self.started = started
+        self.sharing = sharing
+
+
+class AdmissionController:
+    """Concurrency limit plus a deadline check against the predicted completion time"""
+
+    def __init__(self, max_in_flight=64, deadline_seconds=1.0, workers=1):
+        # 0 disables either check
+        self.max_in_flight = max_in_flight
+        self.deadline_seconds = deadline_seconds
+        self.workers = max(1, workers)
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = {'concurrency': 0, 'deadline': 0}
+        self.cost_seconds = None
+        self.recent_shed_rate = 0.0
+        self._lock = threading.Lock()
+
+    def _sharing(self, in_flight):
+        return max(in_flight, self.workers) / self.workers
+
+    def admit(self, deadline_seconds=None, waited=0.0):
+        """Take a slot or refuse; waited is time already spent since the request arrived"""
+        deadline = self.deadline_seconds if deadline_seconds is None else deadline_seconds
+        with self._lock:
+            reason = None
+            if self.max_in_flight > 0 and self.in_flight >= self.max_in_flight:
+                reason = 'concurrency'
+            elif deadline > 0 and self.in_flight > 0:
+                # An idle service always admits, so a stale estimate cannot
+                # shed every request (and before any request completes there
+                # is nothing to predict from)
+                cost = self.cost_seconds or 0.0
+                if waited + cost * self._sharing(self.in_flight + 1) > deadline:
+                    reason = 'deadline'
+            if reason is None:
+                self.in_flight += 1
+                self.admitted += 1
+                sharing = self._sharing(self.in_flight)
+            else:
+                self.shed[reason] += 1
+            self.recent_shed_rate += SHED_RATE_SMOOTHING * ((reason is not None) - self.recent_shed_rate)
+            in_flight = self.in_flight
+        ADMISSION_IN_FLIGHT.set(in_flight)
+        if reason is not None:
+            LOAD_SHED.inc(label=reason)
+            return Ticket(False, reason)
+        return Ticket(True, started=time.perf_counter(), sharing=sharing)
+
+    def release(self, ticket):
+        """Free an admitted request's slot and learn from its duration"""
+        if not ticket.admitted:
+            return
+        elapsed = time.perf_counter() - ticket.started
+        with self._lock:
+            # Average of the sharing at admission and at completion
+            sharing = (ticket.sharing + self._sharing(self.in_flight)) / 2
+            cost = elapsed / sharing
+            if self.cost_seconds is None:
+                self.cost_seconds = cost
+            else:
+                self.cost_seconds += COST_SMOOTHING * (cost - self.cost_seconds)
+            self.in_flight -= 1
+            in_flight = self.in_flight
+        ADMISSION_IN_FLIGHT.set(in_flight)
+
+    def stats(self):
+        with self._lock:
+            shed = dict(self.shed)
+            total = self.admitted + sum(shed.values())
+            return {
+                "max_in_flight": self.max_in_flight,
+                "deadline_ms": self.deadline_seconds * 1000,
+                "workers": self.workers,
+                "in_flight": self.in_flight,
+                "admitted": self.admitted,
+                "shed": shed,
+                "shed_rate": sum(shed.values()) / total if total else 0.0,
+                "recent_shed_rate": self.recent_shed_rate,
+                "estimated_cost_ms": self.cost_seconds * 1000 if self.cost_seconds is not None else None,
+            }
@@ -1,92 +1,414 @@
 import sys
 import os
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'ml_model')))
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 import numpy as np
-import tensorflow as tf
-from tensorflow import keras
-import joblib
+import importlib.util
+import itertools
 import json
+import time
 from datetime import datetime
 import os
+from inference import (
+    DEFAULT_CONFIDENCE_STD, ENGINES, PRECISIONS, DenseStack, build_engine, confidence_label, load_artifact,
+    parity_error
+)
+from admission import AdmissionController
+from batching import MicroBatcher
+from cache import PredictionCache
+from decoding import ExpenseRequest, RequestValidationError, build_category_index
+from feature_store import FeatureStore
+from forecasting import MAX_DAILY_AMOUNT, forecast_spending
+from logs import configure_logging, get_logger
+from prediction_log import PredictionLog
+from registry import ModelRegistry, parse_traffic, validate_version
+from retraining import RetrainManager, RetrainUnavailable
+from metrics import (
+    CONTENT_TYPE, FALLBACK_PREDICTIONS, HTTP_REQUEST_SECONDS, MODEL_LOAD_SECONDS,
+    MODEL_LOADS, PREDICT_STAGE_SECONDS, REGISTRY, SamplingProfiler
+)
 
 app = Flask(__name__)
 CORS(app)
 
+# Structured logs: 'json' (one object per line) or 'text', written by a background thread
+configure_logging(os.environ.get('ML_LOG_LEVEL', 'INFO'), os.environ.get('ML_LOG_FORMAT', 'json'))
+logger = get_logger('service')
+
+# Upper bound on expenses accepted by /predict-coins/batch in one request
+MAX_BATCH_SIZE = int(os.environ.get('ML_MAX_BATCH_SIZE', 10000))
+# Upper bound on users accepted by /forecast-spending in one request
+MAX_FORECAST_USERS = int(os.environ.get('ML_MAX_FORECAST_USERS', 100000))
+
+# Forward-pass engine: 'numpy' (exported Dense weights), 'keras_call' (traced
+# model call) or 'keras' (model.predict)
+INFERENCE_ENGINE = os.environ.get('ML_INFERENCE_ENGINE', 'numpy')
+# Max allowed |engine - model.predict| before falling back to Keras
+PARITY_TOLERANCE = float(os.environ.get('ML_PARITY_TOLERANCE', 1e-3))
+
+# Model artifact: 'npz' (NumPy-only weights), 'h5' (Keras, imports TensorFlow)
+# or 'auto' (npz when present, else h5)
+MODEL_FORMAT = os.environ.get('ML_MODEL_FORMAT', 'auto')
+# Weight precision of the npz artifact: 'float32', 'float16' or 'int8'
+# (spending_model_<precision>.npz, written by train_spending_model.py)
+MODEL_PRECISION = os.environ.get('ML_MODEL_PRECISION', 'float32')
+# Directory holding the served model artifacts
+MODEL_DIR = os.environ.get(
+    'ML_MODEL_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ml_model', 'ml_model')
+)
+# Additional model versions served next to ML_MODEL_DIR's, each a directory
+# under ML_MODEL_VERSIONS_DIR (comma-separated names, empty for none)
+MODEL_VERSIONS_DIR = os.environ.get('ML_MODEL_VERSIONS_DIR', os.path.join(MODEL_DIR, 'versions'))
+MODEL_VERSIONS = [v.strip() for v in os.environ.get('ML_MODEL_VERSIONS', '').split(',') if v.strip()]
+# Weighted A/B split for requests without a model_version, e.g. '1.0=90,2.0=10'
+# (empty sends them all to ML_MODEL_DIR's version); malformed values stop the service
+MODEL_TRAFFIC = parse_traffic(os.environ.get('ML_MODEL_TRAFFIC', ''), 'ML_MODEL_TRAFFIC')
+# Version name for an ML_MODEL_DIR without model_metadata.json
+DEFAULT_MODEL_VERSION = '1.0'
+
+# Opt-in coalescing of concurrent /predict-coins calls (0 disables it)
+MICROBATCH_WINDOW_MS = float(os.environ.get('ML_MICROBATCH_WINDOW_MS', 0))
+MICROBATCH_MAX_SIZE = int(os.environ.get('ML_MICROBATCH_MAX_SIZE', 64))
+# How long a request waits for its coalesced result before falling back
+MICROBATCH_TIMEOUT = 5.0
+
+# Prediction cache for near-duplicate preview requests (0 entries disables it)
+CACHE_MAX_ENTRIES = int(os.environ.get('ML_CACHE_MAX_ENTRIES', 4096))
+CACHE_TTL_SECONDS = float(os.environ.get('ML_CACHE_TTL_SECONDS', 300))
+CACHE_AMOUNT_STEP = float(os.environ.get('ML_CACHE_AMOUNT_STEP', 0.5))
+CACHE_RATIO_STEP = float(os.environ.get('ML_CACHE_RATIO_STEP', 0.01))
+
+# Monte Carlo dropout samples per prediction for the confidence label (0 disables it)
+MC_DROPOUT_SAMPLES = int(os.environ.get('ML_MC_DROPOUT_SAMPLES', 32))
+# Upper bounds on the MC dropout std (in coins) for "high" and "medium" confidence.
+# train_spending_model.py calibrates them on each model's holdout set
+# (model_metadata.json "confidence"); these settings override the calibration
+CONFIDENCE_STD_HIGH = float(os.environ['ML_CONFIDENCE_STD_HIGH']) if os.environ.get('ML_CONFIDENCE_STD_HIGH') else None
+CONFIDENCE_STD_MEDIUM = float(os.environ['ML_CONFIDENCE_STD_MEDIUM']) if os.environ.get('ML_CONFIDENCE_STD_MEDIUM') else None
+
+# Per-request sampling profiler, requested with ?profile=1 or an X-Profile: 1 header
+PROFILING_ENABLED = os.environ.get('ML_PROFILING_ENABLED', '0') == '1'
+PROFILING_INTERVAL_MS = float(os.environ.get('ML_PROFILING_INTERVAL_MS', 1.0))
+
+# SQLite file with per-user aggregates used to fill in missing behavioural
+# features for payloads with a user_id (empty disables it)
+FEATURE_STORE_PATH = os.environ.get(
+    'ML_FEATURE_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'feature_store.sqlite3')
+)
+MONTHLY_BUDGET = float(os.environ.get('ML_MONTHLY_BUDGET', 2000))
+
+# Directory for rotating CSV logs of served predictions, readable by
+# train_spending_model.py --csv (opt-in: empty, the default, disables it)
+PREDICTION_LOG_DIR = os.environ.get('ML_PREDICTION_LOG_DIR', '')
+# Records buffered in memory before new ones are dropped
+PREDICTION_LOG_CAPACITY = int(os.environ.get('ML_PREDICTION_LOG_CAPACITY', 10000))
+PREDICTION_LOG_FLUSH_SECONDS = float(os.environ.get('ML_PREDICTION_LOG_FLUSH_SECONDS', 1.0))
+# Rows per file before rotating to a new one
+PREDICTION_LOG_MAX_ROWS = int(os.environ.get('ML_PREDICTION_LOG_MAX_ROWS', 100000))
+
+# Background retraining: a candidate is swapped in only if its holdout MAE is
+# below RETRAIN_MAX_MAE and within RETRAIN_TOLERANCE of the serving model's
+RETRAIN_EPOCHS = int(os.environ.get('ML_RETRAIN_EPOCHS', 20))
+RETRAIN_MIN_ROWS = int(os.environ.get('ML_RETRAIN_MIN_ROWS', 50))
+RETRAIN_MAX_MAE = float(os.environ.get('ML_RETRAIN_MAX_MAE', 2.5))
+RETRAIN_TOLERANCE = float(os.environ.get('ML_RETRAIN_TOLERANCE', 0.05))
+
+# Admission control for /predict-coins: requests beyond MAX_IN_FLIGHT, or
+# predicted to finish after their deadline, get the rule-based fallback at
+# once instead of queueing (0 disables each check)
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get('ML_ADMISSION_MAX_IN_FLIGHT', 64))
+ADMISSION_DEADLINE_MS = float(os.environ.get('ML_ADMISSION_DEADLINE_MS', 1000))
+# Predictions that run in parallel, for the completion-time estimate
+ADMISSION_WORKERS = int(os.environ.get('ML_ADMISSION_WORKERS', os.cpu_count() or 1))
+# Upper bound on a request's own deadline_ms
+MAX_DEADLINE_MS = 60000
+
+HEALTHY_CATEGORIES = frozenset(['food', 'healthcare', 'education', 'savings', 'utilities'])
+
+class ModelBundle:
+    """One loaded model with its scaler, encoder and inference engine.
+    
+    Requests read ``MLModelService.bundle`` once and use only that object,
+    so swapping in a new bundle (a single reference assignment) never mixes
+    components of two models within one request.
+    """
+    __slots__ = ('model', 'scaler', 'category_encoder', 'category_index', 'model_format', 'precision',
+                 'engine_name', 'engine_parity_error', 'forward', 'sampler', 'generation', 'source', 'version',
+                 'confidence_thresholds')
+    
+    _generations = itertools.count(1)
+    
+    def __init__(self, model, scaler, category_encoder, model_format, source, version=DEFAULT_MODEL_VERSION):
+        self.model = model
+        self.scaler = scaler
+        self.category_encoder = category_encoder
+        self.category_index = build_category_index(category_encoder.classes_)
+        self.model_format = model_format
+        self.precision = getattr(model, 'precision', 'float32')
+        self.source = source
+        # From model_metadata.json; the registry may serve it under another name
+        self.version = version
+        # Distinguishes cache entries computed by different bundles
+        self.generation = next(self._generations)
+        self.engine_name = None
+        self.engine_parity_error = None
+        self.forward = None
+        # DenseStack with the model's dropout rates, for MC dropout
+        self.sampler = None
+        # (high, medium) MC dropout std bounds for the confidence label
+        self.confidence_thresholds = DEFAULT_CONFIDENCE_STD
+
+def _bundle_attribute(name):
+    return property(lambda self: getattr(self.bundle, name) if self.bundle is not None else None)
+
 # Load the trained model
 class MLModelService:
+    # Read-only views of the default version's bundle
+    model = _bundle_attribute('model')
+    scaler = _bundle_attribute('scaler')
+    category_encoder = _bundle_attribute('category_encoder')
+    category_index = _bundle_attribute('category_index')
+    model_format = _bundle_attribute('model_format')
+    precision = _bundle_attribute('precision')
+    engine_name = _bundle_attribute('engine_name')
+    engine_parity_error = _bundle_attribute('engine_parity_error')
+    forward = _bundle_attribute('forward')
+    
+    @property
+    def bundle(self):
+        return self.registry.bundle()
+    
     def __init__(self):
-        self.model = None
-        self.scaler = None
-        self.category_encoder = None
+        self.registry = ModelRegistry()
+        self.rng = np.random.default_rng()
+        self.batcher = None
+        self.cache = None
+        self.feature_store = FeatureStore(FEATURE_STORE_PATH, MONTHLY_BUDGET) if FEATURE_STORE_PATH else None
+        self.prediction_log = None
+        if PREDICTION_LOG_DIR:
+            self.prediction_log = PredictionLog(
+                PREDICTION_LOG_DIR,
+                capacity=PREDICTION_LOG_CAPACITY,
+                flush_interval=PREDICTION_LOG_FLUSH_SECONDS,
+                max_file_rows=PREDICTION_LOG_MAX_ROWS
+            )
         self.load_model()
-    
-    def load_model(self):
-        # Get absolute path to the model directory (now inside ml-api)
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        model_path = os.path.join(current_dir, 'ml_model', 'ml_model')
+        self.load_versions(MODEL_VERSIONS, MODEL_TRAFFIC)
         
-        print(f"Looking for model at: {model_path}")
-        print(f"Model files exist: {os.path.exists(os.path.join(model_path, 'spending_model.h5'))}")
+        if CACHE_MAX_ENTRIES > 0:
+            self.cache = PredictionCache(
+                max_entries=CACHE_MAX_ENTRIES,
+                ttl_seconds=CACHE_TTL_SECONDS,
+                amount_step=CACHE_AMOUNT_STEP,
+                ratio_step=CACHE_RATIO_STEP
+            )
         
+        if MICROBATCH_WINDOW_MS > 0:
+            self.batcher = MicroBatcher(
+                self._score_coalesced,
+                window_ms=MICROBATCH_WINDOW_MS,
+                max_batch_size=MICROBATCH_MAX_SIZE
+            )
+    
+    def after_fork(self):
+        """Reinitialize per-process state in a worker forked from a preloaded master"""
+        if self.batcher is not None:
+            self.batcher.after_fork()
+        if self.feature_store is not None:
+            self.feature_store.reset_connection()
+        if self.prediction_log is not None:
+            self.prediction_log.after_fork()
+    
+    def load_model(self, model_path=None):
+        """(Re)load the model from model_path and swap it in, or fall back to rules on failure"""
+        started = time.perf_counter()
+        model_path = model_path or MODEL_DIR
+        logger.info("Loading model", extra={"model_path": model_path})
+        
+        bundle = None
         try:
-            # Try multiple approaches to load the model
-            print("Attempting to load TensorFlow model...")
-            
-            # Check what files we have
-            h5_path = os.path.join(model_path, 'spending_model.h5')
-            print(f"H5 file exists: {os.path.exists(h5_path)}")
-            
-            # Approach 1: Load H5 with compatibility settings
+            bundle = self.load_bundle(model_path)
+            MODEL_LOADS.inc(label=bundle.model_format)
+        except Exception as e:
+            logger.error("Model load failed, using the rule-based fallback",
+                         extra={"model_path": model_path, "error": str(e)})
+            MODEL_LOADS.inc(label='failed')
+        
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - started)
+        self.swap_bundle(bundle)
+        return bundle
+    
+    def load_versions(self, versions, traffic=None):
+        """Load extra versions from MODEL_VERSIONS_DIR next to the default one, then apply the A/B weights"""
+        for version in versions:
+            try:
+                self.load_version(version)
+            except Exception as e:
+                logger.error("Model version load failed", extra={"version": version, "error": str(e)})
+        if traffic:
             try:
-                # Try with safe mode disabled and custom objects
-                with tf.keras.utils.custom_object_scope({
-                    'mse': tf.keras.losses.MeanSquaredError(),
-                    'mean_squared_error': tf.keras.losses.MeanSquaredError(),
-                    'mae': tf.keras.metrics.MeanAbsoluteError(),
-                    'mean_absolute_error': tf.keras.metrics.MeanAbsoluteError(),
-                }):
-                    self.model = tf.keras.models.load_model(
-                        h5_path,
-                        compile=False,
-                        safe_mode=False  # Disable safe mode for compatibility
-                    )
-                
-                # Recompile with current TensorFlow version
-                self.model.compile(
-                    optimizer='adam',
-                    loss='mse',
-                    metrics=['mae']
+                self.registry.set_routing(traffic)
+            except RequestValidationError as e:
+                logger.error("Ignoring ML_MODEL_TRAFFIC", extra={"traffic": traffic, "error": str(e)})
+    
+    def load_version(self, version):
+        """Load (or reload) MODEL_VERSIONS_DIR/<version> and publish it under that name"""
+        path = os.path.join(MODEL_VERSIONS_DIR, validate_version(version))
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"No model directory for version '{version}' at {path}")
+        bundle = self.load_bundle(path)
+        MODEL_LOADS.inc(label=bundle.model_format)
+        self.registry.publish(version, bundle)
+        logger.info("Model version published", extra={"version": version, "path": path})
+        return bundle
+    
+    def load_bundle(self, model_path):
+        """Load a model directory into a ready-to-serve ModelBundle without publishing it"""
+        npz_path = os.path.join(model_path, 'spending_model.npz')
+        if MODEL_PRECISION != 'float32':
+            variant_path = os.path.join(model_path, f'spending_model_{MODEL_PRECISION}.npz')
+            if MODEL_PRECISION not in PRECISIONS:
+                logger.warning("Unknown model precision, using float32", extra={"precision": MODEL_PRECISION})
+            elif MODEL_FORMAT == 'h5':
+                logger.warning("Model precision needs the npz format, using float32",
+                               extra={"precision": MODEL_PRECISION})
+            elif not os.path.exists(variant_path):
+                logger.warning("No artifact for model precision, using float32",
+                               extra={"precision": MODEL_PRECISION, "path": variant_path})
+            else:
+                npz_path = variant_path
+        metadata_path = os.path.join(model_path, 'model_metadata.json')
+        metadata = {}
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as f:
+                metadata = json.load(f)
+        version = str(metadata.get('version', DEFAULT_MODEL_VERSION))
+        if MODEL_FORMAT == 'npz' or (MODEL_FORMAT == 'auto' and os.path.exists(npz_path)):
+            # Slim artifact: NumPy only, no TensorFlow/scikit-learn/joblib import
+            bundle = ModelBundle(*load_artifact(npz_path), model_format='npz', source=model_path, version=version)
+            logger.info("Model loaded", extra={"model_format": 'npz', "precision": bundle.precision, "path": npz_path})
+        else:
+            bundle = ModelBundle(*self._load_keras_model(model_path), model_format='h5', source=model_path,
+                                 version=version)
+        
+        bundle.engine_name, bundle.forward, bundle.engine_parity_error = \
+            self.select_engine(bundle.model, INFERENCE_ENGINE)
+        if MC_DROPOUT_SAMPLES > 0:
+            bundle.sampler = bundle.model if isinstance(bundle.model, DenseStack) else DenseStack.from_keras(bundle.model)
+        bundle.confidence_thresholds = self.confidence_thresholds(metadata.get('confidence'), model_path)
+        return bundle
+    
+    def confidence_thresholds(self, calibration, model_path):
+        """(high, medium) std bounds: ML_CONFIDENCE_STD_* overrides, else the model's calibration"""
+        high, medium = DEFAULT_CONFIDENCE_STD
+        if calibration:
+            high, medium = float(calibration['std_high']), float(calibration['std_medium'])
+        elif CONFIDENCE_STD_HIGH is None or CONFIDENCE_STD_MEDIUM is None:
+            logger.warning("Model has no confidence calibration, using the default std thresholds",
+                           extra={"path": model_path, "thresholds": DEFAULT_CONFIDENCE_STD})
+        if CONFIDENCE_STD_HIGH is not None:
+            high = CONFIDENCE_STD_HIGH
+        if CONFIDENCE_STD_MEDIUM is not None:
+            medium = CONFIDENCE_STD_MEDIUM
+        return high, medium
+    
+    def swap_bundle(self, bundle, version=None):
+        """Atomically publish a bundle as version (default: the default version); in-flight requests finish on the old one"""
+        if version is None:
+            version = self.registry.default_version
+        if version is None:
+            version = bundle.version if bundle is not None else DEFAULT_MODEL_VERSION
+        self.registry.publish(version, bundle)
+        # Cached predictions belong to the previous model
+        if self.cache is not None:
+            self.cache.clear()
+    
+    def _load_keras_model(self, model_path):
+        """Legacy path: load spending_model.h5 and the pickled scaler/encoder"""
+        # Imported lazily so the npz path never pays for TensorFlow
+        import tensorflow as tf
+        import joblib
+        
+        # Try multiple approaches to load the model
+        h5_path = os.path.join(model_path, 'spending_model.h5')
+        logger.debug("Loading TensorFlow model", extra={"path": h5_path, "exists": os.path.exists(h5_path)})
+        
+        # Approach 1: Load H5 with compatibility settings
+        try:
+            # Try with safe mode disabled and custom objects
+            with tf.keras.utils.custom_object_scope({
+                'mse': tf.keras.losses.MeanSquaredError(),
+                'mean_squared_error': tf.keras.losses.MeanSquaredError(),
+                'mae': tf.keras.metrics.MeanAbsoluteError(),
+                'mean_absolute_error': tf.keras.metrics.MeanAbsoluteError(),
+            }):
+                model = tf.keras.models.load_model(
+                    h5_path,
+                    compile=False,
+                    safe_mode=False  # Disable safe mode for compatibility
                 )
-                print("Model loaded with H5 compatibility mode!")
-                
-            except Exception as e1:
-                print(f"H5 compatibility approach failed: {e1}")
-                
-                # Approach 2: Recreate model architecture and load weights
-                try:
-                    print("Attempting to recreate model architecture...")
-                    self.model = self._create_model_architecture()
-                    self.model.load_weights(h5_path)
-                    print("Model recreated and weights loaded!")
-                    
-                except Exception as e2:
-                    print(f"Weight loading approach failed: {e2}")
-                    raise e2
             
-            # Load additional model components
-            self.scaler = joblib.load(os.path.join(model_path, 'scaler.pkl'))
-            self.category_encoder = joblib.load(os.path.join(model_path, 'category_encoder.pkl'))
-            print("Model and components loaded successfully!")
+            # Recompile with current TensorFlow version
+            model.compile(
+                optimizer='adam',
+                loss='mse',
+                metrics=['mae']
+            )
+            
+        except Exception as e1:
+            logger.warning("H5 compatibility load failed, recreating the architecture",
+                           extra={"path": h5_path, "error": str(e1)})
             
+            # Approach 2: Recreate model architecture and load weights
+            model = self._create_model_architecture()
+            model.load_weights(h5_path)
+        
+        # Load additional model components
+        scaler = joblib.load(os.path.join(model_path, 'scaler.pkl'))
+        category_encoder = joblib.load(os.path.join(model_path, 'category_encoder.pkl'))
+        logger.info("Model loaded", extra={"model_format": 'h5', "path": h5_path})
+        return model, scaler, category_encoder
+    
+    def select_engine(self, model, name):
+        """Pick the forward-pass engine, falling back to Keras if it disagrees with it.
+        
+        Returns ``(engine_name, forward, parity_error)``.
+        """
+        if isinstance(model, DenseStack):
+            # Loaded from the npz artifact: there is no Keras model to compare against
+            if name != 'numpy':
+                logger.warning("Inference engine needs the h5 model, using numpy", extra={"engine": name})
+            return 'numpy', model, None
+        
+        reference = build_engine('keras', model)
+        if name == 'keras':
+            return 'keras', reference, 0.0
+        if name not in ENGINES:
+            logger.warning("Unknown inference engine, using keras", extra={"engine": name})
+            return 'keras', reference, 0.0
+        
+        try:
+            engine = build_engine(name, model)
+            input_dim = model.layers[0].get_weights()[0].shape[0]
+            error = parity_error(reference, engine, input_dim)
         except Exception as e:
-            print(f"Error loading model: {e}")
-            print("Using fallback rule-based system")
-            self.model = None
+            logger.warning("Inference engine unavailable, using keras", extra={"engine": name, "error": str(e)})
+            return 'keras', reference, 0.0
+        
+        if error > PARITY_TOLERANCE:
+            logger.warning("Inference engine failed parity check, using keras",
+                           extra={"engine": name, "parity_error": error, "tolerance": PARITY_TOLERANCE})
+            return 'keras', reference, 0.0
+        
+        logger.info("Inference engine selected", extra={"engine": name, "parity_error": error})
+        return name, engine, error
     
     def _create_model_architecture(self):
         """Recreate the model architecture for weight loading"""
+        import tensorflow as tf
+        
         model = tf.keras.Sequential([
             tf.keras.layers.Dense(64, activation='relu', input_shape=(8,)),
             tf.keras.layers.Dropout(0.2),
@@ -104,46 +426,213 @@ class MLModelService:
         
         return model
     
-    def predict_coins(self, expense_data):
-        if self.model is None:
-            return self.fallback_prediction(expense_data)
+    def decode_expense(self, expense_data, bundle=None, use_feature_store=True):
+        """Validate a payload once into an ExpenseRequest (raises RequestValidationError)"""
+        if isinstance(expense_data, ExpenseRequest):
+            return expense_data
+        bundle = bundle or self.bundle
+        started = time.perf_counter()
+        expense = ExpenseRequest.from_json(
+            expense_data,
+            bundle.category_index if bundle else None,
+            self.feature_store.features if self.feature_store and use_feature_store else None
+        )
+        PREDICT_STAGE_SECONDS.observe(time.perf_counter() - started, 'validate')
+        return expense
+    
+    def predict_coins(self, expense_data, routed=None):
+        started = time.perf_counter()
+        # Route once: a concurrent retrain or rollout may swap bundles mid-request.
+        # Malformed payloads and unknown versions raise RequestValidationError
+        # for the route to turn into a 400. routed is a (version, bundle) the
+        # caller already chose
+        version, bundle = routed or self.registry.route(expense_data, self.rng)
+        expense = self.decode_expense(expense_data, bundle)
+        # Copied: cached results are shared between requests
+        result = dict(self._predict_expense(expense, bundle), model_version=version)
+        if self.prediction_log is not None:
+            self.prediction_log.record(expense, result)
+        self.registry.record(version, (result,), time.perf_counter() - started)
+        return result
+    
+    def _predict_expense(self, expense, bundle):
+        if bundle is None:
+            FALLBACK_PREDICTIONS.inc(label='model_unavailable')
+            return self.fallback_prediction(expense)
+        if expense.category_id is None:
+            FALLBACK_PREDICTIONS.inc(label='unknown_category')
+            return self.fallback_prediction(expense)
         
         try:
             # Prepare features
-            features = self.prepare_features(expense_data)
-            features_scaled = self.scaler.transform([features])
+            features = self.prepare_features(expense)
             
-            # Make prediction using YOUR trained neural network
-            prediction = self.model.predict(features_scaled, verbose=0)
-            ann_coins = max(1, min(50, int(prediction[0][0])))
+            # Near-duplicate requests skip scaling, inference and factor analysis
+            cache_key = None
+            if self.cache is not None:
+                started = time.perf_counter()
+                cache_key = (bundle.generation,) + self.cache.key(features)
+                cached = self.cache.get(cache_key)
+                PREDICT_STAGE_SECONDS.observe(time.perf_counter() - started, 'cache_lookup')
+                if cached is not None:
+                    return cached
             
-            # Apply only minimal adjustments to preserve ANN intelligence
-            final_coins = self.apply_minimal_adjustments(expense_data, ann_coins)
+            # Make prediction using YOUR trained neural network, coalesced
+            # with concurrent requests when micro-batching is enabled
+            if self.batcher is not None:
+                started = time.perf_counter()
+                prediction, uncertainty = self.batcher.submit((bundle, features)).result(MICROBATCH_TIMEOUT)
+                PREDICT_STAGE_SECONDS.observe(time.perf_counter() - started, 'batch_wait')
+            else:
+                prediction, uncertainty = self.score_features([features], bundle)[0]
+            result = self.build_prediction(expense, prediction, uncertainty, bundle)
             
-            # Calculate confidence based on model uncertainty
-            confidence = self.calculate_confidence(features_scaled)
+            if cache_key is not None:
+                self.cache.put(cache_key, result)
+            return result
+        except Exception:
+            logger.exception("Prediction failed, using the rule-based fallback")
+            FALLBACK_PREDICTIONS.inc(label='prediction_error')
+            return self.fallback_prediction(expense)
+    
+    def predict_coins_batch(self, expenses):
+        """Predict coins for many expenses with a single scaler and model call.
+        
+        Results come back in input order. Malformed rows get an
+        ``{"error": ...}`` entry instead of a prediction; rows the model
+        cannot score (e.g. an unknown category) use the fallback, as in
+        predict_coins. Each row is routed to a model version on its own, and
+        rows are scored with one call per version.
+        """
+        started = time.perf_counter()
+        results = [None] * len(expenses)
+        # version -> (bundle, row indices, decoded expenses, feature rows)
+        groups = {}
+        # (index, expense, version) of every row that gets a prediction
+        served = []
+        
+        for i, expense_data in enumerate(expenses):
+            try:
+                version, bundle = self.registry.route(expense_data, self.rng)
+                expense = self.decode_expense(expense_data, bundle)
+            except RequestValidationError as e:
+                results[i] = {"error": str(e)}
+                continue
+            served.append((i, expense, version))
             
-            # Analyze factors
-            factors = self.analyze_factors(expense_data, final_coins)
+            if bundle is None:
+                FALLBACK_PREDICTIONS.inc(label='model_unavailable')
+                results[i] = self.fallback_prediction(expense)
+            elif expense.category_id is None:
+                FALLBACK_PREDICTIONS.inc(label='unknown_category')
+                results[i] = self.fallback_prediction(expense)
+            else:
+                _, rows, decoded, features = groups.setdefault(version, (bundle, [], [], []))
+                features.append(expense.features())
+                decoded.append(expense)
+                rows.append(i)
+        
+        for bundle, rows, decoded, features in groups.values():
+            try:
+                scored = self.score_features(features, bundle)
+            except Exception:
+                logger.exception("Batch prediction failed, using the rule-based fallback", extra={"rows": len(rows)})
+                FALLBACK_PREDICTIONS.inc(len(rows), label='prediction_error')
+                scored = None
+                for expense, i in zip(decoded, rows):
+                    results[i] = self.fallback_prediction(expense)
             
-            return {
-                "coins": final_coins,
-                "confidence": confidence,
-                "factors": factors,
-                "breakdown": {
-                    "ann_prediction": float(prediction[0][0]),
-                    "ann_coins": ann_coins,
-                    "final_coins": final_coins,
-                    "method": "neural_network_primary"
-                }
+            for (prediction, uncertainty), expense, i in zip(scored or (), decoded, rows):
+                try:
+                    results[i] = self.build_prediction(expense, prediction, uncertainty, bundle)
+                except Exception:
+                    logger.exception("Prediction failed, using the rule-based fallback")
+                    FALLBACK_PREDICTIONS.inc(label='prediction_error')
+                    results[i] = self.fallback_prediction(expense)
+        
+        by_version = {}
+        for i, _, version in served:
+            results[i]["model_version"] = version
+            by_version.setdefault(version, []).append(results[i])
+        if self.prediction_log is not None and served:
+            self.prediction_log.record_many((expense, results[i]) for i, expense, _ in served)
+        elapsed = time.perf_counter() - started
+        for version, version_results in by_version.items():
+            self.registry.record(version, version_results, elapsed)
+        return results
+    
+    def score_features(self, features, bundle=None):
+        """Scale and run a batch of feature rows through the model.
+        
+        Uses one feature matrix, one scaler pass and one forward pass, and
+        returns a ``(raw_prediction, uncertainty)`` pair per row, where
+        uncertainty is the ``(mean, std)`` of MC dropout samples (None when
+        disabled). All rows' samples run as one tiled batch.
+        """
+        bundle = bundle or self.bundle
+        started = time.perf_counter()
+        features_scaled = bundle.scaler.transform(np.array(features, dtype=np.float64))
+        scaled = time.perf_counter()
+        predictions = bundle.forward(features_scaled)
+        PREDICT_STAGE_SECONDS.observe(scaled - started, 'scale')
+        PREDICT_STAGE_SECONDS.observe(time.perf_counter() - scaled, 'inference')
+        
+        if MC_DROPOUT_SAMPLES > 0 and bundle.sampler is not None:
+            started = time.perf_counter()
+            means, stds = bundle.sampler.sample(features_scaled, MC_DROPOUT_SAMPLES, self.rng)
+            PREDICT_STAGE_SECONDS.observe(time.perf_counter() - started, 'mc_dropout')
+            return [
+                (predictions[i][0], (float(means[i]), float(stds[i])))
+                for i in range(len(features_scaled))
+            ]
+        return [(predictions[i][0], None) for i in range(len(features_scaled))]
+    
+    def _score_coalesced(self, rows):
+        """MicroBatcher handler: score (bundle, features) rows, one call per bundle"""
+        results = [None] * len(rows)
+        groups = {}
+        for i, (bundle, _) in enumerate(rows):
+            groups.setdefault(id(bundle), (bundle, []))[1].append(i)
+        for bundle, indices in groups.values():
+            scored = self.score_features([rows[i][1] for i in indices], bundle)
+            for i, result in zip(indices, scored):
+                results[i] = result
+        return results
+    
+    def build_prediction(self, expense_data, raw_prediction, uncertainty=None, bundle=None):
+        """Turn a raw ANN output for one expense into the response payload"""
+        ann_coins = max(1, min(50, int(raw_prediction)))
+        
+        # Apply only minimal adjustments to preserve ANN intelligence
+        final_coins = self.apply_minimal_adjustments(expense_data, ann_coins)
+        
+        # Calculate confidence based on model uncertainty
+        confidence = self.calculate_confidence(uncertainty, bundle)
+        
+        # Analyze factors
+        started = time.perf_counter()
+        factors = self.analyze_factors(expense_data, final_coins)
+        PREDICT_STAGE_SECONDS.observe(time.perf_counter() - started, 'analyze_factors')
+        
+        result = {
+            "coins": final_coins,
+            "confidence": confidence,
+            "factors": factors,
+            "breakdown": {
+                "ann_prediction": float(raw_prediction),
+                "ann_coins": ann_coins,
+                "final_coins": final_coins,
+                "method": "neural_network_primary"
             }
-        except Exception as e:
-            print(f"Prediction error: {e}")
-            return self.fallback_prediction(expense_data)
+        }
+        if uncertainty is not None:
+            mean, std = uncertainty
+            result["uncertainty"] = {"mean": mean, "std": std, "samples": MC_DROPOUT_SAMPLES}
+        return result
     
     def apply_minimal_adjustments(self, expense_data, ann_coins):
         """Apply minimal adjustments to preserve ANN intelligence"""
-        budget_ratio = expense_data.get('budget_ratio', 0.5)
+        budget_ratio = self.decode_expense(expense_data).budget_ratio
         
         # Only apply adjustment for extreme overspending (let ANN handle most cases)
         if budget_ratio > 1.5:  # Only for very severe overspending
@@ -167,10 +656,12 @@ class MLModelService:
     
     def fallback_prediction(self, expense_data):
         """Simple fallback only when ANN fails - should rarely be used"""
+        started = time.perf_counter()
         try:
-            amount = float(expense_data.get('amount', 0))
-            category = expense_data.get('category', 'other')
-            budget_ratio = expense_data.get('budget_ratio', 0.5)
+            expense = self.decode_expense(expense_data)
+            amount = expense.amount
+            category = expense.category
+            budget_ratio = expense.budget_ratio
             
             # Simple category-based base coins (since ANN is not available)
             category_base_coins = {
@@ -194,9 +685,9 @@ class MLModelService:
                 "coins": final_coins,
                 "confidence": "low",
                 "factors": {
-                    "category_health": category in ['food', 'healthcare', 'education', 'savings', 'utilities'],
+                    "category_health": category in HEALTHY_CATEGORIES,
                     "amount_reasonable": amount < 100,
-                    "time_appropriate": 6 <= datetime.fromisoformat(expense_data['timestamp'].replace('Z', '+00:00')).hour <= 22,
+                    "time_appropriate": 6 <= expense.hour <= 22,
                     "within_budget": budget_ratio < 0.8
                 },
                 "breakdown": {
@@ -216,61 +707,220 @@ class MLModelService:
                     "within_budget": False
                 }
             }
+        finally:
+            PREDICT_STAGE_SECONDS.observe(time.perf_counter() - started, 'fallback')
     
-    def prepare_features(self, expense_data):
-        timestamp = datetime.fromisoformat(expense_data['timestamp'].replace('Z', '+00:00'))
-        
-        amount = expense_data['amount']
-        category_encoded = self.category_encoder.transform([expense_data['category']])[0]
-        hour = timestamp.hour
-        day_of_week = timestamp.weekday()
-        month = timestamp.month
-        spending_velocity = expense_data.get('spending_velocity', 1.0)
-        category_frequency = expense_data.get('category_frequency', 0.5)
-        budget_ratio = expense_data.get('budget_ratio', 0.5)
+    def load_shed_prediction(self, expense_data, reason, routed):
+        """Rule-based fallback for a request refused by admission control.
         
-        return [amount, category_encoded, hour, day_of_week, month,
-                spending_velocity, category_frequency, budget_ratio]
+        Validated like an admitted request, but without the feature store:
+        its SQLite reads are exactly what is contended under overload.
+        """
+        version, bundle = routed
+        expense = self.decode_expense(expense_data, bundle, use_feature_store=False)
+        FALLBACK_PREDICTIONS.inc(label='load_shed')
+        result = self.fallback_prediction(expense)
+        result.setdefault("breakdown", {}).update(method="load_shed_fallback", shed_reason=reason)
+        result["model_version"] = version
+        if self.prediction_log is not None:
+            self.prediction_log.record(expense, result)
+        self.registry.record_shed(version)
+        return result
+    
+    def prepare_features(self, expense_data):
+        expense = self.decode_expense(expense_data)
+        if expense.category_id is None:
+            raise ValueError(f"y contains previously unseen labels: {expense.category!r}")
+        return expense.features()
     
-    def calculate_confidence(self, features):
-        # Simple confidence calculation based on feature values
-        # In practice, you might use ensemble methods or dropout for uncertainty
-        return "medium"
+    def calculate_confidence(self, uncertainty, bundle=None):
+        """Bucket the MC dropout spread of a prediction into a confidence label"""
+        if uncertainty is None:
+            # MC dropout disabled: no uncertainty estimate to go on
+            return "medium"
+        bundle = bundle or self.bundle
+        _, std = uncertainty
+        return confidence_label(std, bundle.confidence_thresholds if bundle else DEFAULT_CONFIDENCE_STD)
     
     def analyze_factors(self, expense_data, coins):
-        healthy_categories = ['food', 'healthcare', 'education', 'savings', 'utilities']
+        expense = self.decode_expense(expense_data)
         
         return {
-            "category_health": expense_data['category'] in healthy_categories,
-            "amount_reasonable": expense_data['amount'] < 100,
-            "time_appropriate": 6 <= datetime.fromisoformat(expense_data['timestamp'].replace('Z', '+00:00')).hour <= 22,
-            "within_budget": expense_data.get('budget_ratio', 0.5) < 0.8
+            "category_health": expense.category in HEALTHY_CATEGORIES,
+            "amount_reasonable": expense.amount < 100,
+            "time_appropriate": 6 <= expense.hour <= 22,
+            "within_budget": expense.budget_ratio < 0.8
         }
 
 # Initialize ML service
 ml_service = MLModelService()
 
-@app.route('/predict-coins', methods=['POST'])
-def predict_coins():
+def warn_if_batching_starved(concurrency, setting):
+    """Warn when too few threads submit to the micro-batcher for batches to form.
+    
+    Each waiting request holds a thread, so a batch never has more rows than
+    there are threads serving /predict-coins.
+    """
+    if ml_service.batcher is None or concurrency >= MICROBATCH_MAX_SIZE:
+        return
+    if concurrency < 2:
+        message = "Micro-batching is on, but requests are served one at a time: it only adds wait time"
+    else:
+        message = "Micro-batches are capped by the number of request threads"
+    logger.warning(message, extra={"threads": concurrency, "setting": setting,
+                                   "max_batch_size": MICROBATCH_MAX_SIZE, "window_ms": MICROBATCH_WINDOW_MS})
+
+ENDPOINTS = ["/predict-coins", "/predict-coins/batch", "/forecast-spending", "/expenses", "/health", "/test", "/categories", "/metrics", "/retrain", "/models"]
+
+CATEGORIES = [
+    "food", "healthcare", "education", "savings", 
+    "transportation", "utilities", "entertainment", 
+    "shopping", "travel", "other"
+]
+
+retrainer = RetrainManager(
+    ml_service, MODEL_DIR, sorted(CATEGORIES),
+    epochs=RETRAIN_EPOCHS,
+    min_rows=RETRAIN_MIN_ROWS,
+    max_mae=RETRAIN_MAX_MAE,
+    tolerance=RETRAIN_TOLERANCE
+)
+
+# Route handlers return (payload, status) so the Flask routes below and the
+# asyncio entry point in asgi.py serve identical JSON contracts
+
+admission = AdmissionController(
+    max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+    deadline_seconds=ADMISSION_DEADLINE_MS / 1000.0,
+    workers=ADMISSION_WORKERS
+)
+
+def request_deadline(expense_data):
+    """Seconds from an optional deadline_ms field, or None for ML_ADMISSION_DEADLINE_MS"""
+    deadline_ms = expense_data.get('deadline_ms') if isinstance(expense_data, dict) else None
+    if deadline_ms is None:
+        return None
+    if isinstance(deadline_ms, bool) or not isinstance(deadline_ms, (int, float)) or not 0 < deadline_ms <= MAX_DEADLINE_MS:
+        raise RequestValidationError(f"Field 'deadline_ms' must be a number between 0 and {MAX_DEADLINE_MS}")
+    return deadline_ms / 1000.0
+
+def admit_prediction(expense_data, waited=0.0):
+    """Route a /predict-coins request, then decide admission; returns ((version, bundle), ticket).
+    
+    Invalid versions and deadlines raise RequestValidationError whether or
+    not the request would be shed. waited is time already spent since it arrived.
+    """
+    routed = ml_service.registry.route(expense_data, ml_service.rng)
+    deadline = request_deadline(expense_data)
+    return routed, admission.admit(deadline, waited)
+
+def shed_prediction_response(expense_data, routed, ticket):
+    return ml_service.load_shed_prediction(expense_data, ticket.reason, routed), 200
+
+def admitted_prediction_response(expense_data, routed, ticket):
     try:
-        expense_data = request.json
-        result = ml_service.predict_coins(expense_data)
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        return ml_service.predict_coins(expense_data, routed), 200
+    finally:
+        admission.release(ticket)
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    return jsonify({
+def predict_coins_response(expense_data):
+    routed, ticket = admit_prediction(expense_data)
+    if not ticket.admitted:
+        return shed_prediction_response(expense_data, routed, ticket)
+    return admitted_prediction_response(expense_data, routed, ticket)
+
+def predict_coins_batch_response(payload):
+    expenses = payload.get('expenses') if isinstance(payload, dict) else payload
+    if not isinstance(expenses, list):
+        return {"error": "Expected a JSON array of expenses"}, 400
+    if len(expenses) > MAX_BATCH_SIZE:
+        return {"error": f"Batch too large (max {MAX_BATCH_SIZE} expenses)"}, 400
+    
+    results = ml_service.predict_coins_batch(expenses)
+    return {"predictions": results, "count": len(results)}, 200
+
+def forecast_response(payload):
+    """Fit every user's daily spending series in one vectorized pass"""
+    users = payload.get('users') if isinstance(payload, dict) else None
+    if not isinstance(users, list):
+        return {"error": "Expected a JSON object with a 'users' array"}, 400
+    if len(users) > MAX_FORECAST_USERS:
+        return {"error": f"Too many users (max {MAX_FORECAST_USERS})"}, 400
+    forecast_days = payload.get('forecast_days', 30)
+    if isinstance(forecast_days, bool) or not isinstance(forecast_days, int) or not 1 <= forecast_days <= 3650:
+        return {"error": "Field 'forecast_days' must be an integer between 1 and 3650"}, 400
+    
+    series = []
+    expense_counts = []
+    for i, user in enumerate(users):
+        daily = user.get('daily_spending') if isinstance(user, dict) else None
+        if not isinstance(daily, list):
+            return {"error": f"users[{i}]: 'daily_spending' must be an array of daily totals"}, 400
+        for value in daily:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return {"error": f"users[{i}]: 'daily_spending' values must be numbers"}, 400
+            # Also false for NaN
+            if not abs(value) <= MAX_DAILY_AMOUNT:
+                return {"error": f"users[{i}]: 'daily_spending' values must be finite, "
+                                 f"at most {MAX_DAILY_AMOUNT:g} in magnitude"}, 400
+        count = user.get('expense_count', len(daily))
+        if isinstance(count, bool) or not isinstance(count, int):
+            return {"error": f"users[{i}]: 'expense_count' must be an integer"}, 400
+        series.append(daily)
+        expense_counts.append(count)
+    
+    try:
+        forecasts = forecast_spending(series, forecast_days, expense_counts)
+    except (TypeError, ValueError) as e:
+        return {"error": f"Invalid daily_spending: {e}"}, 400
+    for user, forecast in zip(users, forecasts):
+        if 'user_id' in user:
+            forecast["user_id"] = user['user_id']
+    return {"forecasts": forecasts, "count": len(forecasts)}, 200
+
+def record_expenses_response(payload):
+    """Add committed expenses (one object or an array) to the per-user feature store"""
+    if ml_service.feature_store is None:
+        return {"error": "Feature store is disabled (ML_FEATURE_STORE_PATH is empty)"}, 503
+    expenses = payload if isinstance(payload, list) else [payload]
+    if len(expenses) > MAX_BATCH_SIZE:
+        return {"error": f"Batch too large (max {MAX_BATCH_SIZE} expenses)"}, 400
+    
+    rows = []
+    for i, expense_data in enumerate(expenses):
+        try:
+            expense = ExpenseRequest.from_json(expense_data)
+            if expense.user_id is None:
+                raise RequestValidationError("Missing required field: user_id")
+        except RequestValidationError as e:
+            return {"error": f"expenses[{i}]: {e}" if isinstance(payload, list) else str(e)}, 400
+        rows.append((expense.user_id, expense.amount, expense.category, expense.when))
+    
+    ml_service.feature_store.record_many(rows)
+    return {"recorded": len(rows)}, 200
+
+def health_response():
+    return {
         "status": "healthy", 
         "model_loaded": ml_service.model is not None,
-        "tensorflow_available": True,
-        "endpoints": ["/predict-coins", "/health", "/test", "/categories"]
-    })
+        "model_format": ml_service.model_format,
+        "model_precision": ml_service.precision,
+        "inference_engine": ml_service.engine_name,
+        "microbatching": ml_service.batcher.stats() if ml_service.batcher else None,
+        "prediction_cache": ml_service.cache.stats() if ml_service.cache else None,
+        "feature_store": ml_service.feature_store.stats() if ml_service.feature_store else None,
+        "prediction_log": ml_service.prediction_log.stats() if ml_service.prediction_log else None,
+        "tensorflow_available": importlib.util.find_spec('tensorflow') is not None,
+        "tensorflow_loaded": 'tensorflow' in sys.modules,
+        "model_source": ml_service.bundle.source if ml_service.bundle else None,
+        "model_version": ml_service.registry.default_version,
+        "model_versions": sorted(ml_service.registry.versions()),
+        "retraining": retrainer.stats(),
+        "admission": admission.stats(),
+        "endpoints": ENDPOINTS
+    }, 200
 
-@app.route('/test', methods=['GET'])
-def test_prediction():
-    """Test endpoint with sample data"""
+def test_response():
     sample_data = {
         "amount": 25.50,
         "category": "food",
@@ -281,26 +931,185 @@ def test_prediction():
     }
     
     result = ml_service.predict_coins(sample_data)
-    return jsonify({
+    return {
         "sample_input": sample_data,
         "prediction": result
-    })
+    }, 200
+
+def categories_response():
+    return {"categories": CATEGORIES}, 200
+
+def metrics_response():
+    """Prometheus text exposition (not JSON)"""
+    return REGISTRY.render(), 200
+
+def retrain_response(payload):
+    """Queue a background retraining job; poll /retrain/<job_id> for the outcome"""
+    try:
+        job = retrainer.submit(payload)
+    except RequestValidationError as e:
+        return {"error": str(e)}, 400
+    except RetrainUnavailable as e:
+        return {"error": str(e)}, 503
+    if job is None:
+        return {"error": "A retraining job is already running", "running": retrainer.stats()["running"]}, 409
+    return job, 202
+
+def models_response():
+    """Loaded model versions, the A/B split and per-version prediction stats"""
+    return ml_service.registry.stats(), 200
+
+def update_models_response(payload):
+    """Load versions from ML_MODEL_VERSIONS_DIR and/or change the default version and A/B weights.
+    
+    Body: {"load": ["2.0"], "traffic": {"1.0": 90, "2.0": 10}, "default": "1.0"}, all optional.
+    """
+    if not isinstance(payload, dict):
+        return {"error": "Expected a JSON object"}, 400
+    load = payload.get('load', [])
+    traffic = payload.get('traffic')
+    default = payload.get('default')
+    try:
+        if not isinstance(load, list):
+            raise RequestValidationError("Field 'load' must be an array of version names")
+        if traffic is not None and not isinstance(traffic, dict):
+            raise RequestValidationError("Field 'traffic' must be an object of version weights")
+        for version in load:
+            validate_version(version)
+        if default is not None:
+            validate_version(default)
+    except RequestValidationError as e:
+        return {"error": str(e)}, 400
+    
+    for version in load:
+        try:
+            ml_service.load_version(version)
+        except FileNotFoundError as e:
+            return {"error": str(e)}, 404
+        except Exception as e:
+            return {"error": f"Failed to load model version '{version}': {e}"}, 500
+    try:
+        if traffic is not None or default is not None:
+            ml_service.registry.set_routing(traffic, default)
+    except RequestValidationError as e:
+        return {"error": str(e)}, 400
+    return ml_service.registry.stats(), 200
+
+def retrain_status_response(job_id):
+    job = retrainer.status(job_id)
+    if job is None:
+        return {"error": f"Unknown retraining job '{job_id}'"}, 404
+    return job, 200
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.get('request_started')
+    # Only matched routes, so unknown paths cannot blow up label cardinality
+    if started is not None and request.url_rule is not None:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, request.url_rule.rule)
+    return response
+
+def decode_json():
+    started = time.perf_counter()
+    payload = request.json
+    PREDICT_STAGE_SECONDS.observe(time.perf_counter() - started, 'decode')
+    return payload
+
+def profile_requested():
+    return PROFILING_ENABLED and (
+        request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1'
+    )
+
+def run_profiled(handler, *args):
+    """Run handler on this thread under the sampling profiler and attach its report"""
+    with SamplingProfiler(interval=PROFILING_INTERVAL_MS / 1000.0) as profiler:
+        payload, status = handler(*args)
+    return dict(payload, profile=profiler.report()), status
+
+def run_prediction_route(handler):
+    """Decode the body and run handler, under the sampling profiler if requested"""
+    if not profile_requested():
+        payload, status = handler(decode_json())
+        return jsonify(payload), status
+    
+    payload, status = run_profiled(lambda: handler(decode_json()))
+    return jsonify(payload), status
+
+@app.route('/predict-coins', methods=['POST'])
+def predict_coins():
+    try:
+        return run_prediction_route(predict_coins_response)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/predict-coins/batch', methods=['POST'])
+def predict_coins_batch():
+    """Predict coins for an array of expenses in one vectorized pass"""
+    try:
+        return run_prediction_route(predict_coins_batch_response)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    payload, status = health_response()
+    return jsonify(payload), status
+
+@app.route('/test', methods=['GET'])
+def test_prediction():
+    """Test endpoint with sample data"""
+    payload, status = test_response()
+    return jsonify(payload), status
 
 @app.route('/categories', methods=['GET'])
 def get_categories():
     """Return available categories"""
-    categories = [
-        "food", "healthcare", "education", "savings", 
-        "transportation", "utilities", "entertainment", 
-        "shopping", "travel", "other"
-    ]
-    return jsonify({"categories": categories})
+    payload, status = categories_response()
+    return jsonify(payload), status
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics for the prediction hot path"""
+    body, status = metrics_response()
+    return Response(body, status=status, content_type=CONTENT_TYPE)
+
+@app.route('/forecast-spending', methods=['POST'])
+def forecast_spending_route():
+    # Batch forecasts, e.g. for nightly jobs and dashboards
+    payload, status = forecast_response(request.json)
+    return jsonify(payload), status
+
+@app.route('/expenses', methods=['POST'])
+def record_expenses():
+    # Committed expenses feed the per-user behavioural features
+    payload, status = record_expenses_response(request.json)
+    return jsonify(payload), status
 
 @app.route('/retrain', methods=['POST'])
 def retrain_model():
     # Endpoint for retraining with new data
-    # This would fetch data from Firebase and retrain the model
-    return jsonify({"message": "Retraining not implemented yet"})
+    payload, status = retrain_response(request.get_json(silent=True))
+    return jsonify(payload), status
+
+@app.route('/models', methods=['GET'])
+def list_models():
+    payload, status = models_response()
+    return jsonify(payload), status
+
+@app.route('/models', methods=['POST'])
+def update_models():
+    # Gradual rollouts: load a new version, then shift traffic to it
+    payload, status = update_models_response(request.get_json(silent=True))
+    return jsonify(payload), status
+
+@app.route('/retrain/<job_id>', methods=['GET'])
+def retrain_status(job_id):
+    payload, status = retrain_status_response(job_id)
+    return jsonify(payload), status
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
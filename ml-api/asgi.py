@@ -0,0 +1,204 @@
+"""Asyncio (ASGI) entry point for the ML API.
+
+Serves the same routes and JSON contracts as the Flask app in app.py, but
+from a single event loop, so one process can hold thousands of open
+connections while sharing a single copy of the model. Model work runs on a
+bounded thread pool; cheap routes are answered inline.
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import app as api
+from metrics import CONTENT_TYPE, HTTP_REQUEST_SECONDS, PREDICT_STAGE_SECONDS
+
+# Threads running model inference, and the max number of requests queued for them.
+# With micro-batching every waiting request holds a thread, so the default
+# leaves room for full batches
+INFERENCE_THREADS = int(os.environ.get(
+    'ML_ASGI_INFERENCE_THREADS',
+    max(os.cpu_count() or 4, api.MICROBATCH_MAX_SIZE if api.ml_service.batcher is not None else 0)
+))
+MAX_PENDING = int(os.environ.get('ML_ASGI_MAX_PENDING', 1024))
+
+# (method, path) -> (handler, body, runs_in_executor), where body is 'json'
+# (decoding errors are a 400, like request.json), 'json_silent' (decoding
+# errors become None, like request.get_json(silent=True)) or None
+ROUTES = {
+    ('POST', '/predict-coins'): (api.predict_coins_response, 'json', True),
+    ('POST', '/predict-coins/batch'): (api.predict_coins_batch_response, 'json', True),
+    ('POST', '/forecast-spending'): (api.forecast_response, 'json', True),
+    ('POST', '/expenses'): (api.record_expenses_response, 'json', True),
+    ('GET', '/health'): (api.health_response, None, False),
+    ('GET', '/test'): (api.test_response, None, True),
+    ('GET', '/categories'): (api.categories_response, None, False),
+    ('GET', '/metrics'): (api.metrics_response, None, False),
+    ('POST', '/retrain'): (api.retrain_response, 'json_silent', True),
+    ('GET', '/models'): (api.models_response, None, False),
+    ('POST', '/models'): (api.update_models_response, 'json_silent', True),
+}
+PATHS = {path for _, path in ROUTES}
+
+# Handlers that honour ?profile=1 / X-Profile: 1 when ML_PROFILING_ENABLED=1, as in app.py
+PROFILED_HANDLERS = (api.predict_coins_response, api.predict_coins_batch_response)
+
+# (method, path prefix) -> (handler taking the rest of the path, route label
+# matching the Flask rule)
+PREFIX_ROUTES = {
+    ('GET', '/retrain/'): (api.retrain_status_response, '/retrain/<job_id>'),
+}
+
+executor = ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix='inference')
+api.warn_if_batching_starved(INFERENCE_THREADS, 'ML_ASGI_INFERENCE_THREADS')
+# Created inside the running loop (see _pending_slots)
+_pending = None
+
+
+def _pending_slots():
+    global _pending
+    if _pending is None:
+        _pending = asyncio.Semaphore(MAX_PENDING)
+    return _pending
+
+
+def _profile_requested(scope):
+    if not api.PROFILING_ENABLED:
+        return False
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    return query.get('profile', [None])[0] == '1' or dict(scope.get('headers', [])).get(b'x-profile') == b'1'
+
+
+def _call(profile, handler, *args):
+    """Run handler, under the sampling profiler (of the calling thread) when profile is set"""
+    return api.run_profiled(handler, *args) if profile else handler(*args)
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def _send_json(send, payload, status=200, content_type=b'application/json'):
+    body = payload.encode('utf-8') if isinstance(payload, str) else json.dumps(payload).encode('utf-8')
+    headers = [
+        (b'content-type', content_type),
+        (b'content-length', str(len(body)).encode('ascii')),
+        # Match flask-cors' default of allowing every origin
+        (b'access-control-allow-origin', b'*'),
+    ]
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _preflight(scope, send):
+    request_headers = dict(scope.get('headers', []))
+    headers = [
+        (b'access-control-allow-origin', b'*'),
+        (b'access-control-allow-methods', b'DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT'),
+        (b'content-length', b'0'),
+    ]
+    if b'access-control-request-headers' in request_headers:
+        headers.append((b'access-control-allow-headers', request_headers[b'access-control-request-headers']))
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            _pending_slots()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    method, path = scope['method'], scope['path']
+    if method == 'OPTIONS' and path in PATHS:
+        await _preflight(scope, send)
+        return
+
+    route = ROUTES.get((method, path))
+    if route is None:
+        for (prefix_method, prefix), (handler, rule) in PREFIX_ROUTES.items():
+            rest = path[len(prefix):]
+            if path.startswith(prefix) and rest and '/' not in rest:
+                if prefix_method != method:
+                    await _send_json(send, {"error": "Method Not Allowed"}, 405)
+                    return
+                started = time.perf_counter()
+                payload, status = handler(rest)
+                await _send_json(send, payload, status)
+                HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, rule)
+                return
+        if path in PATHS:
+            await _send_json(send, {"error": "Method Not Allowed"}, 405)
+        else:
+            await _send_json(send, {"error": "Not Found"}, 404)
+        return
+
+    started = time.perf_counter()
+    handler, body_mode, offload = route
+    profile = handler in PROFILED_HANDLERS and _profile_requested(scope)
+    try:
+        args = ()
+        if body_mode == 'json':
+            body = await _read_body(receive)
+            decode_started = time.perf_counter()
+            args = (json.loads(body),)
+            PREDICT_STAGE_SECONDS.observe(time.perf_counter() - decode_started, 'decode')
+        elif body_mode == 'json_silent':
+            body = await _read_body(receive)
+            try:
+                args = (json.loads(body),)
+            except ValueError:
+                args = (None,)
+
+        if offload:
+            async with _pending_slots():
+                loop = asyncio.get_running_loop()
+                if handler is api.predict_coins_response:
+                    # Admitted on the loop, so requests waiting for an inference
+                    # thread count as in flight; shed ones are answered inline
+                    # (the shed path never reads the feature store). Nothing
+                    # awaits between admit and submit, so the worker always
+                    # releases the slot
+                    routed, ticket = api.admit_prediction(*args, waited=time.perf_counter() - started)
+                    if ticket.admitted:
+                        payload, status = await loop.run_in_executor(
+                            executor, _call, profile, api.admitted_prediction_response, *args, routed, ticket
+                        )
+                    else:
+                        payload, status = _call(profile, api.shed_prediction_response, *args, routed, ticket)
+                else:
+                    payload, status = await loop.run_in_executor(executor, _call, profile, handler, *args)
+        else:
+            payload, status = handler(*args)
+    except Exception as e:
+        payload, status = {"error": str(e)}, 400
+
+    if isinstance(payload, str):
+        # /metrics is Prometheus text rather than JSON
+        await _send_json(send, payload, status, content_type=CONTENT_TYPE.encode('ascii'))
+    else:
+        await _send_json(send, payload, status)
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, path)
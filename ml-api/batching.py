@@ -0,0 +1,99 @@
+"""Micro-batching of concurrent single-row predictions.
+
+Threads serving ``/predict-coins`` submit their feature row and block on a
+future; one worker thread drains the queue, waits up to ``window_ms`` after
+the first row for more to arrive (or until ``max_batch_size`` rows are
+queued) and scores the whole batch with a single call.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-row requests into one batched call"""
+
+    def __init__(self, handler, window_ms=2.0, max_batch_size=64):
+        # handler maps a list of rows to a list of per-row results
+        self.handler = handler
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, int(max_batch_size))
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+        self._thread = None
+        self.start()
+
+    def _reset_stats(self):
+        self._batches = 0
+        self._items = 0
+        self._max_batch = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def start(self):
+        """Start the worker thread (also used to restart it in a forked child)"""
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def after_fork(self):
+        """Give a forked child its own queue and worker thread (threads do not survive fork)"""
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+        self.start()
+
+    def submit(self, row):
+        """Queue one row for scoring and return a Future for its result"""
+        future = Future()
+        self._queue.put((row, future, time.perf_counter()))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        started = time.perf_counter()
+        try:
+            results = self.handler([row for row, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+        else:
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+        waits = [started - enqueued for _, _, enqueued in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._max_batch = max(self._max_batch, len(batch))
+            self._wait_total += sum(waits)
+            self._wait_max = max(self._wait_max, max(waits))
+
+    def stats(self):
+        with self._stats_lock:
+            batches, items = self._batches, self._items
+            return {
+                "window_ms": self.window * 1000.0,
+                "max_batch_size": self.max_batch_size,
+                "queue_depth": self._queue.qsize(),
+                "batches": batches,
+                "items": items,
+                "mean_batch_size": items / batches if batches else 0.0,
+                "largest_batch": self._max_batch,
+                "mean_queue_wait_ms": self._wait_total / items * 1000.0 if items else 0.0,
+                "max_queue_wait_ms": self._wait_max * 1000.0,
+            }
@@ -0,0 +1,232 @@
+"""Latency and throughput benchmarks for the ML API and training pipeline.
+
+Covers the /predict-coins hot path stage by stage (feature preparation,
+scaling, inference, MC dropout confidence, factor analysis and the full
+Flask route) and the
+training pipeline on synthetic datasets. Results are printed as JSON with
+p50/p95/p99 latency, rows/sec and peak RSS, so runs can be diffed before a
+deploy.
+
+Usage:
+    python bench.py                          # service + training suites
+    python bench.py --suite service --iterations 2000
+    python bench.py --suite training --sizes 10000 100000 --epochs 1
+    python bench.py --output bench.json
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+SAMPLE_EXPENSE = {
+    "amount": 25.50,
+    "category": "food",
+    "timestamp": "2025-03-14T12:30:00Z",
+    "spending_velocity": 2.0,
+    "category_frequency": 0.3,
+    "budget_ratio": 0.4
+}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def summarize(name, samples, rows_per_call=1):
+    samples = np.asarray(samples, dtype=np.float64)
+    total = samples.sum()
+    return {
+        "name": name,
+        "iterations": len(samples),
+        "rows_per_call": rows_per_call,
+        "mean_ms": float(samples.mean() * 1000),
+        "p50_ms": float(np.percentile(samples, 50) * 1000),
+        "p95_ms": float(np.percentile(samples, 95) * 1000),
+        "p99_ms": float(np.percentile(samples, 99) * 1000),
+        "rows_per_sec": float(len(samples) * rows_per_call / total) if total > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def time_calls(name, fn, iterations, warmup=10, rows_per_call=1):
+    """Time iterations calls of fn after a warmup"""
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - start
+    return summarize(name, samples, rows_per_call)
+
+
+def service_payloads(n, seed=0):
+    """Varied expense payloads, so cache-sensitive stages see realistic misses"""
+    rng = np.random.default_rng(seed)
+    categories = ["food", "healthcare", "education", "savings", "transportation",
+                  "utilities", "entertainment", "shopping", "travel", "other"]
+    return [
+        dict(
+            SAMPLE_EXPENSE,
+            amount=round(float(amount), 2),
+            category=categories[category],
+            budget_ratio=round(float(ratio), 3),
+        )
+        for amount, category, ratio in zip(
+            rng.uniform(5, 200, n), rng.integers(0, len(categories), n), rng.uniform(0.1, 1.5, n)
+        )
+    ]
+
+
+def bench_service(iterations=1000, batch_size=256):
+    import app as api
+
+    service = api.ml_service
+    if service.model is None:
+        raise RuntimeError("Model failed to load; service benchmarks need a model")
+
+    payloads = service_payloads(iterations)
+    features = service.prepare_features(SAMPLE_EXPENSE)
+    features_scaled = service.scaler.transform([features])
+    batch_payloads = payloads[:batch_size]
+    batch_scaled = service.scaler.transform([service.prepare_features(p) for p in batch_payloads])
+    payload_cycle = itertools.cycle(payloads)
+    client = api.app.test_client()
+    results = [
+        time_calls("service.prepare_features", lambda: service.prepare_features(SAMPLE_EXPENSE), iterations),
+        time_calls("service.scaler.transform", lambda: service.scaler.transform([features]), iterations),
+        time_calls(f"service.inference[{service.engine_name}]", lambda: service.forward(features_scaled), iterations),
+        time_calls(f"service.inference_batch[{service.engine_name}]",
+                   lambda: service.forward(batch_scaled), max(10, iterations // 10), rows_per_call=batch_size),
+        time_calls("service.analyze_factors", lambda: service.analyze_factors(SAMPLE_EXPENSE, 10), iterations),
+    ]
+
+    # MC dropout confidence overhead per request at several sample counts
+    sampler = service.bundle.sampler
+    if sampler is not None:
+        for samples in (8, 32, 128):
+            results.append(time_calls(
+                f"service.mc_dropout[samples={samples}]",
+                lambda: sampler.sample(features_scaled, samples, service.rng), iterations
+            ))
+        results.append(time_calls(
+            f"service.mc_dropout_batch[samples={api.MC_DROPOUT_SAMPLES}]",
+            lambda: sampler.sample(batch_scaled, api.MC_DROPOUT_SAMPLES, service.rng),
+            max(10, iterations // 10), rows_per_call=batch_size
+        ))
+
+    # The full route, with the prediction cache out of the way and then warm
+    cache, service.cache = service.cache, None
+    try:
+        results.append(time_calls(
+            "route./predict-coins",
+            lambda: client.post('/predict-coins', json=next(payload_cycle)),
+            iterations
+        ))
+    finally:
+        service.cache = cache
+    if cache is not None:
+        results.append(time_calls(
+            "route./predict-coins[cached]",
+            lambda: client.post('/predict-coins', json=SAMPLE_EXPENSE),
+            iterations
+        ))
+    results.append(time_calls(
+        "route./predict-coins/batch",
+        lambda: client.post('/predict-coins/batch', json=batch_payloads),
+        max(10, iterations // 10), rows_per_call=batch_size
+    ))
+    return results
+
+
+def bench_training(sizes=(10_000, 100_000), epochs=1, dict_path_max_rows=10_000):
+    import retraining  # noqa: F401 (puts the service's train_spending_model on the path)
+    from train_spending_model import CATEGORIES, SpendingBehaviorModel, generate_synthetic_expenses
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_rows in sizes:
+            df = generate_synthetic_expenses(n_rows)
+            csv_path = os.path.join(tmp, f"expenses_{n_rows}.csv")
+            df.to_csv(csv_path, index=False)
+            model = SpendingBehaviorModel()
+            model.category_encoder.fit(CATEGORIES)
+
+            def timed(name, fn):
+                start = time.perf_counter()
+                value = fn()
+                results.append(summarize(f"{name}[{n_rows}]", [time.perf_counter() - start], n_rows))
+                return value
+
+            timed("training.load_frame_from_csv", lambda: model.load_frame_from_csv(csv_path))
+            if n_rows <= dict_path_max_rows:
+                records = timed("training.load_data_from_csv", lambda: model.load_data_from_csv(csv_path))
+                timed("training.prepare_features", lambda: model.prepare_features(records))
+            timed("training.prepare_features_from_frame", lambda: model.prepare_features_from_frame(df))
+            timed("training.prepare_labels_from_frame", lambda: model.prepare_labels_from_frame(df))
+            timed(f"training.train[epochs={epochs}]",
+                  lambda: model.train_frame(df, epochs=epochs, verbose=0))
+            timed(f"training.train[cpu_tuned,epochs={epochs}]",
+                  lambda: model.train_frame(df, epochs=epochs, verbose=0, batch_size=1024,
+                                            lr_scaling='sqrt', use_tf_data=True))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the FinQuest ML API")
+    parser.add_argument("--suite", choices=["service", "training", "all"], default="all")
+    parser.add_argument("--iterations", type=int, default=1000, help="Timed calls per service stage")
+    parser.add_argument("--batch-size", type=int, default=256, help="Rows per batched call")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000],
+                        help="Synthetic dataset sizes for the training suite")
+    parser.add_argument("--epochs", type=int, default=1, help="Epochs per training benchmark")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    # Keep model-loading and training chatter off stdout, which carries the report
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.suite in ("service", "all"):
+            results.extend(bench_service(args.iterations, args.batch_size))
+        if args.suite in ("training", "all"):
+            results.extend(bench_training(args.sizes, args.epochs))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if 'app' in sys.modules:
+        service = sys.modules['app'].ml_service
+        report["meta"].update({
+            "model_format": service.model_format,
+            "inference_engine": service.engine_name,
+        })
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Bounded LRU cache for coin predictions.
+
+The expense preview resends almost the same payload on every keystroke, so
+predictions are cached on the prepared 8-feature vector. Amount and the ratio
+features are floored to a configurable step, so requests that differ by a few
+cents share a bucket. A floored bucket includes its lower edge, which suits
+``<`` comparisons but not ``>`` ones (1.5 and 1.505 share a bucket, yet only
+1.505 is ``> 1.5``). So the key also records which side of each rule
+threshold in ``THRESHOLDS`` a request falls on. Requests that the rules in
+app.py treat differently therefore never share an entry.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Positions of the quantized fields in MLModelService.prepare_features output
+AMOUNT_INDEX = 0
+RATIO_INDICES = (5, 6, 7)  # spending_velocity, category_frequency, budget_ratio
+BUDGET_RATIO_INDEX = 7
+
+# (feature index, threshold) of every comparison a cached result depends on:
+# analyze_factors (amount < 100, budget_ratio < 0.8) and
+# apply_minimal_adjustments (budget_ratio > 1.2, budget_ratio > 1.5)
+THRESHOLDS = (
+    (AMOUNT_INDEX, 100.0),
+    (BUDGET_RATIO_INDEX, 0.8),
+    (BUDGET_RATIO_INDEX, 1.2),
+    (BUDGET_RATIO_INDEX, 1.5),
+)
+
+
+class PredictionCache:
+    """Thread-safe LRU cache with a TTL and an entry-count bound"""
+
+    def __init__(self, max_entries=4096, ttl_seconds=300.0, amount_step=0.5, ratio_step=0.01,
+                 thresholds=THRESHOLDS):
+        self.max_entries = int(max_entries)
+        self.thresholds = tuple(thresholds)
+        self.ttl = float(ttl_seconds)
+        self.amount_step = float(amount_step)
+        self.ratio_step = float(ratio_step)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _quantize(value, step):
+        value = float(value)
+        return math.floor(value / step) if step > 0 else value
+
+    def key(self, features):
+        """Build a hashable cache key from a prepared feature vector"""
+        values = [float(value) for value in features]
+        key = list(values)
+        key[AMOUNT_INDEX] = self._quantize(key[AMOUNT_INDEX], self.amount_step)
+        for i in RATIO_INDICES:
+            key[i] = self._quantize(key[i], self.ratio_step)
+        # -1, 0 or 1: below, on or above each threshold, compared unquantized
+        key.extend((values[i] > t) - (values[i] < t) for i, t in self.thresholds)
+        return tuple(key)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after the model is reloaded"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,105 @@
+"""Single-pass decoding of /predict-coins payloads.
+
+A payload is validated once into an ``ExpenseRequest`` with the timestamp
+already parsed into hour/weekday/month and the category resolved to its
+encoder id through a dict built from ``category_encoder.classes_`` at load
+time. Feature preparation, factor analysis and the fallback all read from it
+instead of re-parsing the JSON.
+
+A payload with a ``user_id`` may leave out the optional behavioural fields;
+they are then looked up from the caller's per-user aggregates (see
+feature_store.py) instead of taking the service defaults.
+"""
+import math
+from datetime import datetime
+
+# Service-side defaults for the optional behavioural features
+OPTIONAL_FIELDS = (
+    ('spending_velocity', 1.0),
+    ('category_frequency', 0.5),
+    ('budget_ratio', 0.5),
+)
+
+
+class RequestValidationError(ValueError):
+    """Malformed prediction payload; routes answer it with HTTP 400"""
+
+
+def build_category_index(classes):
+    """Map category label -> encoder id, matching LabelEncoder.transform"""
+    return {str(label): i for i, label in enumerate(classes)}
+
+
+def _number(payload, name, default=None):
+    value = payload.get(name)
+    if value is None:
+        if default is None:
+            raise RequestValidationError(f"Missing required field: {name}")
+        return default
+    if isinstance(value, bool):
+        raise RequestValidationError(f"Field '{name}' must be a number")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise RequestValidationError(f"Field '{name}' must be a number") from None
+    if not math.isfinite(number):
+        raise RequestValidationError(f"Field '{name}' must be finite")
+    return number
+
+
+class ExpenseRequest:
+    """A validated expense payload with derived model inputs"""
+
+    __slots__ = (
+        'amount', 'category', 'category_id', 'timestamp', 'when', 'hour', 'day_of_week',
+        'month', 'user_id', 'spending_velocity', 'category_frequency', 'budget_ratio',
+    )
+
+    @classmethod
+    def from_json(cls, payload, category_index=None, user_features=None):
+        """Validate a decoded JSON object; category_id is None for unknown categories.
+
+        user_features(user_id, amount, category, when) supplies the optional
+        fields missing from a payload that has a user_id.
+        """
+        if not isinstance(payload, dict):
+            raise RequestValidationError("Expense must be a JSON object")
+
+        self = cls()
+        self.amount = _number(payload, 'amount')
+
+        category = payload.get('category')
+        if not isinstance(category, str) or not category:
+            raise RequestValidationError("Field 'category' must be a non-empty string")
+        self.category = category
+        self.category_id = category_index.get(category) if category_index is not None else None
+
+        timestamp = payload.get('timestamp')
+        if not isinstance(timestamp, str):
+            raise RequestValidationError("Missing required field: timestamp")
+        try:
+            parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        except ValueError:
+            raise RequestValidationError(f"Invalid ISO 8601 timestamp: {timestamp!r}") from None
+        self.timestamp = timestamp
+        self.when = parsed
+        self.hour = parsed.hour
+        self.day_of_week = parsed.weekday()
+        self.month = parsed.month
+
+        user_id = payload.get('user_id')
+        if user_id is not None and (not isinstance(user_id, str) or not user_id):
+            raise RequestValidationError("Field 'user_id' must be a non-empty string")
+        self.user_id = user_id
+
+        defaults = dict(OPTIONAL_FIELDS)
+        if user_id is not None and user_features is not None and any(payload.get(name) is None for name in defaults):
+            defaults = user_features(user_id, self.amount, category, parsed)
+        for name, _ in OPTIONAL_FIELDS:
+            setattr(self, name, _number(payload, name, defaults[name]))
+        return self
+
+    def features(self):
+        """The 8 model inputs, in MLModelService.prepare_features order"""
+        return [self.amount, self.category_id, self.hour, self.day_of_week, self.month,
+                self.spending_velocity, self.category_frequency, self.budget_ratio]
@@ -0,0 +1,155 @@
+"""Per-user spending aggregates for filling in behavioural features.
+
+The frontend used to derive ``spending_velocity``, ``category_frequency``
+and ``budget_ratio`` by scanning a user's whole expense history on every
+preview. The store keeps running aggregates instead, in SQLite, and each
+recorded expense updates a constant number of rows:
+
+- ``user_totals``: expenses recorded per user
+- ``category_counts``: expenses per user and category
+- ``daily_counts``: expenses per user and calendar day (the rolling
+  30-day count sums at most 30 of these rows)
+- ``monthly_totals``: amount spent per user and calendar month
+
+Features are computed the way ``getMLCoinPrediction`` in
+``frontend/src/components/ExpenseForm.jsx`` does. Days and months follow
+the expense timestamp's wall-clock date.
+
+Each thread opens its own connection, and the database runs in WAL mode,
+so lookups from concurrent requests read in parallel. Writers wait only
+for each other, through SQLite's own locking.
+"""
+import os
+import sqlite3
+import threading
+from datetime import timedelta
+
+# Matches the frontend's assumed monthly budget
+DEFAULT_MONTHLY_BUDGET = 2000.0
+
+# Spending velocity is expenses per day over this many days
+VELOCITY_WINDOW_DAYS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_totals (
+    user_id TEXT PRIMARY KEY,
+    expense_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS category_counts (
+    user_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    expense_count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, category)
+);
+CREATE TABLE IF NOT EXISTS daily_counts (
+    user_id TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    expense_count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, day)
+);
+CREATE TABLE IF NOT EXISTS monthly_totals (
+    user_id TEXT NOT NULL,
+    month INTEGER NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (user_id, month)
+);
+"""
+
+
+def _month_key(when):
+    return when.year * 100 + when.month
+
+
+class FeatureStore:
+    """SQLite-backed per-user aggregates, safe to share between threads"""
+
+    def __init__(self, path, monthly_budget=DEFAULT_MONTHLY_BUDGET):
+        self.path = path
+        self.monthly_budget = monthly_budget
+        # One connection per thread
+        self._local = threading.local()
+        # Guards only the one-time schema setup
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self):
+        # Opened lazily, so a forked worker never inherits its parent's connection
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5.0)
+            # WAL lets readers (threads and worker processes) proceed while one writes
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with self._schema_lock:
+                if not self._schema_ready:
+                    connection.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.connection = connection
+        return connection
+
+    def reset_connection(self):
+        """Drop every thread's connection (e.g. after fork); each thread reopens its own"""
+        self._local = threading.local()
+
+    def record(self, user_id, amount, category, when):
+        """Add one expense to the user's aggregates"""
+        self.record_many([(user_id, amount, category, when)])
+
+    def record_many(self, expenses):
+        """Add (user_id, amount, category, when) rows in one transaction"""
+        users = [(user_id,) for user_id, _, _, _ in expenses]
+        categories = [(user_id, category) for user_id, _, category, _ in expenses]
+        days = [(user_id, when.toordinal()) for user_id, _, _, when in expenses]
+        months = [(user_id, _month_key(when), amount) for user_id, amount, _, when in expenses]
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                'INSERT INTO user_totals VALUES (?, 1) '
+                'ON CONFLICT(user_id) DO UPDATE SET expense_count = expense_count + 1',
+                users
+            )
+            connection.executemany(
+                'INSERT INTO category_counts VALUES (?, ?, 1) '
+                'ON CONFLICT(user_id, category) DO UPDATE SET expense_count = expense_count + 1',
+                categories
+            )
+            connection.executemany(
+                'INSERT INTO daily_counts VALUES (?, ?, 1) '
+                'ON CONFLICT(user_id, day) DO UPDATE SET expense_count = expense_count + 1',
+                days
+            )
+            connection.executemany(
+                'INSERT INTO monthly_totals VALUES (?, ?, ?) '
+                'ON CONFLICT(user_id, month) DO UPDATE SET total = total + excluded.total',
+                months
+            )
+
+    def features(self, user_id, amount, category, when):
+        """spending_velocity, category_frequency and budget_ratio for a new expense"""
+        window_start = (when - timedelta(days=VELOCITY_WINDOW_DAYS)).toordinal()
+        # One statement, so all four aggregates come from the same snapshot
+        total, in_category, recent, month_total = self._connect().execute(
+            'SELECT '
+            '(SELECT COALESCE(SUM(expense_count), 0) FROM user_totals WHERE user_id = :user), '
+            '(SELECT COALESCE(SUM(expense_count), 0) FROM category_counts '
+            ' WHERE user_id = :user AND category = :category), '
+            '(SELECT COALESCE(SUM(expense_count), 0) FROM daily_counts '
+            ' WHERE user_id = :user AND day > :window_start AND day <= :day), '
+            '(SELECT COALESCE(SUM(total), 0) FROM monthly_totals WHERE user_id = :user AND month = :month)',
+            {'user': user_id, 'category': category, 'window_start': window_start,
+             'day': when.toordinal(), 'month': _month_key(when)}
+        ).fetchone()
+        return {
+            "spending_velocity": recent / VELOCITY_WINDOW_DAYS,
+            "category_frequency": in_category / total if total > 0 else 0.5,
+            "budget_ratio": (month_total + amount) / self.monthly_budget,
+        }
+
+    def stats(self):
+        users, expenses = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(expense_count), 0) FROM user_totals'
+        ).fetchone()
+        return {"path": self.path, "users": users, "expenses": expenses}
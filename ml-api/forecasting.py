@@ -0,0 +1,95 @@
+"""Vectorized daily-spending forecasts for many users at once.
+
+Server-side equivalent of ``predictFutureSpending``/``linearRegression`` in
+``frontend/src/services/mlCoinService.js``: an ordinary least-squares line
+through each user's daily totals (x = 0, 1, ... n-1), extrapolated
+``forecast_days`` ahead. All users are fitted together on a zero-padded
+(users x days) matrix with closed-form sums, so the cost is a handful of
+NumPy passes however many users there are.
+"""
+import itertools
+
+import numpy as np
+
+# Users fitted per padded matrix, bounding memory for very large requests
+CHUNK_USERS = 10_000
+
+# Matches predictFutureSpending: fewer expenses than this is not enough history
+MIN_EXPENSES = 7
+
+# Largest daily total (in magnitude) accepted; keeps the regression sums far
+# from float64 overflow for any series a request can carry
+MAX_DAILY_AMOUNT = 1e12
+
+
+def _js_round(values):
+    """Math.round: halves round towards +infinity"""
+    return np.floor(values + 0.5)
+
+
+def _fit_chunk(series, forecast_days):
+    lengths = np.fromiter((len(s) for s in series), dtype=np.int64, count=len(series))
+    width = max(int(lengths.max()), 1)
+    present = np.arange(width) < lengths[:, None]
+    y = np.zeros((len(series), width))
+    # Row-major boolean assignment fills each row's leading cells in order
+    y[present] = np.fromiter(itertools.chain.from_iterable(series), dtype=np.float64, count=int(lengths.sum()))
+    if not np.isfinite(y).all():
+        raise ValueError("daily_spending values must be finite numbers")
+
+    n = lengths.astype(np.float64)
+    x = np.arange(width, dtype=np.float64)
+    # Overflow is reported below as a ValueError, not as RuntimeWarnings
+    with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        sum_x = n * (n - 1) / 2
+        sum_xx = (n - 1) * n * (2 * n - 1) / 6
+        sum_y = y.sum(axis=1)
+        sum_xy = y @ x
+
+        denominator = n * sum_xx - sum_x * sum_x
+        # A single day has no slope (the JS version yields NaN here)
+        slope = np.where(denominator != 0, (n * sum_xy - sum_x * sum_y) / denominator, 0.0)
+        intercept = np.where(n > 0, (sum_y - slope * sum_x) / n, 0.0)
+        residuals = np.where(present, y - (slope[:, None] * x + intercept[:, None]), 0.0)
+        variance = np.where(n > 0, (residuals ** 2).sum(axis=1) / n, np.inf)
+
+        future_x = n[:, None] + np.arange(forecast_days)
+        total = np.maximum(0.0, slope[:, None] * future_x + intercept[:, None]).sum(axis=1)
+    if not (np.isfinite(total).all() and np.isfinite(slope).all()):
+        raise ValueError("daily_spending values are too large to fit")
+    return total, slope, variance
+
+
+def forecast_spending(series, forecast_days=30, expense_counts=None):
+    """Forecast each user's spending over the next forecast_days days.
+
+    series is a list of per-user daily spending lists; expense_counts
+    optionally gives each user's number of expenses (defaults to the number
+    of days). Returns one dict per user shaped like the JS linearRegression
+    result, or the JS insufficient-data result for users with fewer than
+    seven expenses.
+    """
+    if expense_counts is None:
+        expense_counts = [len(s) for s in series]
+
+    results = []
+    for start in range(0, len(series), CHUNK_USERS):
+        chunk = series[start:start + CHUNK_USERS]
+        if not chunk:
+            continue
+        total, slope, variance = _fit_chunk(chunk, forecast_days)
+        prediction = _js_round(total)
+        daily_average = _js_round(total / forecast_days)
+        rounded_slope = _js_round(slope * 100) / 100
+        for i in range(len(chunk)):
+            if expense_counts[start + i] < MIN_EXPENSES:
+                results.append({"prediction": 0, "confidence": "low", "trend": "insufficient_data"})
+                continue
+            results.append({
+                "prediction": int(prediction[i]),
+                "confidence": "high" if variance[i] < 100 else "medium" if variance[i] < 500 else "low",
+                "trend": "increasing" if slope[i] > 1 else "decreasing" if slope[i] < -1 else "stable",
+                "dailyAverage": int(daily_average[i]),
+                "slope": float(rounded_slope[i]),
+            })
+    return results
@@ -0,0 +1,70 @@
+"""Prefork serving: load the model once in the master, fork one worker per core.
+
+With ``preload_app`` the master imports app.py (and builds ``ml_service``)
+before forking, so workers share the model, scaler, encoder and imported
+libraries through copy-on-write pages instead of each loading its own.
+``gc.freeze()`` moves everything allocated so far out of the collector's
+reach, so collections in a worker do not write to (and un-share) those pages.
+
+Run with:
+    gunicorn -c gunicorn.conf.py app:app
+"""
+import gc
+import os
+
+# One BLAS/OpenMP thread per worker; the workers themselves use the cores.
+# Must be set before numpy is imported by the preloaded app.
+for _name in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(_name, '1')
+
+_cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+
+bind = os.environ.get('ML_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('ML_WORKERS', len(_cpus)))
+threads = int(os.environ.get('ML_THREADS', 1))
+preload_app = True
+# Pin each worker to its own core (replacements take over a dead worker's core)
+_pin_workers = os.environ.get('ML_PIN_WORKERS', '1') == '1' and hasattr(os, 'sched_setaffinity')
+
+
+def when_ready(server):
+    # Runs in the master after the app is preloaded and before workers fork
+    import app as api
+    if api.ml_service.model_format == 'h5':
+        server.log.warning("Serving the h5 model: TensorFlow is not fork-safe, prefer the npz artifact")
+    api.warn_if_batching_starved(threads, 'ML_THREADS')
+    if workers > 1:
+        # Each worker would keep its own job table and swap only its own model
+        api.retrainer.disabled = f"Retraining needs a single worker (ML_WORKERS=1), this server runs {workers}"
+        server.log.warning("Retraining disabled: %s workers", workers)
+    gc.collect()
+    gc.freeze()
+
+
+def pre_fork(server, worker):
+    # Runs in the master, after dead workers are reaped: take the lowest free
+    # core, or the least shared one when there are more workers than cores
+    if _pin_workers:
+        taken = [getattr(other, 'cpu', None) for other in server.WORKERS.values()]
+        worker.cpu = min(_cpus, key=lambda cpu: (taken.count(cpu), cpu))
+
+
+def post_fork(server, worker):
+    import app as api
+    import logs
+    if _pin_workers:
+        os.sched_setaffinity(0, {worker.cpu})
+        server.log.info("Worker %s pinned to CPU %s", worker.pid, worker.cpu)
+    if 'ML_ADMISSION_WORKERS' not in os.environ and hasattr(os, 'sched_getaffinity'):
+        # A worker runs at most `threads` predictions at once, on its own cores
+        api.admission.workers = max(1, min(threads, len(os.sched_getaffinity(0))))
+    # Threads and connections do not survive fork
+    logs.restart_after_fork()
+    api.ml_service.after_fork()
+
+
+def worker_exit(server, worker):
+    # Daemon threads die with the worker: write out buffered prediction records first
+    import app as api
+    if api.ml_service.prediction_log is not None:
+        api.ml_service.prediction_log.close()
@@ -0,0 +1,275 @@
+"""Lightweight inference engines for the spending model.
+
+The coin model is a small stack of Dense layers, so running it through
+``model.predict`` (which sets up a tf.data pipeline per call) costs far more
+than the math itself. These helpers export the Dense weights once at load
+time and run the forward pass directly.
+
+The same weights can be loaded from the ``spending_model.npz`` artifact
+written by ``SpendingBehaviorModel.export_weights``, which needs only NumPy:
+``kernel_{i}``/``bias_{i}`` per Dense layer, ``activations``,
+``dropout_rates``, ``scaler_mean``/``scaler_scale``, ``categories`` and
+``features``. Version 2 adds ``precision``: ``float16`` artifacts store
+half-precision kernels (computed in float32 here, as NumPy has no fast
+float16 matmul on CPU); ``int8`` artifacts store int8 kernels with
+``kernel_scale_{i}`` per output channel.
+"""
+import numpy as np
+
+# Engines selectable through ML_INFERENCE_ENGINE
+ENGINES = ('numpy', 'keras_call', 'keras')
+
+# Highest .npz layout version this module understands
+WEIGHTS_FORMAT_VERSION = 2
+
+# Artifact precisions selectable through ML_MODEL_PRECISION
+PRECISIONS = ('float32', 'float16', 'int8')
+
+# MC dropout std (in coins) bounds for "high" and "medium" confidence, for
+# models exported without a calibration in model_metadata.json
+DEFAULT_CONFIDENCE_STD = (1.0, 2.5)
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0, out=x),
+    'sigmoid': lambda x: 1.0 / (1.0 + np.exp(-x)),
+    'tanh': np.tanh,
+}
+
+
+def _keep_mask(rng, shape, rate):
+    """Boolean dropout mask, True with probability 1 - rate.
+
+    Compares raw 16-bit random integers against the threshold, about 3x
+    faster than drawing floats with rng.random.
+    """
+    size = int(np.prod(shape))
+    bits = rng.bit_generator.random_raw((size + 3) // 4).view(np.uint16)[:size]
+    return (bits >= np.uint16(round(rate * 65536))).reshape(shape)
+
+
+class DenseStack:
+    """Pure-NumPy forward pass over exported Dense weights"""
+
+    precision = 'float32'
+
+    def __init__(self, layers, dtype=np.float32, dropout_rates=None):
+        self.dtype = dtype
+        # Rate of the Dropout following each Dense layer (0.0 when there is none)
+        self.dropout_rates = list(dropout_rates) if dropout_rates is not None else [0.0] * len(layers)
+        self.layers = []
+        for kernel, bias, activation in layers:
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Unsupported activation: {activation}")
+            self.layers.append((
+                np.ascontiguousarray(kernel, dtype=dtype),
+                np.ascontiguousarray(bias, dtype=dtype),
+                activation,
+            ))
+
+    @classmethod
+    def from_keras(cls, model, dtype=np.float32):
+        """Export the Dense layers of a Sequential model (Dropout is a no-op at inference)"""
+        layers = []
+        dropout_rates = []
+        for layer in model.layers:
+            kind = layer.__class__.__name__
+            if kind == 'Dropout':
+                if not dropout_rates:
+                    raise ValueError("Dropout before the first Dense layer is not supported")
+                dropout_rates[-1] = float(layer.rate)
+                continue
+            if kind != 'Dense':
+                raise ValueError(f"Unsupported layer type: {kind}")
+            kernel, bias = layer.get_weights()
+            layers.append((kernel, bias, layer.get_config()['activation']))
+            dropout_rates.append(0.0)
+        return cls(layers, dtype=dtype, dropout_rates=dropout_rates)
+
+    @classmethod
+    def from_npz(cls, data, dtype=np.float32):
+        """Build the stack from a loaded spending_model.npz"""
+        activations = [str(a) for a in data['activations']]
+        layers = [
+            (data[f'kernel_{i}'], data[f'bias_{i}'], activation)
+            for i, activation in enumerate(activations)
+        ]
+        stack = cls(layers, dtype=dtype, dropout_rates=data['dropout_rates'].tolist())
+        if 'precision' in data:
+            stack.precision = str(data['precision'])
+        return stack
+
+    @property
+    def input_dim(self):
+        return self.layers[0][0].shape[0]
+
+    def __call__(self, features):
+        x = np.asarray(features, dtype=self.dtype)
+        for kernel, bias, activation in self.layers:
+            x = x @ kernel
+            x += bias
+            x = ACTIVATIONS[activation](x)
+        return x
+
+    def _dense(self, i, x):
+        kernel, bias, activation = self.layers[i]
+        x = x @ kernel
+        x += bias
+        return ACTIVATIONS[activation](x)
+
+    def sample(self, features, samples, rng):
+        """Monte Carlo dropout: ``samples`` stochastic passes over each row in one batch.
+
+        The (n, d) input is tiled to (samples * n, d) and every Dropout
+        layer applies its own random mask, as in training. Returns the
+        per-row mean and standard deviation of the output, each shaped (n,).
+        """
+        x = np.asarray(features, dtype=self.dtype)
+        n_rows = len(x)
+        x = np.tile(x, (samples, 1))
+        for i, rate in enumerate(self.dropout_rates):
+            x = self._dense(i, x)
+            if rate > 0:
+                # Inverted dropout: keep with probability 1 - rate, rescale the survivors
+                np.multiply(x, _keep_mask(rng, x.shape, rate), out=x)
+                x *= np.float32(1.0 / (1.0 - rate))
+        outputs = x.reshape(samples, n_rows)
+        return outputs.mean(axis=0), outputs.std(axis=0)
+
+    def predict(self, features, verbose=0):
+        """Keras-compatible alias so the stack can stand in for a model"""
+        return self(features)
+
+
+class QuantizedDenseStack(DenseStack):
+    """Forward pass over int8 kernels with per-row dynamic int8 activations.
+
+    Activation scales are taken from each row at call time rather than
+    calibrated ranges, since serving inputs (e.g. any hour other than the
+    bundled dataset's constant 17) fall well outside the training range.
+    The integer matmul runs through float32 BLAS: every partial sum is an
+    integer below 2**24, so the result is exact.
+    """
+
+    precision = 'int8'
+
+    def __init__(self, layers, kernel_scales, dropout_rates=None):
+        self.dtype = np.float32
+        self.dropout_rates = list(dropout_rates) if dropout_rates is not None else [0.0] * len(layers)
+        self.layers = []
+        self.kernel_scales = []
+        for (kernel, bias, activation), kernel_scale in zip(layers, kernel_scales):
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Unsupported activation: {activation}")
+            if 127 * 127 * kernel.shape[0] >= 2 ** 24:
+                raise ValueError(f"Layer with {kernel.shape[0]} inputs is too wide for exact float32 accumulation")
+            self.layers.append((
+                np.ascontiguousarray(kernel, dtype=np.int8),
+                np.ascontiguousarray(bias, dtype=np.float32),
+                activation,
+            ))
+            self.kernel_scales.append(np.asarray(kernel_scale, dtype=np.float32))
+
+    @classmethod
+    def from_npz(cls, data, dtype=np.float32):
+        activations = [str(a) for a in data['activations']]
+        return cls(
+            [(data[f'kernel_{i}'], data[f'bias_{i}'], activation) for i, activation in enumerate(activations)],
+            [data[f'kernel_scale_{i}'] for i in range(len(activations))],
+            dropout_rates=data['dropout_rates'].tolist(),
+        )
+
+    def __call__(self, features):
+        x = np.asarray(features, dtype=np.float32)
+        for i in range(len(self.layers)):
+            x = self._dense(i, x)
+        return x
+
+    def _dense(self, i, x):
+        kernel, bias, activation = self.layers[i]
+        peak = np.max(np.abs(x), axis=1, keepdims=True)
+        input_scale = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+        x = np.rint(x / input_scale) @ kernel.astype(np.float32)
+        x *= input_scale * self.kernel_scales[i]
+        x += bias
+        return ACTIVATIONS[activation](x)
+
+
+def build_engine(name, model):
+    """Return a callable mapping a scaled (n, 8) feature matrix to (n, 1) predictions"""
+    if name == 'numpy':
+        return DenseStack.from_keras(model)
+
+    if name == 'keras_call':
+        import tensorflow as tf
+
+        input_dim = model.layers[0].get_weights()[0].shape[0]
+        forward = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec(shape=[None, input_dim], dtype=tf.float32)],
+        )
+        return lambda features: forward(tf.convert_to_tensor(features, dtype=tf.float32)).numpy()
+
+    if name == 'keras':
+        return lambda features: model.predict(features, verbose=0)
+
+    raise ValueError(f"Unknown inference engine '{name}', expected one of {ENGINES}")
+
+
+def confidence_label(std, thresholds=DEFAULT_CONFIDENCE_STD):
+    """'high', 'medium' or 'low' for an MC dropout std, given the (high, medium) std bounds"""
+    high, medium = thresholds
+    if std < high:
+        return "high"
+    if std < medium:
+        return "medium"
+    return "low"
+
+
+def parity_error(reference, candidate, input_dim, samples=256, seed=0):
+    """Max absolute difference between two engines on random scaled inputs"""
+    rng = np.random.default_rng(seed)
+    # Scaled features are roughly standard normal; widen the range to cover outliers
+    features = rng.normal(scale=2.0, size=(samples, input_dim)).astype(np.float32)
+    expected = np.asarray(reference(features), dtype=np.float64).reshape(-1)
+    actual = np.asarray(candidate(features), dtype=np.float64).reshape(-1)
+    return float(np.max(np.abs(expected - actual)))
+
+
+class ArrayScaler:
+    """StandardScaler.transform from exported mean/scale, without scikit-learn"""
+
+    def __init__(self, mean, scale):
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+
+    def transform(self, features):
+        return (np.asarray(features, dtype=np.float64) - self.mean_) / self.scale_
+
+
+class ArrayLabelEncoder:
+    """LabelEncoder.transform from exported classes, without scikit-learn"""
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+        self._index = {str(label): i for i, label in enumerate(self.classes_)}
+
+    def transform(self, labels):
+        try:
+            return np.array([self._index[str(label)] for label in labels], dtype=np.int64)
+        except KeyError as e:
+            raise ValueError(f"y contains previously unseen labels: {e.args[0]!r}") from None
+
+
+def load_artifact(npz_path):
+    """Load (model, scaler, category_encoder) from a spending_model.npz file"""
+    with np.load(npz_path, allow_pickle=False) as data:
+        version = int(data['format_version'])
+        if version > WEIGHTS_FORMAT_VERSION:
+            raise ValueError(f"Unsupported weights format version {version}")
+        precision = str(data['precision']) if 'precision' in data else 'float32'
+        stack = QuantizedDenseStack if precision == 'int8' else DenseStack
+        model = stack.from_npz(data)
+        scaler = ArrayScaler(data['scaler_mean'], data['scaler_scale'])
+        category_encoder = ArrayLabelEncoder(data['categories'])
+    return model, scaler, category_encoder
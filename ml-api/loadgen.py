@@ -0,0 +1,323 @@
+"""Synthetic load generator and traffic replay for the ML API.
+
+Generates expense payloads whose category mix and per-column distributions
+follow ``finlit_expenses_dataset.csv``. Amounts are drawn per category, and
+the other numeric columns from the dataset's empirical quantiles. The
+payloads are replayed against a running instance at a target request rate
+(open loop) or with a fixed number of concurrent clients (closed loop).
+
+In open-loop runs, latency is measured from the moment a request was
+scheduled, not the moment it was sent. A server that falls behind
+therefore shows up in the percentiles instead of silently lowering the
+offered load.
+
+The ``keystrokes`` mode mimics ``ExpenseForm.jsx``: the user types an
+amount one character at a time, and a preview request fires whenever
+typing pauses for longer than the form's 500 ms debounce. A final request
+is made on submit.
+
+Usage:
+    python loadgen.py generate --rows 1000000 --output payloads.jsonl
+    python loadgen.py replay --rps 500 --duration 30
+    python loadgen.py replay --concurrency 1 2 4 8 --requests 5000
+    python loadgen.py replay --payloads payloads.jsonl --rps 200 --output report.json
+    python loadgen.py keystrokes --sessions-per-sec 20 --duration 60
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ml_model', 'finlit_expenses_dataset.csv')
+
+# Columns sampled from the dataset's quantiles, independently of each other
+FEATURE_COLUMNS = ('spending_velocity', 'category_frequency', 'budget_ratio')
+
+# Quantiles kept per column (and per category for amounts)
+QUANTILES = np.linspace(0, 1, 101)
+
+# ExpenseForm.jsx waits this long after the last keystroke before previewing
+DEBOUNCE_MS = 500
+# Median gap between keystrokes, and the spread of its log-normal distribution
+KEYSTROKE_GAP_MS = 180
+KEYSTROKE_GAP_SIGMA = 0.6
+# Pause between the last preview and pressing submit
+SUBMIT_DELAY_MS = 1500
+
+
+def load_profile(csv_path=DEFAULT_DATASET):
+    """Category mix and quantile tables describing an expense CSV"""
+    df = pd.read_csv(csv_path)
+    mix = df['category'].value_counts(normalize=True)
+    categories = mix.index.to_numpy(dtype=object)
+    return {
+        "categories": categories,
+        "category_weights": mix.to_numpy(),
+        "amount_quantiles": np.stack([
+            np.quantile(df.loc[df['category'] == category, 'amount'], QUANTILES) for category in categories
+        ]),
+        "feature_quantiles": {column: np.quantile(df[column], QUANTILES) for column in FEATURE_COLUMNS},
+        "timestamps": df['timestamp'].to_numpy(dtype=object),
+    }
+
+
+def _inverse_cdf(table, u):
+    """Sample through quantile tables: row i of table for each u[i], or one shared 1-D table"""
+    position = u * (table.shape[-1] - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, table.shape[-1] - 1)
+    weight = position - lower
+    if table.ndim == 1:
+        return table[lower] * (1 - weight) + table[upper] * weight
+    rows = np.arange(len(u))
+    return table[rows, lower] * (1 - weight) + table[rows, upper] * weight
+
+
+def generate_expenses(n_rows, profile, seed=0):
+    """n_rows synthetic /predict-coins payloads as a DataFrame, built column by column"""
+    rng = np.random.default_rng(seed)
+    category_ids = rng.choice(len(profile["categories"]), size=n_rows, p=profile["category_weights"])
+    df = pd.DataFrame({
+        "amount": _inverse_cdf(profile["amount_quantiles"][category_ids], rng.random(n_rows)).round(2),
+        "category": profile["categories"][category_ids],
+        "timestamp": profile["timestamps"][rng.integers(0, len(profile["timestamps"]), n_rows)],
+    })
+    for column, table in profile["feature_quantiles"].items():
+        df[column] = _inverse_cdf(table, rng.random(n_rows)).round(2)
+    return df
+
+
+def to_bodies(df):
+    """Encode each row as a JSON request body"""
+    if df.empty:
+        return []
+    return df.to_json(orient='records', lines=True).encode().splitlines()
+
+
+def read_bodies(path):
+    """Request bodies from a JSON-lines file (one payload per line)"""
+    with open(path, 'rb') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def keystroke_schedule(profile, sessions_per_sec, duration, seed=0, debounce_ms=DEBOUNCE_MS):
+    """Request offsets (seconds) and bodies for simulated form sessions.
+
+    Sessions start as a Poisson process. In each session the amount is
+    typed one character at a time, and a preview fires after every pause
+    longer than the debounce; the final amount is also sent on submit.
+    """
+    rng = np.random.default_rng(seed)
+    n_sessions = rng.poisson(sessions_per_sec * duration)
+    starts = np.sort(rng.uniform(0, duration, n_sessions))
+    expenses = generate_expenses(n_sessions, profile, seed).to_dict(orient='records')
+
+    offsets, bodies = [], []
+    for start, expense in zip(starts, expenses):
+        typed = f"{expense['amount']:.2f}".rstrip('0').rstrip('.')
+        gaps = rng.lognormal(np.log(KEYSTROKE_GAP_MS), KEYSTROKE_GAP_SIGMA, len(typed)) / 1000
+        keystroke_times = start + np.cumsum(gaps)
+        # The pause after the last keystroke is the submit delay
+        pauses = np.append(np.diff(keystroke_times), SUBMIT_DELAY_MS / 1000)
+        for length in np.flatnonzero(pauses > debounce_ms / 1000) + 1:
+            amount = float(typed[:length])
+            if amount <= 0:
+                # The form skips the preview for empty or zero amounts
+                continue
+            offsets.append(keystroke_times[length - 1] + debounce_ms / 1000)
+            bodies.append(json.dumps(dict(expense, amount=amount)).encode())
+        offsets.append(keystroke_times[-1] + SUBMIT_DELAY_MS / 1000)
+        bodies.append(json.dumps(expense).encode())
+
+    order = np.argsort(offsets, kind='stable')
+    return np.asarray(offsets)[order], [bodies[i] for i in order], n_sessions
+
+
+def replay(url, bodies, offsets=None, concurrency=8, timeout=10.0):
+    """Send bodies to url from concurrency client threads.
+
+    With offsets (seconds from the start, ascending) request i is due at
+    offsets[i] and its latency counts from then; without, each client sends
+    its next request as soon as the previous one finishes. Returns per-request
+    latency, service time and HTTP status (0 for connection errors).
+    """
+    target = urlsplit(url)
+    n = len(bodies)
+    latency = np.full(n, np.nan)
+    service = np.full(n, np.nan)
+    status = np.zeros(n, dtype=np.int16)
+    errors = {}
+    errors_lock = threading.Lock()
+    # next() on itertools.count is atomic under the GIL
+    indices = itertools.count()
+    headers = {'Content-Type': 'application/json'}
+
+    def client():
+        connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=timeout)
+        while True:
+            i = next(indices)
+            if i >= n:
+                break
+            due = started + offsets[i] if offsets is not None else None
+            if due is not None:
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sent = time.perf_counter()
+            try:
+                connection.request('POST', target.path or '/', body=bodies[i], headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status[i] = response.status
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                with errors_lock:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            finished = time.perf_counter()
+            service[i] = finished - sent
+            latency[i] = finished - (due if due is not None else sent)
+        connection.close()
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {"latency": latency, "service": service, "status": status, "errors": errors, "elapsed": elapsed}
+
+
+def _percentiles(samples):
+    samples = samples[~np.isnan(samples)]
+    if not len(samples):
+        return None
+    p50, p90, p95, p99, p999 = np.percentile(samples, [50, 90, 95, 99, 99.9]) * 1000
+    return {
+        "mean_ms": float(samples.mean() * 1000), "p50_ms": float(p50), "p90_ms": float(p90),
+        "p95_ms": float(p95), "p99_ms": float(p99), "p999_ms": float(p999),
+        "max_ms": float(samples.max() * 1000),
+    }
+
+
+def summarize(name, run, offered_rps=None, concurrency=None):
+    status = run["status"]
+    sent = len(status)
+    ok = int(((status >= 200) & (status < 300)).sum())
+    codes, counts = np.unique(status, return_counts=True)
+    return {
+        "name": name,
+        "requests": sent,
+        "concurrency": concurrency,
+        "offered_rps": offered_rps,
+        "achieved_rps": float(sent / run["elapsed"]) if run["elapsed"] > 0 else None,
+        "elapsed_s": float(run["elapsed"]),
+        "error_rate": float(1 - ok / sent) if sent else None,
+        "status_counts": {("connection_error" if code == 0 else str(code)): int(count) for code, count in zip(codes, counts)},
+        "connection_errors": run["errors"],
+        "latency": _percentiles(run["latency"]),
+        "service_time": _percentiles(run["service"]),
+    }
+
+
+def arrival_offsets(n, rps, poisson, seed=0):
+    """Send times for n requests at rps: evenly spaced, or Poisson arrivals"""
+    if poisson:
+        return np.cumsum(np.random.default_rng(seed).exponential(1 / rps, n))
+    return np.arange(n) / rps
+
+
+def main(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--dataset", default=DEFAULT_DATASET, help="CSV whose distributions payloads follow")
+    common.add_argument("--seed", type=int, default=0)
+    common.add_argument("--output", help="Generated payloads (generate) or the JSON report (replay, keystrokes)")
+    parser = argparse.ArgumentParser(description="Generate and replay FinQuest ML API load")
+    modes = parser.add_subparsers(dest="mode", required=True)
+
+    generate = modes.add_parser("generate", parents=[common], help="Write synthetic payloads as JSON lines")
+    generate.add_argument("--rows", type=int, default=100_000)
+
+    for name in ("replay", "keystrokes"):
+        mode = modes.add_parser(name, parents=[common])
+        mode.add_argument("--url", default="http://127.0.0.1:5000/predict-coins")
+        mode.add_argument("--duration", type=float, default=30.0, help="Seconds of open-loop traffic")
+        mode.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout in seconds")
+    replay_mode = modes.choices["replay"]
+    replay_mode.add_argument("--payloads", help="JSON-lines payloads to replay instead of synthetic ones")
+    replay_mode.add_argument("--rps", type=float, help="Open-loop target rate; omit for closed-loop runs")
+    replay_mode.add_argument("--poisson", action="store_true", help="Poisson arrivals instead of even spacing")
+    replay_mode.add_argument("--concurrency", type=int, nargs="+", default=[8],
+                             help="Client threads; several values run one closed-loop step each")
+    replay_mode.add_argument("--requests", type=int, default=2000, help="Requests per closed-loop step")
+    keystrokes_mode = modes.choices["keystrokes"]
+    keystrokes_mode.add_argument("--sessions-per-sec", type=float, default=10.0)
+    keystrokes_mode.add_argument("--debounce-ms", type=float, default=DEBOUNCE_MS,
+                                 help="0 previews on every keystroke")
+    keystrokes_mode.add_argument("--concurrency", type=int, default=64, help="Client threads")
+    args = parser.parse_args(argv)
+
+    profile = load_profile(args.dataset)
+    if args.mode == "generate":
+        started = time.perf_counter()
+        df = generate_expenses(args.rows, profile, args.seed)
+        df.to_json(args.output or "payloads.jsonl", orient='records', lines=True)
+        print(json.dumps({"rows": args.rows, "output": args.output or "payloads.jsonl",
+                          "seconds": round(time.perf_counter() - started, 3)}))
+        return
+
+    results = []
+    if args.mode == "keystrokes":
+        offsets, bodies, sessions = keystroke_schedule(
+            profile, args.sessions_per_sec, args.duration, args.seed, args.debounce_ms
+        )
+        result = summarize("keystrokes", replay(args.url, bodies, offsets, args.concurrency, args.timeout),
+                           offered_rps=len(bodies) / args.duration, concurrency=args.concurrency)
+        result.update(sessions=sessions, requests_per_session=len(bodies) / sessions if sessions else None)
+        results.append(result)
+    elif args.rps:
+        n = int(args.rps * args.duration)
+        bodies = read_bodies(args.payloads) if args.payloads else to_bodies(generate_expenses(n, profile, args.seed))
+        bodies = list(itertools.islice(itertools.cycle(bodies), n))
+        offsets = arrival_offsets(n, args.rps, args.poisson, args.seed)
+        concurrency = max(args.concurrency)
+        results.append(summarize("open_loop", replay(args.url, bodies, offsets, concurrency, args.timeout),
+                                 offered_rps=args.rps, concurrency=concurrency))
+    else:
+        bodies = read_bodies(args.payloads) if args.payloads else to_bodies(
+            generate_expenses(args.requests, profile, args.seed))
+        bodies = list(itertools.islice(itertools.cycle(bodies), args.requests))
+        for concurrency in args.concurrency:
+            results.append(summarize(f"closed_loop[concurrency={concurrency}]",
+                                     replay(args.url, bodies, None, concurrency, args.timeout),
+                                     concurrency=concurrency))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "url": args.url,
+            "mode": args.mode,
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    return report
+
+
+if __name__ == '__main__':
+    main()
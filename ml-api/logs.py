@@ -0,0 +1,77 @@
+"""Structured, asynchronous logging for the ML API.
+
+Loggers under ``ml_api`` hand records to a QueueHandler, which only
+enqueues them; a QueueListener thread formats and writes them, so request
+threads never wait on stderr. Records are emitted as one JSON object per
+line, with any ``extra={...}`` fields as top-level keys.
+"""
+import atexit
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+ROOT_LOGGER = 'ml_api'
+
+# Attributes every LogRecord has; anything else came in through extra=
+_STANDARD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg and extra fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _STANDARD_ATTRS)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def get_logger(name):
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+
+def configure_logging(level='INFO', fmt='json'):
+    """Send ml_api.* records through a queue to a background writer thread"""
+    global _listener
+    if _listener is not None:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger(ROOT_LOGGER)
+    root.handlers = [QueueHandler(log_queue)]
+    root.setLevel(level)
+    root.propagate = False
+
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop)
+
+
+def restart_after_fork():
+    """Start a writer thread in a forked child (threads do not survive fork)"""
+    global _listener
+    if _listener is not None:
+        _listener = QueueListener(_listener.queue, *_listener.handlers, respect_handler_level=True)
+        _listener.start()
+
+
+def _stop():
+    # Flush whatever is still queued at interpreter exit
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
@@ -0,0 +1,224 @@
+"""Low-overhead Prometheus metrics and an opt-in sampling profiler.
+
+Metrics are plain Python objects guarded by a lock each, cheap enough to
+stay enabled under production load (an observation is a bisect and two
+additions). ``REGISTRY.render()`` produces the Prometheus text exposition
+format served on ``/metrics``.
+"""
+import bisect
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+
+# Latency buckets in seconds, from 10us (in-process stages) to 5s (slow requests)
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(label_name, label_value, extra=None):
+    labels = []
+    if label_name is not None:
+        labels.append(f'{label_name}="{label_value}"')
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram with an optional single label"""
+
+    def __init__(self, name, documentation, label_name=None, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_name = label_name
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, label=None):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                # Per-bucket counts plus a final +Inf bucket, then sum
+                series = self._series[label] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = {label: (list(counts), total) for label, (counts, total) in self._series.items()}
+        for label, (counts, total) in sorted(snapshot.items(), key=lambda item: str(item[0])):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_name, label, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_name, label)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_name, label)} {cumulative}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter with an optional single label"""
+
+    def __init__(self, name, documentation, label_name=None):
+        self.name = name
+        self.documentation = documentation
+        self.label_name = label_name
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, label=None):
+        with self._lock:
+            self._values[label] = self._values.get(label, 0) + amount
+
+    def value(self, label=None):
+        with self._lock:
+            return self._values.get(label, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = dict(self._values)
+        for label, value in sorted(values.items(), key=lambda item: str(item[0])):
+            lines.append(f'{self.name}{_format_labels(self.label_name, label)} {_format_value(value)}')
+        return lines
+
+
+class Gauge:
+    """Last-value gauge"""
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._value = 0.0
+
+    def set(self, value):
+        self._value = float(value)
+
+    def render(self):
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} gauge',
+            f'{self.name} {_format_value(self._value)}',
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+PREDICT_STAGE_SECONDS = REGISTRY.register(Histogram(
+    'ml_predict_stage_seconds', 'Time spent in each stage of a coin prediction', label_name='stage'
+))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'ml_http_request_seconds', 'End-to-end request handling time by route', label_name='route'
+))
+FALLBACK_PREDICTIONS = REGISTRY.register(Counter(
+    'ml_fallback_predictions_total', 'Predictions served by the rule-based fallback', label_name='reason'
+))
+MODEL_LOADS = REGISTRY.register(Counter(
+    'ml_model_loads_total', 'Model load attempts by outcome', label_name='outcome'
+))
+MODEL_LOAD_SECONDS = REGISTRY.register(Gauge(
+    'ml_model_load_seconds', 'Duration of the most recent model load'
+))
+RETRAIN_JOBS = REGISTRY.register(Counter(
+    'ml_retrain_jobs_total', 'Finished retraining jobs by outcome', label_name='outcome'
+))
+MODEL_VERSION_PREDICT_SECONDS = REGISTRY.register(Histogram(
+    'ml_model_version_predict_seconds', 'Prediction time per request by model version', label_name='version'
+))
+MODEL_VERSION_COINS = REGISTRY.register(Histogram(
+    'ml_model_version_coins', 'Distribution of predicted coins by model version', label_name='version',
+    buckets=(1, 2, 3, 5, 8, 10, 12, 15, 20, 25, 30, 40, 50)
+))
+LOAD_SHED = REGISTRY.register(Counter(
+    'ml_load_shed_total', 'Predictions shed to the rule-based fallback by admission control', label_name='reason'
+))
+ADMISSION_IN_FLIGHT = REGISTRY.register(Gauge(
+    'ml_admission_in_flight', 'Admitted /predict-coins requests not yet completed'
+))
+PREDICTION_LOG_WRITTEN = REGISTRY.register(Counter(
+    'ml_prediction_log_written_total', 'Prediction records written to the prediction log'
+))
+PREDICTION_LOG_DROPPED = REGISTRY.register(Counter(
+    'ml_prediction_log_dropped_total', 'Prediction records dropped because the log buffer was full'
+))
+
+
+class SamplingProfiler:
+    """Sample one thread's Python stack at a fixed interval.
+
+    Used as a context manager around a single request. Produces collapsed
+    stacks (``outer;inner;leaf`` -> sample count), the input format of
+    flamegraph tools.
+    """
+
+    def __init__(self, interval=0.001, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.stacks = _Tally()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{frame.f_lineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self._started
+        return False
+
+    def report(self, top=25):
+        return {
+            "interval_ms": self.interval * 1000.0,
+            "elapsed_ms": self.elapsed * 1000.0,
+            "samples": self.samples,
+            "stacks": dict(self.stacks.most_common(top)),
+        }
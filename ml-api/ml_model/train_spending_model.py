@@ -7,12 +7,269 @@ from sklearn.model_selection import train_test_split
 import joblib
 import json
 import datetime
+import time
+import argparse
+import itertools
+import glob
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+FEATURE_NAMES = ['amount','category','hour','day_of_week','month',
+                 'spending_velocity','category_frequency','budget_ratio']
+
+# Layout version of the .npz weights artifact read by ml-api/inference.py
+# (2 adds the precision field and int8 kernel scales)
+WEIGHTS_FORMAT_VERSION = 2
+
+# Reduced-precision variants written next to spending_model.npz
+QUANTIZED_PRECISIONS = ('float16', 'int8')
+
+# Training rows kept for the accuracy report of quantized exports
+REFERENCE_ROWS = 10_000
+
+# MC dropout passes per row (the API's ML_MC_DROPOUT_SAMPLES default) and the
+# holdout std quantiles below which predictions are labelled "high" and
+# "medium" confidence: roughly a third of predictions get each label
+CONFIDENCE_SAMPLES = 32
+CONFIDENCE_QUANTILES = (1 / 3, 2 / 3)
+
+# Layout version of the columnar dataset written by convert_csv_to_columnar
+COLUMNAR_FORMAT_VERSION = 1
+
+CATEGORIES = ['education', 'entertainment', 'food', 'healthcare', 'other',
+              'savings', 'shopping', 'transportation', 'travel', 'utilities']
+HEALTHY_CATEGORIES = ['food', 'healthcare', 'education', 'savings', 'utilities']
+
+# Defaults used when an expense has no value for an optional feature
+FEATURE_DEFAULTS = {"spending_velocity": 0, "category_frequency": 0, "budget_ratio": 0.5}
+
+# Default network: Dense layer widths, and the dropout applied after each
+DEFAULT_HIDDEN_UNITS = (64, 32, 16)
+DEFAULT_DROPOUT_RATES = (0.3, 0.2, 0.0)
+
+# Hyperparameters a search space may vary (everything else comes from the CLI)
+SEARCH_PARAMETERS = ('hidden_units', 'dropout_rates', 'learning_rate', 'batch_size', 'epochs', 'lr_scaling')
+
+# Adam's default learning rate, tuned for the default batch size; larger
+# batches scale it up (see scaled_learning_rate)
+BASE_LEARNING_RATE = 0.001
+BASE_BATCH_SIZE = 32
+
+
+def configure_cpu_threads(intra_op=None, inter_op=None):
+    """
+    Set TensorFlow's intra-op (threads inside one kernel) and inter-op
+    (kernels run in parallel) pool sizes. Only takes effect before
+    TensorFlow executes its first op; None keeps TensorFlow's default.
+    """
+    if intra_op is not None:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+    if inter_op is not None:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    return {
+        "intra_op": tf.config.threading.get_intra_op_parallelism_threads(),
+        "inter_op": tf.config.threading.get_inter_op_parallelism_threads(),
+    }
+
+
+def scaled_learning_rate(batch_size, scaling=None):
+    """
+    Learning rate for batch_size: 'linear' scales BASE_LEARNING_RATE by
+    batch_size / BASE_BATCH_SIZE, 'sqrt' by its square root (gentler, and
+    usually the safer choice with Adam), None keeps it
+    """
+    ratio = batch_size / BASE_BATCH_SIZE
+    if scaling == 'linear':
+        return BASE_LEARNING_RATE * ratio
+    if scaling == 'sqrt':
+        return BASE_LEARNING_RATE * ratio ** 0.5
+    if scaling is None:
+        return BASE_LEARNING_RATE
+    raise ValueError(f"Unknown learning rate scaling '{scaling}'")
+
+
+def make_dataset(X, y, batch_size, shuffle=False, seed=42):
+    """
+    tf.data pipeline over in-memory (or memory-mapped) arrays, converted
+    to float32 tensors once. Training batches are gathered from a fresh
+    permutation every epoch, so shuffling is one vectorized op rather than
+    a per-row buffer; evaluation batches are cached after the first pass.
+    Both are prefetched so the next batch is ready while the current one
+    trains.
+    """
+    features = tf.constant(np.asarray(X, dtype=np.float32))
+    labels = tf.constant(np.asarray(y, dtype=np.float32))
+    if not shuffle:
+        return tf.data.Dataset.from_tensor_slices((features, labels)).batch(batch_size).cache().prefetch(tf.data.AUTOTUNE)
+
+    n_rows = len(X)
+    # Rows past the last full batch sit out this epoch; the next permutation differs
+    n_batches = max(n_rows // batch_size, 1)
+    rows_per_epoch = min(n_batches * batch_size, n_rows)
+    generator = tf.random.Generator.from_seed(seed)
+
+    def epoch_batches(_):
+        order = tf.argsort(generator.uniform([n_rows]))[:rows_per_epoch]
+        return tf.data.Dataset.from_tensor_slices(tf.reshape(order, (n_batches, -1)))
+
+    return (
+        tf.data.Dataset.range(1)
+        .flat_map(epoch_batches)
+        .map(lambda rows: (tf.gather(features, rows), tf.gather(labels, rows)), num_parallel_calls=tf.data.AUTOTUNE)
+        # flat_map hides the length; Keras needs it to tell a finished epoch from exhausted data
+        .apply(tf.data.experimental.assert_cardinality(n_batches))
+        .prefetch(tf.data.AUTOTUNE)
+    )
+
+
+class ThroughputLogger(keras.callbacks.Callback):
+    """Record and print wall-clock time and training samples/sec per epoch"""
+
+    def __init__(self, n_samples, verbose=1):
+        super().__init__()
+        self.n_samples = n_samples
+        self.verbose = verbose
+        self.epochs = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._started = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self._started
+        self.epochs.append({"epoch": epoch + 1, "seconds": elapsed, "samples_per_sec": self.n_samples / elapsed})
+        if self.verbose:
+            print(f"Epoch {epoch + 1}: {elapsed:.2f}s, {self.n_samples / elapsed:,.0f} samples/sec")
+
+    def summary(self):
+        """Mean over epochs after the first, which includes tracing and cache fills"""
+        steady = self.epochs[1:] or self.epochs
+        return {
+            "epochs": len(self.epochs),
+            "first_epoch_seconds": self.epochs[0]["seconds"] if self.epochs else None,
+            "mean_epoch_seconds": float(np.mean([e["seconds"] for e in steady])) if steady else None,
+            "samples_per_sec": float(np.mean([e["samples_per_sec"] for e in steady])) if steady else None,
+        }
+
+
+def load_holdout(path):
+    """(features, categories, labels) saved next to a model by save_model, or None"""
+    holdout_path = os.path.join(path, 'holdout.npz')
+    if not os.path.exists(holdout_path):
+        return None
+    with np.load(holdout_path, allow_pickle=False) as data:
+        return data['features'], data['categories'], data['labels']
+
+
+def holdout_mask(offset, n_rows, validation_split=0.2):
+    """
+    Deterministic per-row validation assignment for streaming training:
+    hashes the global row index, so the split is the same on every pass
+    and independent of chunk size
+    """
+    index = np.arange(offset, offset + n_rows, dtype=np.uint64)
+    hashed = (index * np.uint64(2654435761)) & np.uint64(0xFFFFFFFF)
+    return hashed < np.uint64(int(validation_split * 2**32))
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 1.0 / (1.0 + np.exp(-x)),
+    'tanh': np.tanh,
+}
+
+
+def reference_sample(X, rows=REFERENCE_ROWS, seed=0):
+    """Fixed random subset of scaled training rows for quantization reports"""
+    if len(X) > rows:
+        X = X[np.sort(np.random.default_rng(seed).choice(len(X), rows, replace=False))]
+    return np.asarray(X, dtype=np.float32)
+
+
+def mc_dropout_std(layers, X, samples=CONFIDENCE_SAMPLES, seed=0):
+    """
+    Per-row std of samples MC dropout passes over (kernel, bias, activation,
+    dropout_rate) layers, computed like DenseStack.sample in ml-api/inference.py
+    """
+    rng = np.random.default_rng(seed)
+    x = np.tile(np.asarray(X, dtype=np.float32), (samples, 1))
+    for kernel, bias, activation, rate in layers:
+        x = ACTIVATIONS[activation](x @ kernel + bias)
+        if rate > 0:
+            x = x * (rng.random(x.shape) >= rate) / np.float32(1.0 - rate)
+    return x.reshape(samples, len(X)).std(axis=0)
+
+
+def confidence_calibration(layers, X):
+    """MC dropout std thresholds for the API's confidence labels, from the spread on rows X"""
+    high, medium = np.quantile(mc_dropout_std(layers, X), CONFIDENCE_QUANTILES)
+    return {
+        'std_high': float(high),
+        'std_medium': float(medium),
+        'quantiles': list(CONFIDENCE_QUANTILES),
+        'samples': CONFIDENCE_SAMPLES,
+        'rows': int(len(X)),
+    }
+
+
+def quantize_symmetric(values, axis=None):
+    """
+    Symmetric int8 quantization with one scale per slice along axis (or
+    one overall); returns (int8 values, float32 scales)
+    """
+    peak = np.max(np.abs(values), axis=axis, keepdims=True)
+    scale = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+    quantized = np.clip(np.rint(values / scale), -127, 127).astype(np.int8)
+    return quantized, (scale.squeeze(axis) if axis is not None else scale.reshape(()))
+
+
+def dense_forward(arrays, activations, X):
+    """
+    NumPy forward pass over exported weight arrays, computed the way
+    ml-api/inference.py serves each precision
+    """
+    x = np.asarray(X, dtype=np.float32)
+    for i, activation in enumerate(activations):
+        kernel = arrays[f'kernel_{i}']
+        if kernel.dtype == np.int8:
+            x_q, input_scale = quantize_symmetric(x, axis=1)
+            x = (x_q.astype(np.int32) @ kernel.astype(np.int32)).astype(np.float32)
+            x *= input_scale[:, None] * arrays[f'kernel_scale_{i}']
+        else:
+            x = x @ kernel.astype(np.float32)
+        x = ACTIVATIONS[activation](x + arrays[f'bias_{i}'])
+    return x
+
+
+def coin_delta_report(reference, candidate):
+    """Accuracy cost of a reduced-precision variant, in coins after the 1-50 clamp"""
+    reference = reference.reshape(-1).astype(np.float64)
+    candidate = candidate.reshape(-1).astype(np.float64)
+    reference_coins = np.clip(np.trunc(reference), 1, 50)
+    candidate_coins = np.clip(np.trunc(candidate), 1, 50)
+    return {
+        'rows': int(len(reference)),
+        'raw_mae': float(np.mean(np.abs(candidate - reference))),
+        'raw_max_error': float(np.max(np.abs(candidate - reference))),
+        'coin_mae': float(np.mean(np.abs(candidate_coins - reference_coins))),
+        'coins_changed_pct': float(np.mean(candidate_coins != reference_coins) * 100),
+    }
+
 
 class SpendingBehaviorModel:
     def __init__(self):
         self.model = None
         self.scaler = StandardScaler()
         self.category_encoder = LabelEncoder()
+        # Scaled training rows used to measure the accuracy of quantized exports
+        self.reference_features = None
+        # Fit settings and per-epoch throughput of the last train_arrays call
+        self.training_profile = None
+        # Unscaled (features, labels) of the rows train_arrays held out; saved
+        # as holdout.npz so retraining can validate on rows this model never saw
+        self.holdout = None
 
     def load_data_from_csv(self, csv_path):
         """
@@ -20,25 +277,203 @@ class SpendingBehaviorModel:
         CSV must have: amount, category, timestamp, spending_velocity,
                        category_frequency, budget_ratio, budget_adherence
         """
+        df = self.load_frame_from_csv(csv_path)
+        # Served-prediction logs leave budget_adherence empty (it is not known yet)
+        df["budget_adherence"] = df["budget_adherence"].fillna(0.8)
+        columns = ["amount", "spending_velocity", "category_frequency",
+                   "budget_ratio", "budget_adherence"]
+        values = [df[column].to_numpy(dtype=np.float64).tolist() for column in columns]
+        return [
+            {
+                "amount": amount,
+                "category": category,
+                "timestamp": timestamp,
+                "spending_velocity": spending_velocity,
+                "category_frequency": category_frequency,
+                "budget_ratio": budget_ratio,
+                "budget_adherence": budget_adherence
+            }
+            for category, timestamp, amount, spending_velocity, category_frequency,
+                budget_ratio, budget_adherence in zip(
+                    df["category"].tolist(), df["timestamp"].dt.to_pydatetime(), *values
+                )
+        ]
+
+    def load_frame_from_csv(self, csv_path):
+        """
+        Load expense data from a CSV file as a DataFrame for the columnar
+        (prepare_features_from_frame / prepare_labels_from_frame) path
+        """
         df = pd.read_csv(csv_path, parse_dates=["timestamp"])
         # Ensure correct dtypes
         df["category"] = df["category"].astype(str)
+        if not pd.api.types.is_datetime64_any_dtype(df["timestamp"]):
+            df["timestamp"] = pd.to_datetime(df["timestamp"], format="ISO8601")
+        return df
 
-        data = []
-        for _, row in df.iterrows():
-            expense = {
-                "amount": float(row["amount"]),
-                "category": row["category"],
-                "timestamp": row["timestamp"].to_pydatetime()
-                    if isinstance(row["timestamp"], pd.Timestamp)
-                    else datetime.datetime.fromisoformat(row["timestamp"]),
-                "spending_velocity": float(row["spending_velocity"]),
-                "category_frequency": float(row["category_frequency"]),
-                "budget_ratio": float(row["budget_ratio"]),
-                "budget_adherence": float(row["budget_adherence"])
-            }
-            data.append(expense)
-        return data
+    def iter_csv_chunks(self, source, chunksize=100_000):
+        """
+        Stream an expense CSV, or a directory of CSV shards, as DataFrame
+        chunks. Yields (global_row_offset, chunk).
+        """
+        if os.path.isdir(source):
+            paths = sorted(glob.glob(os.path.join(source, "*.csv")))
+        else:
+            paths = [source]
+        offset = 0
+        for path in paths:
+            for chunk in pd.read_csv(path, parse_dates=["timestamp"], chunksize=chunksize):
+                chunk["category"] = chunk["category"].astype(str)
+                if not pd.api.types.is_datetime64_any_dtype(chunk["timestamp"]):
+                    chunk["timestamp"] = pd.to_datetime(chunk["timestamp"], format="ISO8601")
+                yield offset, chunk
+                offset += len(chunk)
+
+    def fit_preprocessing_streaming(self, source, chunksize=100_000):
+        """
+        Fit the category encoder and scaler with two streaming passes,
+        holding one chunk in memory at a time
+        """
+        categories = set()
+        for _, chunk in self.iter_csv_chunks(source, chunksize):
+            categories.update(chunk["category"].unique())
+        self.category_encoder.fit(sorted(categories))
+
+        self.scaler = StandardScaler()
+        n_rows = 0
+        for _, chunk in self.iter_csv_chunks(source, chunksize):
+            self.scaler.partial_fit(self.prepare_features_from_frame(chunk))
+            n_rows += len(chunk)
+        return n_rows
+
+    def _stream_batches(self, source, chunksize, batch_size, validation, validation_split, seed):
+        """Yield scaled (features, labels) batches for one side of the holdout split"""
+        rng = np.random.default_rng(seed)
+        for offset, chunk in self.iter_csv_chunks(source, chunksize):
+            mask = holdout_mask(offset, len(chunk), validation_split)
+            if not validation:
+                mask = ~mask
+            if not mask.any():
+                continue
+            X = self.scaler.transform(self.prepare_features_from_frame(chunk)[mask]).astype(np.float32)
+            y = self.prepare_labels_from_frame(chunk)[mask].astype(np.float32)
+            if not validation:
+                # Shuffle within the chunk; memory stays bounded by chunksize
+                order = rng.permutation(len(X))
+                X, y = X[order], y[order]
+            for start in range(0, len(X), batch_size):
+                yield X[start:start + batch_size], y[start:start + batch_size]
+
+    def train_streaming(self, source, chunksize=100_000, batch_size=32, epochs=100,
+                        validation_split=0.2, seed=42):
+        """
+        Out-of-core training: reads the CSV (or directory of CSV shards) in
+        chunks, so peak memory is bounded by chunksize rather than dataset size
+        """
+        n_rows = self.fit_preprocessing_streaming(source, chunksize)
+        print(f"Streaming {n_rows} rows from {source}")
+        _, first_chunk = next(self.iter_csv_chunks(source, REFERENCE_ROWS))
+        self.reference_features = reference_sample(
+            self.scaler.transform(self.prepare_features_from_frame(first_chunk))
+        )
+
+        signature = (
+            tf.TensorSpec(shape=(None, len(FEATURE_NAMES)), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.float32),
+        )
+        # A new shuffle seed on every pass over the training data
+        epoch_seeds = itertools.count(seed)
+        train_ds = tf.data.Dataset.from_generator(
+            lambda: self._stream_batches(source, chunksize, batch_size, False,
+                                         validation_split, next(epoch_seeds)),
+            output_signature=signature
+        ).prefetch(tf.data.AUTOTUNE)
+        val_ds = tf.data.Dataset.from_generator(
+            lambda: self._stream_batches(source, chunksize, batch_size, True,
+                                         validation_split, seed),
+            output_signature=signature
+        ).prefetch(tf.data.AUTOTUNE)
+
+        self.model = self.create_model(len(FEATURE_NAMES))
+        early_stopping = keras.callbacks.EarlyStopping(
+            monitor='val_loss', patience=10, restore_best_weights=True
+        )
+        history = self.model.fit(
+            train_ds,
+            epochs=epochs,
+            validation_data=val_ds,
+            callbacks=[early_stopping],
+            verbose=1
+        )
+        test_loss, test_mae = self.model.evaluate(val_ds, verbose=0)
+        print(f"Test Loss: {test_loss:.4f}, Test MAE: {test_mae:.4f}")
+        return history
+
+    def convert_csv_to_columnar(self, source, out_dir, chunksize=100_000):
+        """
+        Convert an expense CSV (or directory of CSV shards) into prepared
+        features and labels stored as .npy files plus a manifest.json.
+
+        features.npy is an (n_rows, 8) Fortran-ordered array, so every
+        feature column is contiguous on disk and the whole matrix can be
+        memory-mapped straight into training by load_columnar.
+        """
+        categories = set()
+        n_rows = 0
+        for _, chunk in self.iter_csv_chunks(source, chunksize):
+            categories.update(chunk["category"].unique())
+            n_rows += len(chunk)
+        self.category_encoder.fit(sorted(categories))
+
+        os.makedirs(out_dir, exist_ok=True)
+        features = np.lib.format.open_memmap(
+            os.path.join(out_dir, "features.npy"), mode="w+", dtype=np.float64,
+            shape=(n_rows, len(FEATURE_NAMES)), fortran_order=True
+        )
+        labels = np.lib.format.open_memmap(
+            os.path.join(out_dir, "labels.npy"), mode="w+", dtype=np.float64, shape=(n_rows,)
+        )
+        for offset, chunk in self.iter_csv_chunks(source, chunksize):
+            features[offset:offset + len(chunk)] = self.prepare_features_from_frame(chunk)
+            labels[offset:offset + len(chunk)] = self.prepare_labels_from_frame(chunk)
+        features.flush()
+        labels.flush()
+        del features, labels
+
+        manifest = {
+            "format_version": COLUMNAR_FORMAT_VERSION,
+            "rows": n_rows,
+            "features": FEATURE_NAMES,
+            "features_file": "features.npy",
+            "labels_file": "labels.npy",
+            "categories": list(self.category_encoder.classes_),
+            "source": os.path.abspath(source)
+        }
+        with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+    def load_columnar(self, path):
+        """
+        Memory-map a dataset written by convert_csv_to_columnar. Returns
+        (features, labels) without parsing or copying; pages are shared
+        between processes reading the same files.
+        """
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        if manifest["format_version"] > COLUMNAR_FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar format version {manifest['format_version']}")
+        if manifest["features"] != FEATURE_NAMES:
+            raise ValueError("Columnar dataset was prepared with a different feature list")
+        self.category_encoder.fit(manifest["categories"])
+        features = np.load(os.path.join(path, manifest["features_file"]), mmap_mode="r")
+        labels = np.load(os.path.join(path, manifest["labels_file"]), mmap_mode="r")
+        return features, labels
+
+    def train_columnar(self, path, **fit_options):
+        """Train from a memory-mapped columnar dataset"""
+        X, y = self.load_columnar(path)
+        return self.train_arrays(X, y, **fit_options)
 
     def prepare_features(self, data):
         features = []
@@ -49,21 +484,49 @@ class SpendingBehaviorModel:
             hour = ts.hour
             day_of_week = ts.weekday()
             month = ts.month
-            spending_velocity = expense.get("spending_velocity", 0)
-            category_frequency = expense.get("category_frequency", 0)
-            budget_ratio = expense.get("budget_ratio", 0.5)
+            spending_velocity = expense.get("spending_velocity", FEATURE_DEFAULTS["spending_velocity"])
+            category_frequency = expense.get("category_frequency", FEATURE_DEFAULTS["category_frequency"])
+            budget_ratio = expense.get("budget_ratio", FEATURE_DEFAULTS["budget_ratio"])
             features.append([
                 amount, category_encoded, hour, day_of_week, month,
                 spending_velocity, category_frequency, budget_ratio
             ])
         return np.array(features)
 
+    def prepare_features_from_frame(self, df):
+        """Columnar equivalent of prepare_features: one encoder call, vectorized datetime accessors"""
+        ts = df["timestamp"].dt
+        n_rows = len(df)
+        features = np.empty((n_rows, len(FEATURE_NAMES)), dtype=np.float64)
+        features[:, 0] = df["amount"].to_numpy(dtype=np.float64)
+        features[:, 1] = self.category_encoder.transform(df["category"].to_numpy())
+        features[:, 2] = ts.hour.to_numpy()
+        features[:, 3] = ts.weekday.to_numpy()
+        features[:, 4] = ts.month.to_numpy()
+        for i, name in enumerate(["spending_velocity", "category_frequency", "budget_ratio"], start=5):
+            if name in df:
+                features[:, i] = df[name].to_numpy(dtype=np.float64)
+            else:
+                features[:, i] = FEATURE_DEFAULTS[name]
+        return features
+
+    def prepare_labels_from_frame(self, df):
+        """Columnar equivalent of prepare_labels"""
+        category_multiplier = np.where(df["category"].isin(HEALTHY_CATEGORIES).to_numpy(), 1.2, 0.8)
+        amount_factor = np.where(df["amount"].to_numpy() < 100, 1.0, 0.7)
+        hour = df["timestamp"].dt.hour.to_numpy()
+        time_factor = np.where((hour >= 6) & (hour <= 22), 1.0, 0.5)
+        if "budget_adherence" in df:
+            budget_factor = df["budget_adherence"].fillna(0.8).to_numpy(dtype=np.float64)
+        else:
+            budget_factor = 0.8
+        return 10 * category_multiplier * amount_factor * time_factor * budget_factor
+
     def prepare_labels(self, data):
         labels = []
         for expense in data:
             base_coins = 10
-            healthy_categories = ['food', 'healthcare', 'education', 'savings', 'utilities']
-            category_multiplier = 1.2 if expense["category"] in healthy_categories else 0.8
+            category_multiplier = 1.2 if expense["category"] in HEALTHY_CATEGORIES else 0.8
             amount_factor = 1.0 if expense["amount"] < 100 else 0.7
             hour = expense["timestamp"].hour
             time_factor = 1.0 if 6 <= hour <= 22 else 0.5
@@ -72,40 +535,109 @@ class SpendingBehaviorModel:
             labels.append(coin_reward)
         return np.array(labels)
 
-    def create_model(self, input_shape):# ANN
-        model = keras.Sequential([
-            keras.layers.Dense(64, activation='relu', input_shape=(input_shape,)),
-            keras.layers.Dropout(0.3),
-            keras.layers.Dense(32, activation='relu'),
-            keras.layers.Dropout(0.2),
-            keras.layers.Dense(16, activation='relu'),
-            keras.layers.Dense(1, activation='linear')
-        ])
-        model.compile(optimizer='adam', loss='mse', metrics=['mae'])
+    def create_model(self, input_shape, learning_rate=BASE_LEARNING_RATE, jit_compile=False,
+                     hidden_units=DEFAULT_HIDDEN_UNITS, dropout_rates=DEFAULT_DROPOUT_RATES):# ANN
+        """
+        ReLU Dense layers of hidden_units widths, each followed by Dropout at
+        the matching dropout_rates entry (a single number applies to every
+        layer; 0 or a missing entry means no Dropout), then a linear output
+        """
+        if isinstance(dropout_rates, (int, float)):
+            dropout_rates = [dropout_rates] * len(hidden_units)
+        layers = [keras.Input(shape=(input_shape,))]
+        for i, units in enumerate(hidden_units):
+            layers.append(keras.layers.Dense(int(units), activation='relu'))
+            rate = dropout_rates[i] if i < len(dropout_rates) else 0.0
+            if rate > 0:
+                layers.append(keras.layers.Dropout(float(rate)))
+        layers.append(keras.layers.Dense(1, activation='linear'))
+        model = keras.Sequential(layers)
+        model.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+            loss='mse',
+            metrics=['mae'],
+            # XLA fuses the small dense/dropout kernels of each train step
+            jit_compile=jit_compile
+        )
         return model
 
-    def train(self, training_data):
+    def train(self, training_data, **fit_options):
         X = self.prepare_features(training_data)
         y = self.prepare_labels(training_data)
+        return self.train_arrays(X, y, **fit_options)
+
+    def train_frame(self, df, **fit_options):
+        """Train from a DataFrame using the columnar feature/label path"""
+        X = self.prepare_features_from_frame(df)
+        y = self.prepare_labels_from_frame(df)
+        return self.train_arrays(X, y, **fit_options)
+
+    def train_arrays(self, X, y, epochs=100, batch_size=BASE_BATCH_SIZE, verbose=1, **fit_options):
+        """
+        Fit on in-memory arrays with an 80/20 split; fit_options are the
+        fit_split options (input pipeline, XLA, learning rate, architecture)
+        """
+        X, y = np.asarray(X, dtype=np.float64), np.asarray(y, dtype=np.float64)
         X_scaled = self.scaler.fit_transform(X)
-        X_train, X_test, y_train, y_test = train_test_split(
-            X_scaled, y, test_size=0.2, random_state=42
+        # Splitting indices gives the same partition as splitting the arrays
+        train_index, test_index = train_test_split(np.arange(len(X)), test_size=0.2, random_state=42)
+        X_train, X_test = X_scaled[train_index], X_scaled[test_index]
+        y_train, y_test = y[train_index], y[test_index]
+        self.holdout = (X[test_index], y[test_index])
+        self.reference_features = reference_sample(X_train)
+        history, test_loss, test_mae = self.fit_split(
+            X_train, y_train, X_test, y_test, epochs=epochs, batch_size=batch_size, verbose=verbose, **fit_options
+        )
+        print(f"Test Loss: {test_loss:.4f}, Test MAE: {test_mae:.4f}")
+        return history
+
+    def fit_split(self, X_train, y_train, X_test, y_test, epochs=100, batch_size=BASE_BATCH_SIZE, verbose=1,
+                  use_tf_data=False, jit_compile=False, lr_scaling=None, learning_rate=None,
+                  hidden_units=DEFAULT_HIDDEN_UNITS, dropout_rates=DEFAULT_DROPOUT_RATES):
+        """
+        Build and fit a fresh model on already-scaled arrays, early-stopping
+        on the test split. use_tf_data feeds batches through a cached,
+        prefetched tf.data pipeline instead of Keras' NumPy adapter;
+        jit_compile compiles the train step with XLA; lr_scaling ('linear'
+        or 'sqrt') raises the learning rate for batch sizes above 32 unless
+        learning_rate is given. Returns (history, test_loss, test_mae).
+        """
+        if learning_rate is None:
+            learning_rate = scaled_learning_rate(batch_size, lr_scaling)
+        self.model = self.create_model(
+            X_train.shape[1], learning_rate=learning_rate, jit_compile=jit_compile,
+            hidden_units=hidden_units, dropout_rates=dropout_rates
         )
-        self.model = self.create_model(X_train.shape[1])
         early_stopping = keras.callbacks.EarlyStopping(
             monitor='val_loss', patience=10, restore_best_weights=True
         )
+        throughput = ThroughputLogger(len(X_train), verbose=verbose)
+        if use_tf_data:
+            train_data = dict(x=make_dataset(X_train, y_train, batch_size, shuffle=True))
+            validation_data = make_dataset(X_test, y_test, batch_size)
+        else:
+            train_data = dict(x=X_train, y=y_train, batch_size=batch_size)
+            validation_data = (X_test, y_test)
         history = self.model.fit(
-            X_train, y_train,
-            epochs=100,
-            batch_size=32,
-            validation_data=(X_test, y_test),
-            callbacks=[early_stopping],
-            verbose=1
+            **train_data,
+            epochs=epochs,
+            validation_data=validation_data,
+            callbacks=[early_stopping, throughput],
+            verbose=verbose
         )
-        test_loss, test_mae = self.model.evaluate(X_test, y_test, verbose=0)
-        print(f"Test Loss: {test_loss:.4f}, Test MAE: {test_mae:.4f}")
-        return history
+        test_loss, test_mae = self.model.evaluate(X_test, y_test, batch_size=max(batch_size, 1024), verbose=0)
+        self.training_profile = {
+            "batch_size": batch_size,
+            "learning_rate": learning_rate,
+            "hidden_units": [int(units) for units in hidden_units],
+            "dropout_rates": dropout_rates if isinstance(dropout_rates, (int, float)) else list(dropout_rates),
+            "tf_data": use_tf_data,
+            "jit_compile": jit_compile,
+            "threads": configure_cpu_threads(),
+            "test_mae": float(test_mae),
+            **throughput.summary(),
+        }
+        return history, float(test_loss), float(test_mae)
 
     def predict_coins(self, expense_data):
         if self.model is None:
@@ -115,37 +647,454 @@ class SpendingBehaviorModel:
         prediction = self.model.predict(features_scaled, verbose=0)
         return max(1, min(50, int(prediction[0][0])))
 
-    def save_model(self, path='ml_model/'):
+    def save_model(self, path='ml_model/', version=None):
+        os.makedirs(path, exist_ok=True)
         self.model.save(f'{path}spending_model.h5')
         joblib.dump(self.scaler, f'{path}scaler.pkl')
         joblib.dump(self.category_encoder, f'{path}category_encoder.pkl')
+        self.export_weights(f'{path}spending_model.npz')
         metadata = {
-            'version': '1.0',
-            'features': ['amount','category','hour','day_of_week','month',
-                         'spending_velocity','category_frequency','budget_ratio'],
-            'categories': list(self.category_encoder.classes_)
+            'version': version or '1.0',
+            'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'features': FEATURE_NAMES,
+            'categories': list(self.category_encoder.classes_),
+            'variants': self.export_quantized(path)
         }
+        if self.training_profile is not None:
+            metadata['training'] = self.training_profile
+        if self.holdout is not None:
+            features, labels = self.holdout
+            np.savez(f'{path}holdout.npz', features=features, labels=labels,
+                     categories=self.category_encoder.inverse_transform(features[:, 1].astype(int)).astype(str))
+            metadata['holdout_rows'] = len(labels)
+            metadata['confidence'] = self.calibrate_confidence(features)
+        elif self.reference_features is not None:
+            metadata['confidence'] = self.calibrate_confidence(self.reference_features, scaled=True)
         with open(f'{path}model_metadata.json', 'w') as f:
             json.dump(metadata, f)
 
+    def calibrate_confidence(self, features, scaled=False):
+        """Confidence thresholds from the MC dropout spread on (ideally held-out) feature rows"""
+        if not scaled:
+            features = self.scaler.transform(features)
+        return confidence_calibration(self._dense_layers(), features)
+
+    def export_quantized(self, path='ml_model/'):
+        """
+        Write spending_model_<precision>.npz for each reduced precision and
+        report its accuracy against float32 on the reference training rows
+        """
+        reference = self.export_weights(None)
+        activations = [activation for _, _, activation, _ in self._dense_layers()]
+        variants = {}
+        for precision in QUANTIZED_PRECISIONS:
+            file_name = f'spending_model_{precision}.npz'
+            arrays = self.export_weights(f'{path}{file_name}', precision=precision)
+            report = None
+            if self.reference_features is not None:
+                report = coin_delta_report(
+                    dense_forward(reference, activations, self.reference_features),
+                    dense_forward(arrays, activations, self.reference_features)
+                )
+                print(f"{precision}: coin MAE {report['coin_mae']:.4f}, "
+                      f"{report['coins_changed_pct']:.2f}% of clamped predictions changed "
+                      f"(raw MAE {report['raw_mae']:.5f} over {report['rows']} rows)")
+            variants[precision] = {
+                'file': file_name,
+                'bytes': os.path.getsize(f'{path}{file_name}'),
+                'accuracy': report,
+            }
+        return variants
+
+    def _dense_layers(self):
+        """(kernel, bias, activation, dropout_rate) for each Dense layer of the model"""
+        layers = []
+        for layer in self.model.layers:
+            if isinstance(layer, keras.layers.Dropout):
+                # Dropout applies to the output of the preceding Dense layer
+                if not layers:
+                    raise ValueError("Cannot export Dropout before the first Dense layer")
+                kernel, bias, activation, _ = layers[-1]
+                layers[-1] = (kernel, bias, activation, float(layer.rate))
+            elif isinstance(layer, keras.layers.Dense):
+                kernel, bias = layer.get_weights()
+                layers.append((kernel, bias, layer.get_config()['activation'], 0.0))
+            else:
+                raise ValueError(f"Cannot export layer type {type(layer).__name__}")
+        return layers
+
+    def export_weights(self, npz_path, precision='float32'):
+        """
+        Write the Dense kernels, scaler statistics and encoder classes to one
+        .npz file, so the API can serve the model with NumPy alone
+        (no TensorFlow, scikit-learn or joblib at load time).
+
+        precision 'float16' stores half-precision kernels; 'int8' stores
+        int8 kernels with one scale per output channel (activations are
+        quantized per row at inference). Returns the weight arrays;
+        npz_path None skips writing the file.
+        """
+        layers = self._dense_layers()
+        arrays = {}
+        for i, (kernel, bias, _, _) in enumerate(layers):
+            if precision == 'int8':
+                arrays[f'kernel_{i}'], arrays[f'kernel_scale_{i}'] = quantize_symmetric(kernel, axis=0)
+            else:
+                arrays[f'kernel_{i}'] = kernel.astype(precision)
+            arrays[f'bias_{i}'] = bias.astype(np.float32)
+
+        if npz_path is not None:
+            np.savez(
+                npz_path,
+                format_version=np.array(WEIGHTS_FORMAT_VERSION),
+                precision=np.array(precision),
+                activations=np.array([activation for _, _, activation, _ in layers]),
+                dropout_rates=np.array([rate for _, _, _, rate in layers], dtype=np.float32),
+                scaler_mean=self.scaler.mean_.astype(np.float64),
+                scaler_scale=self.scaler.scale_.astype(np.float64),
+                categories=np.array([str(c) for c in self.category_encoder.classes_]),
+                features=np.array(FEATURE_NAMES),
+                **arrays
+            )
+        return arrays
+
     def load_model(self, path='ml_model/'):
-        self.model = keras.models.load_model(f'{path}spending_model.h5')
+        # Inference only; Keras 3 cannot deserialize the metrics compiled
+        # into the legacy h5 file, so skip restoring the training config
+        self.model = keras.models.load_model(f'{path}spending_model.h5', compile=False)
         self.scaler = joblib.load(f'{path}scaler.pkl')
         self.category_encoder = joblib.load(f'{path}category_encoder.pkl')
 
 
+def generate_synthetic_expenses(n_rows, seed=0):
+    """
+    Generate a DataFrame with the finlit_expenses_dataset.csv schema, drawing
+    each column from the same ranges as the bundled dataset
+    """
+    rng = np.random.default_rng(seed)
+    end = np.datetime64("2025-09-11T00:00:00", "s")
+    offsets = rng.integers(0, 365 * 24 * 3600, size=n_rows).astype("timedelta64[s]")
+    return pd.DataFrame({
+        "amount": rng.uniform(5, 200, n_rows).round(2),
+        "category": np.array(CATEGORIES, dtype=object)[rng.integers(0, len(CATEGORIES), n_rows)],
+        "timestamp": pd.to_datetime(end - offsets),
+        "spending_velocity": rng.uniform(0.5, 5.0, n_rows).round(2),
+        "category_frequency": rng.uniform(0.1, 1.0, n_rows).round(2),
+        "budget_ratio": rng.uniform(0.1, 1.5, n_rows).round(2),
+        "budget_adherence": rng.uniform(0.3, 1.0, n_rows).round(2),
+    })
+
+
+def benchmark_feature_pipeline(sizes=(10_000, 1_000_000, 10_000_000), dict_path_max_rows=100_000):
+    """
+    Measure rows/sec of feature + label preparation for the columnar path and
+    (up to dict_path_max_rows, since it is orders of magnitude slower) the
+    dict-based path, on synthetic in-memory data
+    """
+    results = []
+    for n_rows in sizes:
+        df = generate_synthetic_expenses(n_rows)
+        model = SpendingBehaviorModel()
+        model.category_encoder.fit(CATEGORIES)
+
+        start = time.perf_counter()
+        model.prepare_features_from_frame(df)
+        model.prepare_labels_from_frame(df)
+        elapsed = time.perf_counter() - start
+        result = {"rows": n_rows, "columnar_seconds": elapsed,
+                  "columnar_rows_per_sec": n_rows / elapsed}
+
+        if n_rows <= dict_path_max_rows:
+            start = time.perf_counter()
+            records = []
+            for _, row in df.iterrows():
+                record = row.to_dict()
+                record["timestamp"] = record["timestamp"].to_pydatetime()
+                records.append(record)
+            model.prepare_features(records)
+            model.prepare_labels(records)
+            elapsed = time.perf_counter() - start
+            result.update({"dict_seconds": elapsed, "dict_rows_per_sec": n_rows / elapsed})
+
+        print(json.dumps(result))
+        results.append(result)
+    return results
+
+
+def expand_search_space(space, mode="grid", trials=10, seed=0):
+    """
+    Trial parameter dicts from a search space mapping SEARCH_PARAMETERS
+    names to lists of choices. "grid" takes every combination; "random"
+    draws `trials` of them, and also accepts {"min": a, "max": b} ranges
+    (integers when both bounds are, log-uniform with "log": true)
+    """
+    unknown = set(space) - set(SEARCH_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown search parameters: {sorted(unknown)}")
+    names = sorted(space)
+    if mode == "grid":
+        if any(not isinstance(space[name], list) for name in names):
+            raise ValueError("Grid search needs a list of choices for every parameter")
+        return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+    if mode != "random":
+        raise ValueError(f"Unknown search mode '{mode}'")
+
+    rng = np.random.default_rng(seed)
+
+    def draw(choices):
+        if isinstance(choices, list):
+            return choices[rng.integers(len(choices))]
+        low, high = choices["min"], choices["max"]
+        if choices.get("log"):
+            return float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        if isinstance(low, int) and isinstance(high, int):
+            return int(rng.integers(low, high + 1))
+        return float(rng.uniform(low, high))
+
+    return [{name: draw(space[name]) for name in names} for _ in range(trials)]
+
+
+# Per-worker state of a hyperparameter search, set by _init_search_worker
+_search_data = None
+
+
+def _init_search_worker(columnar_dir, core_queue, intra_op_threads):
+    """Pin the worker to its cores and size its TF thread pools before any op runs"""
+    global _search_data
+    cores = core_queue.get()
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    configure_cpu_threads(intra_op_threads, 1)
+    # Memory-mapped: every worker reads the same page-cache pages
+    _search_data = SpendingBehaviorModel().load_columnar(columnar_dir)
+
+
+def fold_assignment(n_rows, folds, seed=42):
+    """Fold number of every row: a seeded permutation dealt round-robin"""
+    return np.random.default_rng(seed).permutation(n_rows) % folds
+
+
+def _run_search_fold(params, fold, folds, seed, fit_options):
+    """Train one trial's configuration on one fold inside a search worker"""
+    X, y = _search_data
+    if folds > 1:
+        validation = fold_assignment(len(X), folds, seed) == fold
+    else:
+        validation = holdout_mask(0, len(X))
+    started = time.perf_counter()
+    model = SpendingBehaviorModel()
+    X_train = model.scaler.fit_transform(X[~validation])
+    X_val = model.scaler.transform(X[validation])
+    tf.keras.utils.set_random_seed(seed + fold)
+    history, val_loss, val_mae = model.fit_split(
+        X_train, y[~validation], X_val, y[validation], verbose=0, **{**fit_options, **params}
+    )
+    return {
+        "fold": fold,
+        "val_loss": val_loss,
+        "val_mae": val_mae,
+        "epochs": len(history.history["loss"]),
+        "seconds": time.perf_counter() - started,
+        "samples_per_sec": model.training_profile["samples_per_sec"],
+    }
+
+
+def hyperparameter_search(columnar_dir, space, mode="grid", trials=10, folds=5, workers=None,
+                          seed=42, fit_options=None):
+    """
+    Evaluate every trial of a search space with k-fold cross-validation
+    (folds=1: one 80/20 holdout). Each (trial, fold) runs in a process pool
+    of spawned workers, each with its own TensorFlow runtime pinned to its
+    share of the cores. Returns the leaderboard, best mean validation MAE first.
+    """
+    trial_params = expand_search_space(space, mode, trials, seed)
+    fit_options = dict(fit_options or {})
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    workers = max(1, min(workers or len(cpus), len(trial_params) * folds))
+    core_groups = [set(group.tolist()) for group in np.array_split(cpus, workers) if len(group)]
+    # More workers than cores: let them share all cores
+    core_groups += [set(cpus)] * (workers - len(core_groups))
+
+    context = multiprocessing.get_context("spawn")
+    core_queue = context.Queue()
+    for group in core_groups:
+        core_queue.put(group)
+    print(f"Searching {len(trial_params)} trials x {folds} folds on {workers} workers")
+
+    results = [[] for _ in trial_params]
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=context, initializer=_init_search_worker,
+        initargs=(columnar_dir, core_queue, max(1, len(cpus) // workers))
+    ) as pool:
+        futures = {
+            pool.submit(_run_search_fold, params, fold, folds, seed, fit_options): trial
+            for trial, params in enumerate(trial_params)
+            for fold in range(folds)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            trial = futures[future]
+            result = future.result()
+            results[trial].append(result)
+            print(f"[{done}/{len(futures)}] trial {trial} fold {result['fold']}: "
+                  f"val MAE {result['val_mae']:.4f} in {result['seconds']:.1f}s")
+
+    leaderboard = []
+    for trial, (params, fold_results) in enumerate(zip(trial_params, results)):
+        maes = [r["val_mae"] for r in fold_results]
+        leaderboard.append({
+            "trial": trial,
+            "params": params,
+            "mean_val_mae": float(np.mean(maes)),
+            "std_val_mae": float(np.std(maes)),
+            "mean_val_loss": float(np.mean([r["val_loss"] for r in fold_results])),
+            "seconds": float(sum(r["seconds"] for r in fold_results)),
+            "folds": sorted(fold_results, key=lambda r: r["fold"]),
+        })
+    leaderboard.sort(key=lambda entry: entry["mean_val_mae"])
+    for rank, entry in enumerate(leaderboard, start=1):
+        entry["rank"] = rank
+    return leaderboard
+
+
 if __name__ == "__main__":
-    csv_path = "finlit_expenses_dataset.csv" 
+    parser = argparse.ArgumentParser(description="Train the FinQuest spending model")
+    parser.add_argument("--csv", default="finlit_expenses_dataset.csv",
+                        help="Training data CSV (or a directory of CSV shards with --stream)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Out-of-core training: read the CSV in chunks instead of loading it")
+    parser.add_argument("--chunksize", type=int, default=100_000,
+                        help="Rows per chunk with --stream or --to-columnar")
+    parser.add_argument("--to-columnar", metavar="DIR",
+                        help="Convert --csv to a memory-mappable columnar dataset in DIR and exit")
+    parser.add_argument("--columnar", metavar="DIR",
+                        help="Train from a columnar dataset written by --to-columnar")
+    parser.add_argument("--export-quantized", action="store_true",
+                        help="Write float16/int8 variants of the saved model, report their accuracy on --csv, "
+                             "recalibrate its confidence thresholds, and exit")
+    parser.add_argument("--benchmark-pipeline", nargs="*", type=int, metavar="ROWS",
+                        help="Benchmark feature preparation at these row counts instead of training")
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--batch-size", type=int,
+                        help=f"Training batch size (default {BASE_BATCH_SIZE}, or 1024 with --cpu-tuned)")
+    parser.add_argument("--lr-scaling", choices=["linear", "sqrt"],
+                        help="Scale the learning rate with --batch-size (relative to 32)")
+    parser.add_argument("--tf-data", action="store_true",
+                        help="Feed in-memory training data through a cached, prefetched tf.data pipeline")
+    parser.add_argument("--jit-compile", action="store_true", help="Compile the train step with XLA")
+    parser.add_argument("--intra-op-threads", type=int, help="Threads used inside one TensorFlow op")
+    parser.add_argument("--inter-op-threads", type=int, help="TensorFlow ops run concurrently")
+    parser.add_argument("--cpu-tuned", action="store_true",
+                        help="Shorthand for --tf-data --batch-size 1024 --lr-scaling sqrt "
+                             "with one intra-op thread per core")
+    parser.add_argument("--search", metavar="SPACE",
+                        help="Hyperparameter search over a JSON search space (a file or an inline JSON object), "
+                             "then train and save the best configuration")
+    parser.add_argument("--search-mode", choices=["grid", "random"], default="grid")
+    parser.add_argument("--trials", type=int, default=20, help="Configurations drawn with --search-mode random")
+    parser.add_argument("--folds", type=int, default=5, help="Cross-validation folds per trial (1: one 80/20 holdout)")
+    parser.add_argument("--search-workers", type=int, help="Worker processes (default: one per core)")
+    parser.add_argument("--leaderboard", default="ml_model/search_leaderboard.json",
+                        help="Where --search writes its ranked results")
+    parser.add_argument("--model-version", metavar="VERSION",
+                        help="Save to ml_model/versions/VERSION/ (for ML_MODEL_VERSIONS) instead of ml_model/")
+    args = parser.parse_args()
+
+    if args.cpu_tuned:
+        args.tf_data = True
+        if args.batch_size is None:
+            args.batch_size = 1024
+        args.lr_scaling = args.lr_scaling or "sqrt"
+        if args.intra_op_threads is None:
+            args.intra_op_threads = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    if args.batch_size is None:
+        args.batch_size = BASE_BATCH_SIZE
+    print(f"TensorFlow threads: {configure_cpu_threads(args.intra_op_threads, args.inter_op_threads)}")
+    save_path = f"ml_model/versions/{args.model_version}/" if args.model_version else "ml_model/"
+    fit_options = dict(epochs=args.epochs, batch_size=args.batch_size, use_tf_data=args.tf_data,
+                       jit_compile=args.jit_compile, lr_scaling=args.lr_scaling)
+
+    if args.benchmark_pipeline is not None:
+        benchmark_feature_pipeline(args.benchmark_pipeline or (10_000, 1_000_000, 10_000_000))
+        raise SystemExit(0)
+
     model = SpendingBehaviorModel()
 
+    if args.export_quantized:
+        model.load_model()
+        frame = model.load_frame_from_csv(args.csv)
+        model.reference_features = reference_sample(
+            model.scaler.transform(model.prepare_features_from_frame(frame))
+        )
+        variants = model.export_quantized()
+        with open('ml_model/model_metadata.json') as f:
+            metadata = json.load(f)
+        metadata['variants'] = variants
+        holdout = load_holdout('ml_model/')
+        metadata['confidence'] = (
+            model.calibrate_confidence(holdout[0]) if holdout is not None
+            else model.calibrate_confidence(model.reference_features, scaled=True)
+        )
+        with open('ml_model/model_metadata.json', 'w') as f:
+            json.dump(metadata, f)
+        raise SystemExit(0)
+
+    if args.to_columnar:
+        manifest = model.convert_csv_to_columnar(args.csv, args.to_columnar, chunksize=args.chunksize)
+        print(f"Wrote {manifest['rows']} rows to {args.to_columnar}")
+        raise SystemExit(0)
+
+    if args.search:
+        if os.path.exists(args.search):
+            with open(args.search) as f:
+                space = json.load(f)
+        else:
+            space = json.loads(args.search)
+        with tempfile.TemporaryDirectory() as scratch:
+            # Workers memory-map one prepared copy of the features
+            columnar_dir = args.columnar
+            if columnar_dir is None:
+                columnar_dir = os.path.join(scratch, "features")
+                model.convert_csv_to_columnar(args.csv, columnar_dir, chunksize=args.chunksize)
+            leaderboard = hyperparameter_search(
+                columnar_dir, space, mode=args.search_mode, trials=args.trials, folds=args.folds,
+                workers=args.search_workers, fit_options=fit_options
+            )
+            with open(args.leaderboard, "w") as f:
+                json.dump(leaderboard, f, indent=2)
+            best = leaderboard[0]
+            print(f"Best trial {best['trial']}: {best['params']} "
+                  f"(val MAE {best['mean_val_mae']:.4f} +/- {best['std_val_mae']:.4f}); leaderboard in {args.leaderboard}")
+            model.train_columnar(columnar_dir, **{**fit_options, **best["params"]})
+        model.training_profile["search"] = {
+            "leaderboard": args.leaderboard,
+            "trial": best["trial"],
+            "trials": len(leaderboard),
+            "folds": args.folds,
+            "mean_val_mae": best["mean_val_mae"],
+        }
+        model.save_model(save_path, version=args.model_version)
+        print("Model trained with the best searched configuration and saved.")
+        raise SystemExit(0)
+
+    if args.columnar:
+        model.train_columnar(args.columnar, **fit_options)
+        model.save_model(save_path, version=args.model_version)
+        print("Model trained using columnar data and saved.")
+        raise SystemExit(0)
+
+    if args.stream:
+        model.train_streaming(args.csv, chunksize=args.chunksize, batch_size=args.batch_size, epochs=args.epochs)
+        model.save_model(save_path, version=args.model_version)
+        print("Model trained by streaming CSV data and saved.")
+        raise SystemExit(0)
+
     # Load data from CSV
-    training_data = model.load_data_from_csv(csv_path)
+    training_data = model.load_frame_from_csv(args.csv)
 
     # Fit category encoder with all categories present in the CSV
-    categories = [exp["category"] for exp in training_data]
-    model.category_encoder.fit(categories)
+    model.category_encoder.fit(training_data["category"])
 
     # Train and save
-    model.train(training_data)
-    model.save_model()
+    model.train_frame(training_data, **fit_options)
+    model.save_model(save_path, version=args.model_version)
     print("Model trained using CSV data and saved.")
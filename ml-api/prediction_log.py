@@ -0,0 +1,174 @@
+"""Non-blocking capture of served predictions for retraining.
+
+``PredictionLog.record`` appends the decoded request and its response to
+a bounded in-memory buffer and returns; it never formats or touches the
+disk. A background thread swaps
+the buffer out every ``flush_interval`` seconds (or as soon as it is half
+full) and writes the rows in bulk to CSV files, rotating to a new file
+every ``max_file_rows`` rows. When the buffer is full, new records are
+dropped and counted rather than blocking the request. ``close`` (registered
+with atexit, and called from gunicorn's ``worker_exit``) writes out what is
+still buffered; records that arrive after it are dropped with a warning.
+
+The leading columns are the schema ``SpendingBehaviorModel.load_data_from_csv``
+reads. ``budget_adherence`` is left empty because it is unknown when the
+prediction is served. The remaining columns describe the response.
+"""
+import atexit
+import csv
+import os
+import threading
+import time
+from datetime import datetime
+
+from logs import get_logger
+from metrics import PREDICTION_LOG_DROPPED, PREDICTION_LOG_WRITTEN
+
+logger = get_logger('prediction_log')
+
+COLUMNS = (
+    'amount', 'category', 'timestamp', 'spending_velocity', 'category_frequency',
+    'budget_ratio', 'budget_adherence',
+    'coins', 'ann_prediction', 'confidence', 'method', 'user_id', 'served_at',
+)
+
+
+class PredictionLog:
+    """Bounded buffer of prediction records, flushed to rotating CSV files by a writer thread"""
+
+    def __init__(self, directory, capacity=10000, flush_interval=1.0, max_file_rows=100000):
+        self.directory = directory
+        self.capacity = max(1, int(capacity))
+        self.flush_interval = flush_interval
+        self.max_file_rows = max(1, int(max_file_rows))
+        self.written = 0
+        self.dropped = 0
+        self.files = 0
+        self._file = None
+        self._file_rows = 0
+        self._thread = None
+        self.after_fork()
+        atexit.register(self.close)
+
+    def after_fork(self):
+        """Fresh buffer, lock and writer thread; also used for the initial start"""
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._write_lock = threading.Lock()
+        # An inherited file handle belongs to the parent; each process writes its own files
+        self._file = None
+        self._file_rows = 0
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name='prediction-log', daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def row(expense, result, served_at):
+        breakdown = result.get('breakdown', {})
+        return (
+            expense.amount, expense.category,
+            # Wall-clock time, as the service derives hour/weekday/month
+            expense.when.replace(tzinfo=None).isoformat(),
+            expense.spending_velocity, expense.category_frequency, expense.budget_ratio, '',
+            result.get('coins'), breakdown.get('ann_prediction', ''), result.get('confidence'),
+            breakdown.get('method', ''), expense.user_id or '', datetime.fromtimestamp(served_at).isoformat(),
+        )
+
+    def record(self, expense, result):
+        """Buffer one served prediction; returns False if it was dropped"""
+        return self.record_many([(expense, result)]) == 1
+
+    def record_many(self, pairs):
+        """Buffer (expense, result) pairs; returns how many were kept"""
+        served_at = time.time()
+        rows = [(expense, result, served_at) for expense, result in pairs]
+        with self._lock:
+            # After close the writer's final flush has run (or runs next and
+            # takes this lock), so nothing would ever write these rows
+            closed = self._closing
+            room = 0 if closed else self.capacity - len(self._buffer)
+            kept = rows[:max(room, 0)]
+            self._buffer.extend(kept)
+            dropped = len(rows) - len(kept)
+            self.dropped += dropped
+            half_full = len(self._buffer) >= self.capacity // 2
+        if closed and dropped:
+            logger.warning("Prediction log is closed, dropping records",
+                           extra={"directory": self.directory, "dropped": dropped})
+        if dropped:
+            PREDICTION_LOG_DROPPED.inc(dropped)
+        if half_full:
+            self._wake.set()
+        return len(kept)
+
+    def _run(self):
+        while not self._closing:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Prediction log flush failed", extra={"directory": self.directory})
+        try:
+            # Records that arrived during the last flush
+            self.flush()
+        except Exception:
+            logger.exception("Prediction log flush failed", extra={"directory": self.directory})
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def close(self, timeout=2.0):
+        """Flush the buffer and stop the writer, waiting at most timeout seconds"""
+        with self._lock:
+            self._closing = True
+        self._wake.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def flush(self):
+        """Write everything buffered so far"""
+        with self._lock:
+            records, self._buffer = self._buffer, []
+        if not records:
+            return
+        rows = [self.row(*record) for record in records]
+        with self._write_lock:
+            start = 0
+            while start < len(rows):
+                if self._file is None or self._file_rows >= self.max_file_rows:
+                    self._rotate()
+                chunk = rows[start:start + self.max_file_rows - self._file_rows]
+                self._writer.writerows(chunk)
+                self._file_rows += len(chunk)
+                start += len(chunk)
+            self._file.flush()
+        self.written += len(rows)
+        PREDICTION_LOG_WRITTEN.inc(len(rows))
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"predictions-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.files}.csv"
+        path = os.path.join(self.directory, name)
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMNS)
+        self._file_rows = 0
+        self.files += 1
+        logger.info("Opened prediction log file", extra={"path": path})
+
+    def stats(self):
+        with self._lock:
+            buffered = len(self._buffer)
+        return {
+            "directory": self.directory,
+            "capacity": self.capacity,
+            "buffered": buffered,
+            "written": self.written,
+            "dropped": self.dropped,
+            "files": self.files,
+        }
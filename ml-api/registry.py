@@ -0,0 +1,218 @@
+"""Several model versions served side by side from one process.
+
+Each version is a ModelBundle with its own model, scaler and encoder; all
+of them share the process's inference runtime (the NumPy engine, the
+micro-batcher, and TensorFlow when an h5 model is loaded). A request picks
+its version either explicitly, with a ``model_version`` field, or through
+a weighted A/B split. With a ``user_id`` the split hashes the user id, so
+a user keeps seeing the same version; anonymous requests are assigned at
+random.
+
+Routing state lives in an immutable snapshot that is replaced with one
+reference assignment, like ``MLModelService.bundle`` before it. Requests
+therefore never see a half-updated table.
+"""
+import math
+import re
+import threading
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from decoding import RequestValidationError
+from metrics import MODEL_VERSION_COINS, MODEL_VERSION_PREDICT_SECONDS
+
+# Version names double as directory names under ML_MODEL_VERSIONS_DIR
+VERSION_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$')
+
+
+def validate_version(version):
+    if not isinstance(version, str) or not VERSION_PATTERN.match(version):
+        raise RequestValidationError(
+            "Model versions must be 1-64 letters, digits, '.', '_' or '-', starting with a letter or digit"
+        )
+    return version
+
+
+def parse_traffic(spec, name='ML_MODEL_TRAFFIC'):
+    """'1.0=90,2.0=10' -> {'1.0': 90.0, '2.0': 10.0}; raises ValueError naming the setting"""
+    weights = {}
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        version, separator, weight = (item.strip() for item in part.partition('='))
+        try:
+            if not separator or not version:
+                raise ValueError
+            value = float(weight)
+        except ValueError:
+            raise ValueError(f"{name}: expected comma-separated <version>=<weight> pairs, got {part!r}") from None
+        if not math.isfinite(value) or value < 0:
+            raise ValueError(f"{name}: weight of version {version!r} must be a non-negative number, got {weight!r}")
+        weights[version] = value
+    if weights and sum(weights.values()) == 0:
+        raise ValueError(f"{name}: weights must not all be zero")
+    return weights
+
+
+class _Routing:
+    """Immutable routing snapshot: bundles by version, default version and A/B split"""
+    __slots__ = ('bundles', 'default', 'weights', 'versions', 'cumulative')
+
+    def __init__(self, bundles, default, weights):
+        self.bundles = bundles
+        self.default = default
+        self.weights = weights
+        self.versions = tuple(weights)
+        total = float(sum(weights.values()))
+        self.cumulative = np.cumsum([weights[v] / total for v in self.versions]) if total > 0 else None
+
+
+class VersionStats:
+    """Request count, latency and coin/confidence distribution of one version"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.predictions = 0
+        self.requests = 0
+        # Requests routed here but answered by the fallback under load
+        self.shed = 0
+        self.seconds = 0.0
+        self.coins_sum = 0.0
+        self.coins_sq_sum = 0.0
+        self.confidence = Counter()
+        self.methods = Counter()
+
+    def record(self, results, seconds):
+        coins = [r["coins"] for r in results if "coins" in r]
+        with self._lock:
+            self.requests += 1
+            self.predictions += len(coins)
+            self.seconds += seconds
+            self.coins_sum += sum(coins)
+            self.coins_sq_sum += sum(c * c for c in coins)
+            self.confidence.update(r.get("confidence") for r in results if "coins" in r)
+            self.methods.update(r.get("breakdown", {}).get("method") for r in results if "coins" in r)
+
+    def record_shed(self):
+        with self._lock:
+            self.shed += 1
+
+    def snapshot(self):
+        with self._lock:
+            n = self.predictions
+            mean = self.coins_sum / n if n else None
+            return {
+                "requests": self.requests,
+                "predictions": n,
+                "shed": self.shed,
+                "mean_latency_ms": self.seconds / self.requests * 1000 if self.requests else None,
+                "mean_coins": mean,
+                "std_coins": max(self.coins_sq_sum / n - mean * mean, 0.0) ** 0.5 if n else None,
+                "confidence": dict(self.confidence),
+                "methods": dict(self.methods),
+            }
+
+
+class ModelRegistry:
+    """Versioned ModelBundles with explicit and weighted (A/B) routing"""
+
+    def __init__(self):
+        self._routing = _Routing({}, None, {})
+        # Serializes writers; readers only read self._routing
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @property
+    def default_version(self):
+        return self._routing.default
+
+    def bundle(self, version=None):
+        routing = self._routing
+        return routing.bundles.get(version if version is not None else routing.default)
+
+    def versions(self):
+        return dict(self._routing.bundles)
+
+    def publish(self, version, bundle, make_default=False):
+        """Add or replace one version; the first version published becomes the default"""
+        with self._lock:
+            routing = self._routing
+            bundles = dict(routing.bundles, **{version: bundle})
+            default = version if make_default or routing.default is None else routing.default
+            self._routing = _Routing(bundles, default, routing.weights)
+            self._stats.setdefault(version, VersionStats())
+
+    def set_routing(self, weights=None, default=None):
+        """Replace the A/B weights ({version: weight}, empty sends everything to the default) and/or the default"""
+        with self._lock:
+            routing = self._routing
+            if weights is None:
+                weights = routing.weights
+            for version in list(weights) + ([default] if default is not None else []):
+                # Non-string versions (lists, objects) are malformed, not a TypeError
+                validate_version(version)
+                if version not in routing.bundles:
+                    raise RequestValidationError(f"Unknown model_version '{version}'")
+            if any(isinstance(w, bool) or not isinstance(w, (int, float)) or w < 0 for w in weights.values()):
+                raise RequestValidationError("Traffic weights must be non-negative numbers")
+            weights = {version: weight for version, weight in weights.items() if weight > 0}
+            self._routing = _Routing(routing.bundles, default or routing.default, weights)
+
+    def route(self, payload, rng):
+        """(version, bundle) for a decoded request body; raises RequestValidationError for unknown versions"""
+        routing = self._routing
+        requested = payload.get('model_version') if isinstance(payload, dict) else None
+        if requested is not None:
+            # Lists and objects are not hashable: reject them as malformed, not as a TypeError
+            validate_version(requested)
+            if requested not in routing.bundles:
+                raise RequestValidationError(f"Unknown model_version '{requested}'")
+            return requested, routing.bundles[requested]
+        if routing.cumulative is None:
+            return routing.default, routing.bundles.get(routing.default)
+
+        user_id = payload.get('user_id') if isinstance(payload, dict) else None
+        if user_id is not None:
+            # Sticky assignment: the same user always lands in the same bucket
+            point = zlib.crc32(str(user_id).encode()) / 2**32
+        else:
+            point = rng.random()
+        index = min(int(np.searchsorted(routing.cumulative, point, side='right')), len(routing.versions) - 1)
+        version = routing.versions[index]
+        return version, routing.bundles[version]
+
+    def record(self, version, results, seconds):
+        """Per-version stats for one request's results"""
+        stats = self._stats.get(version)
+        if stats is None:
+            return
+        stats.record(results, seconds)
+        label = str(version)
+        MODEL_VERSION_PREDICT_SECONDS.observe(seconds, label)
+        for result in results:
+            if "coins" in result:
+                MODEL_VERSION_COINS.observe(result["coins"], label)
+
+    def record_shed(self, version):
+        """Count a request routed to version but shed by admission control"""
+        stats = self._stats.get(version)
+        if stats is not None:
+            stats.record_shed()
+
+    def stats(self):
+        routing = self._routing
+        return {
+            "default": routing.default,
+            "traffic": dict(routing.weights),
+            "versions": {
+                version: dict(
+                    self._stats[version].snapshot(),
+                    loaded=bundle is not None,
+                    source=bundle.source if bundle is not None else None,
+                    model_format=bundle.model_format if bundle is not None else None,
+                    precision=bundle.precision if bundle is not None else None,
+                    inference_engine=bundle.engine_name if bundle is not None else None,
+                )
+                for version, bundle in routing.bundles.items()
+            },
+        }
@@ -0,0 +1,340 @@
+"""Background retraining with an atomic model swap.
+
+``POST /retrain`` queues a job. The job trains in a separate process, so
+TensorFlow never competes with request threads for the GIL, and writes a
+full artifact set (h5, pickles, npz, metadata) to
+``<ML_MODEL_DIR>/retrained/<job_id>/``. When the job finishes, the serving
+process checks the candidate's holdout MAE against an absolute ceiling and
+against the current model. If it passes, the service loads the candidate
+into a new ModelBundle and publishes it with one reference assignment.
+Requests already in flight finish on the old bundle.
+
+Job state and the swap live in the process that took the request, so
+retraining needs a single-process deployment. gunicorn.conf.py disables
+it when it forks several workers.
+"""
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import numpy as np
+
+from decoding import ExpenseRequest, RequestValidationError, build_category_index
+from logs import get_logger
+from metrics import RETRAIN_JOBS
+
+logger = get_logger('retraining')
+
+# The copy of train_spending_model.py that ships with the service; first on
+# the path so a repo-level ml_model/ can never shadow it (spawned retraining
+# workers re-import this module and get the same path)
+TRAINER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ml_model')
+if TRAINER_DIR not in sys.path:
+    sys.path.insert(0, TRAINER_DIR)
+
+BASE_DATASET = os.path.join(TRAINER_DIR, 'finlit_expenses_dataset.csv')
+
+# Share of rows held out for validation, by the same row hash the streaming trainer uses
+HOLDOUT_SPLIT = 0.2
+
+
+class RetrainUnavailable(Exception):
+    """A job could not be started (e.g. the worker process died)"""
+
+
+def serving_predictions(model_dir, precision, X, categories):
+    """Raw output of the model artifact in model_dir on feature rows X, or None if there is none.
+
+    X holds the candidate's category ids; they are re-encoded with the
+    served model's own encoder.
+    """
+    from train_spending_model import SpendingBehaviorModel
+    from inference import load_artifact
+
+    name = 'spending_model.npz' if precision == 'float32' else f'spending_model_{precision}.npz'
+    npz_path = os.path.join(model_dir, name)
+    if os.path.exists(npz_path):
+        model, scaler, encoder = load_artifact(npz_path)
+        X = X.copy()
+        X[:, 1] = encoder.transform(categories)
+        return model(scaler.transform(X)).reshape(-1)
+    if os.path.exists(os.path.join(model_dir, 'spending_model.h5')):
+        served = SpendingBehaviorModel()
+        served.load_model(os.path.join(model_dir, ''))
+        X = X.copy()
+        X[:, 1] = served.category_encoder.transform(categories)
+        return served.model.predict(served.scaler.transform(X), verbose=0).reshape(-1)
+    return None
+
+
+def serving_holdout(serving_dir, base, encoder):
+    """(features, labels) of rows the serving model never trained on, with ids from encoder.
+
+    Models saved since holdout.npz exists carry their own. Older artifacts
+    were trained by train_spending_model.py on the bundled CSV, whose
+    held-out rows are the same seeded 80/20 split of the dataset.
+    """
+    from sklearn.model_selection import train_test_split
+    from train_spending_model import SpendingBehaviorModel, load_holdout
+
+    saved = load_holdout(serving_dir)
+    if saved is not None:
+        features, categories, labels = saved
+        features = features.copy()
+        features[:, 1] = encoder.transform(categories)
+        return features, labels
+    model = SpendingBehaviorModel()
+    model.category_encoder = encoder
+    _, test_index = train_test_split(np.arange(len(base)), test_size=0.2, random_state=42)
+    rows = base.iloc[test_index]
+    return model.prepare_features_from_frame(rows), model.prepare_labels_from_frame(rows)
+
+
+def run_training_job(job_dir, expenses, epochs, include_base, serving_dir, serving_precision='float32'):
+    """Train a candidate model in a worker process and report holdout metrics.
+
+    Both models are scored on rows neither trained on: the serving model's
+    own held-out rows (see serving_holdout), which are kept out of the
+    candidate's training data, plus a deterministic share of the supplied
+    expenses. The serving model is read from serving_dir at
+    serving_precision. The candidate saves the same rows as its holdout.npz
+    for the next comparison.
+
+    Runs top-level (not as a method) so the spawn start method can pickle it.
+    """
+    import pandas as pd
+    from train_spending_model import CATEGORIES, SpendingBehaviorModel, holdout_mask
+
+    model = SpendingBehaviorModel()
+    # A fixed category list keeps encoder ids identical to the served model
+    model.category_encoder.fit(CATEGORIES)
+    base = model.load_frame_from_csv(BASE_DATASET)
+    X_holdout, y_holdout = serving_holdout(serving_dir, base, model.category_encoder)
+    serving_rows = len(y_holdout)
+
+    frames = []
+    if include_base:
+        # Rows the serving model was validated on must not leak into the candidate
+        held_out = {row.tobytes() for row in X_holdout}
+        X_base = model.prepare_features_from_frame(base)
+        frames.append(base[[row.tobytes() not in held_out for row in X_base]])
+    supplied_rows = 0
+    if expenses:
+        supplied = pd.DataFrame.from_records(expenses)
+        supplied["timestamp"] = pd.to_datetime(supplied["timestamp"], format="ISO8601")
+        if supplied["budget_adherence"].isna().all():
+            supplied = supplied.drop(columns="budget_adherence")
+        # No served model has seen supplied rows, so a share of them is a fair holdout too
+        holdout = holdout_mask(0, len(supplied), HOLDOUT_SPLIT)
+        supplied_holdout = supplied[holdout]
+        supplied_rows = len(supplied_holdout)
+        X_holdout = np.concatenate([X_holdout, model.prepare_features_from_frame(supplied_holdout)])
+        y_holdout = np.concatenate([y_holdout, model.prepare_labels_from_frame(supplied_holdout)])
+        frames.append(supplied[~holdout])
+    train_df = pd.concat(frames, ignore_index=True)
+    if "budget_adherence" in train_df:
+        # Rows without a label signal get the prepare_labels default
+        train_df["budget_adherence"] = train_df["budget_adherence"].fillna(0.8)
+
+    started = time.perf_counter()
+    model.train_frame(train_df, epochs=epochs, verbose=0)
+    train_seconds = time.perf_counter() - started
+
+    candidate = model.model.predict(model.scaler.transform(X_holdout), verbose=0).reshape(-1)
+    current_mae = None
+    categories = model.category_encoder.inverse_transform(X_holdout[:, 1].astype(int))
+    current = serving_predictions(serving_dir, serving_precision, X_holdout, categories)
+    if current is not None:
+        current_mae = float(np.mean(np.abs(current - y_holdout)))
+
+    model.holdout = (X_holdout, y_holdout)
+    os.makedirs(job_dir, exist_ok=True)
+    model.save_model(os.path.join(job_dir, ''))
+    return {
+        "train_rows": int(len(train_df)),
+        "holdout_rows": int(len(y_holdout)),
+        "holdout_rows_from_serving_model": serving_rows,
+        "holdout_rows_from_supplied": supplied_rows,
+        "train_seconds": train_seconds,
+        "holdout_mae": float(np.mean(np.abs(candidate - y_holdout))),
+        "current_holdout_mae": current_mae,
+        "serving_model": serving_dir,
+    }
+
+
+class RetrainManager:
+    """Runs one retraining job at a time and swaps passing models into the service"""
+
+    def __init__(self, service, model_dir, categories, epochs=20, min_rows=50, max_mae=2.5, tolerance=0.05):
+        self.service = service
+        self.model_dir = model_dir
+        self.category_index = build_category_index(categories)
+        self.epochs = epochs
+        self.min_rows = min_rows
+        self.max_mae = max_mae
+        self.tolerance = tolerance
+        self.jobs = {}
+        self.latest = None
+        self._active = None
+        self._executor = None
+        self._lock = threading.Lock()
+        # Why /retrain is refused in this deployment, or None when it is available
+        self.disabled = None
+
+    def _pool(self):
+        if self._executor is None:
+            # spawn: forking a process that holds TensorFlow or serving threads is unsafe
+            self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _discard_pool(self):
+        # A killed worker breaks the executor for good; the next job starts a fresh one
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def parse_request(self, payload):
+        """Validate a /retrain body into (expenses, epochs, include_base)"""
+        payload = payload if payload is not None else {}
+        if not isinstance(payload, dict):
+            raise RequestValidationError("Retrain request must be a JSON object")
+
+        raw = payload.get('expenses', [])
+        if not isinstance(raw, list):
+            raise RequestValidationError("Field 'expenses' must be a list")
+        expenses = []
+        for i, row in enumerate(raw):
+            try:
+                expense = ExpenseRequest.from_json(row, self.category_index)
+                adherence = row.get('budget_adherence')
+                if adherence is not None and (isinstance(adherence, bool) or not isinstance(adherence, (int, float))):
+                    raise RequestValidationError("Field 'budget_adherence' must be a number")
+            except RequestValidationError as e:
+                raise RequestValidationError(f"expenses[{i}]: {e}") from None
+            if expense.category_id is None:
+                raise RequestValidationError(f"expenses[{i}]: unknown category '{expense.category}'")
+            expenses.append({
+                "amount": expense.amount,
+                "category": expense.category,
+                # Wall-clock time, as the service derives hour/weekday/month
+                "timestamp": datetime.fromisoformat(expense.timestamp.replace('Z', '+00:00'))
+                                     .replace(tzinfo=None).isoformat(),
+                "spending_velocity": expense.spending_velocity,
+                "category_frequency": expense.category_frequency,
+                "budget_ratio": expense.budget_ratio,
+                "budget_adherence": adherence,
+            })
+
+        include_base = payload.get('include_base_dataset', True)
+        if not isinstance(include_base, bool):
+            raise RequestValidationError("Field 'include_base_dataset' must be a boolean")
+        if not include_base and len(expenses) < self.min_rows:
+            raise RequestValidationError(
+                f"Need at least {self.min_rows} expenses to retrain without the base dataset"
+            )
+
+        epochs = payload.get('epochs', self.epochs)
+        if isinstance(epochs, bool) or not isinstance(epochs, int) or not 1 <= epochs <= 500:
+            raise RequestValidationError("Field 'epochs' must be an integer between 1 and 500")
+        return expenses, epochs, include_base
+
+    def submit(self, payload):
+        """Start a job; returns its status, or None when one is already running.
+        
+        Raises RetrainUnavailable when the worker process cannot take the job.
+        """
+        if self.disabled is not None:
+            raise RetrainUnavailable(self.disabled)
+        expenses, epochs, include_base = self.parse_request(payload)
+        with self._lock:
+            if self._active is not None:
+                return None
+            job_id = datetime.now().strftime('%Y%m%d%H%M%S') + '-' + uuid.uuid4().hex[:6]
+            job = {
+                "job_id": job_id,
+                "status": "running",
+                "submitted_at": datetime.now().isoformat(),
+                "finished_at": None,
+                "epochs": epochs,
+                "supplied_rows": len(expenses),
+                "include_base_dataset": include_base,
+                "metrics": None,
+                "error": None,
+            }
+            job_dir = os.path.join(self.model_dir, 'retrained', job_id)
+            # Compare with whatever is serving now, which may be an earlier retrained model
+            serving = self.service.bundle
+            serving_dir = serving.source if serving is not None else self.model_dir
+            serving_precision = serving.precision if serving is not None else 'float32'
+            try:
+                future = self._pool().submit(
+                    run_training_job, job_dir, expenses, epochs, include_base, serving_dir, serving_precision
+                )
+            except Exception as e:
+                logger.exception("Could not start retraining job", extra={"job_id": job_id})
+                self._discard_pool()
+                raise RetrainUnavailable(f"Could not start a retraining job: {e}") from e
+            self.jobs[job_id] = job
+            self.latest = job_id
+            self._active = job_id
+        future.add_done_callback(lambda f: self._finish(job_id, job_dir, f))
+        return dict(job)
+
+    def _finish(self, job_id, job_dir, future):
+        status, metrics, error = 'failed', None, None
+        try:
+            metrics = future.result()
+            reason = self.rejection_reason(metrics)
+            if reason is not None:
+                status, error = 'rejected', reason
+            else:
+                bundle = self.service.load_bundle(job_dir)
+                self.service.swap_bundle(bundle)
+                status = 'succeeded'
+                logger.info("Retrained model is now serving", extra={"job_id": job_id, "metrics": metrics})
+        except BrokenProcessPool as e:
+            error = f"Retraining worker died: {e}"
+            logger.exception("Retraining job failed", extra={"job_id": job_id})
+            with self._lock:
+                self._discard_pool()
+        except Exception as e:
+            error = str(e)
+            logger.exception("Retraining job failed", extra={"job_id": job_id})
+        if status == 'rejected':
+            logger.warning("Retrained model rejected", extra={"job_id": job_id, "reason": error})
+
+        RETRAIN_JOBS.inc(label=status)
+        with self._lock:
+            self.jobs[job_id].update(
+                status=status, metrics=metrics, error=error, finished_at=datetime.now().isoformat()
+            )
+            self._active = None
+
+    def rejection_reason(self, metrics):
+        """Why a candidate must not be served, or None if it passes validation"""
+        mae = metrics['holdout_mae']
+        if not np.isfinite(mae) or mae > self.max_mae:
+            return f"Holdout MAE {mae:.4f} exceeds the limit of {self.max_mae}"
+        current = metrics['current_holdout_mae']
+        if current is not None and mae > current * (1 + self.tolerance):
+            return f"Holdout MAE {mae:.4f} is worse than the serving model's {current:.4f}"
+        return None
+
+    def status(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "disabled": self.disabled,
+                "running": self._active,
+                "latest": dict(self.jobs[self.latest]) if self.latest else None,
+            }
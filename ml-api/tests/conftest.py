@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The service modules import each other as top-level modules (run from ml-api/)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
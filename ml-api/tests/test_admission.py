@@ -0,0 +1,75 @@
+import pytest
+
+import admission as admission_module
+from admission import AdmissionController
+
+
+def test_requests_over_the_concurrency_limit_are_shed():
+    controller = AdmissionController(max_in_flight=2, deadline_seconds=0)
+    first, second = controller.admit(), controller.admit()
+    third = controller.admit()
+    assert first.admitted and second.admitted
+    assert not third.admitted and third.reason == 'concurrency'
+
+    controller.release(first)
+    assert controller.admit().admitted
+    assert controller.stats()["shed"] == {'concurrency': 1, 'deadline': 0}
+
+
+def test_requests_predicted_to_miss_their_deadline_are_shed():
+    controller = AdmissionController(max_in_flight=0, deadline_seconds=0.1, workers=1)
+    controller.cost_seconds = 0.03
+    held = [controller.admit() for _ in range(3)]
+    assert all(ticket.admitted for ticket in held)
+    # A fourth request would finish after 4 x 30 ms
+    ticket = controller.admit()
+    assert not ticket.admitted and ticket.reason == 'deadline'
+    # ... which a longer per-request deadline allows
+    assert controller.admit(deadline_seconds=0.5).admitted
+    # Time already spent counts against the deadline
+    controller = AdmissionController(max_in_flight=0, deadline_seconds=0.1)
+    controller.cost_seconds = 0.01
+    controller.admit()
+    assert not controller.admit(waited=0.095).admitted
+
+
+def test_more_workers_absorb_more_concurrency():
+    controller = AdmissionController(max_in_flight=0, deadline_seconds=0.1, workers=4)
+    controller.cost_seconds = 0.03
+    # The 13th finishes after 13/4 x 30 ms, the 14th would miss 100 ms
+    assert all(controller.admit().admitted for _ in range(13))
+    assert not controller.admit().admitted
+
+
+def test_an_idle_service_always_admits():
+    controller = AdmissionController(max_in_flight=0, deadline_seconds=0.01)
+    controller.cost_seconds = 10.0
+    assert controller.admit().admitted
+
+
+def test_zero_disables_both_checks():
+    controller = AdmissionController(max_in_flight=0, deadline_seconds=0)
+    controller.cost_seconds = 10.0
+    assert all(controller.admit().admitted for _ in range(100))
+
+
+def test_release_learns_the_cost_of_a_request(monkeypatch):
+    clock = iter([1.0, 1.05])
+    monkeypatch.setattr(admission_module.time, 'perf_counter', lambda: next(clock))
+    controller = AdmissionController(workers=1)
+    controller.release(controller.admit())
+    assert controller.cost_seconds == pytest.approx(0.05)
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_shed_tickets_do_not_free_slots():
+    controller = AdmissionController(max_in_flight=1, deadline_seconds=0)
+    held = controller.admit()
+    shed = controller.admit()
+    controller.release(shed)
+    assert controller.stats()["in_flight"] == 1
+    assert not controller.admit().admitted
+    controller.release(held)
+    stats = controller.stats()
+    assert stats["admitted"] == 1
+    assert stats["shed_rate"] == pytest.approx(2 / 3)
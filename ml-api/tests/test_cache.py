@@ -0,0 +1,92 @@
+import pytest
+
+from cache import PredictionCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr('cache.time.monotonic', clock)
+    return clock
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = PredictionCache(ttl_seconds=10)
+    cache.put('a', 1)
+
+    clock.now += 10
+    assert cache.get('a') == 1
+
+    clock.now += 0.001
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expirations'], stats['size']) == (1, 1, 1, 0)
+
+
+def test_put_refreshes_the_ttl(clock):
+    cache = PredictionCache(ttl_seconds=10)
+    cache.put('a', 1)
+    clock.now += 8
+    cache.put('a', 2)
+    clock.now += 8
+
+    assert cache.get('a') == 2
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = PredictionCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_clear_drops_every_entry(clock):
+    cache = PredictionCache()
+    cache.put('a', 1)
+    cache.clear()
+
+    assert cache.get('a') is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_key_buckets_amount_and_ratios():
+    cache = PredictionCache(amount_step=0.5, ratio_step=0.01)
+    features = [12.26, 3, 9, 4, 3, 1.004, 0.5, 0.791]
+
+    assert cache.key(features) == cache.key([12.49, 3, 9, 4, 3, 1.009, 0.5, 0.799])
+    assert cache.key(features) != cache.key([12.5, 3, 9, 4, 3, 1.004, 0.5, 0.791])
+    assert cache.key(features) != cache.key([12.26, 3, 9, 4, 3, 1.004, 0.5, 0.8])
+    assert cache.key(features) != cache.key([12.26, 4, 9, 4, 3, 1.004, 0.5, 0.791])
+
+
+
+@pytest.mark.parametrize('index, below, at, above, nudge', [
+    (0, 99.9, 100.0, 100.1, 0.2),  # analyze_factors: amount < 100
+    (7, 0.795, 0.8, 0.805, 0.001),  # analyze_factors: budget_ratio < 0.8
+    (7, 1.195, 1.2, 1.205, 0.001),  # apply_minimal_adjustments: budget_ratio > 1.2
+    (7, 1.495, 1.5, 1.505, 0.001),  # apply_minimal_adjustments: budget_ratio > 1.5
+])
+def test_rule_thresholds_split_buckets(index, below, at, above, nudge):
+    cache = PredictionCache(amount_step=0.5, ratio_step=0.01)
+
+    def key(value):
+        features = [12.0, 3, 9, 4, 3, 1.0, 0.5, 0.5]
+        features[index] = value
+        return cache.key(features)
+
+    assert len({key(below), key(at), key(above)}) == 3
+    # Values on the same side of every threshold still share a bucket
+    assert key(above) == key(above + nudge)
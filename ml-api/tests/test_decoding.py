@@ -0,0 +1,75 @@
+import pytest
+
+from decoding import ExpenseRequest, RequestValidationError, build_category_index
+
+VALID = {'amount': 12.5, 'category': 'Food', 'timestamp': '2025-03-14T09:30:00Z'}
+
+
+def decode(**changes):
+    payload = {k: v for k, v in dict(VALID, **changes).items() if v is not None}
+    return ExpenseRequest.from_json(payload, build_category_index(['Food', 'Transport']))
+
+
+def test_valid_payload_is_decoded_once():
+    expense = decode()
+
+    assert expense.category_id == 0
+    assert (expense.hour, expense.day_of_week, expense.month) == (9, 4, 3)
+    assert expense.features() == [12.5, 0, 9, 4, 3, 1.0, 0.5, 0.5]
+
+
+def test_unknown_category_has_no_id():
+    assert decode(category='Rent').category_id is None
+
+
+@pytest.mark.parametrize('payload', [[], 'amount=1', None])
+def test_rejects_non_objects(payload):
+    with pytest.raises(RequestValidationError, match="JSON object"):
+        ExpenseRequest.from_json(payload)
+
+
+@pytest.mark.parametrize('changes, message', [
+    ({'amount': None}, "Missing required field: amount"),
+    ({'amount': 'lots'}, "'amount' must be a number"),
+    ({'amount': True}, "'amount' must be a number"),
+    ({'amount': float('nan')}, "'amount' must be finite"),
+    ({'amount': float('inf')}, "'amount' must be finite"),
+    ({'category': ''}, "'category' must be a non-empty string"),
+    ({'category': 3}, "'category' must be a non-empty string"),
+    ({'timestamp': None}, "Missing required field: timestamp"),
+    ({'timestamp': 1710408600}, "Missing required field: timestamp"),
+    ({'timestamp': 'yesterday'}, "Invalid ISO 8601 timestamp"),
+    ({'user_id': ''}, "'user_id' must be a non-empty string"),
+    ({'user_id': 42}, "'user_id' must be a non-empty string"),
+    ({'budget_ratio': 'high'}, "'budget_ratio' must be a number"),
+])
+def test_rejects_malformed_fields(changes, message):
+    with pytest.raises(RequestValidationError, match=message):
+        decode(**changes)
+
+
+def test_validation_errors_are_value_errors():
+    assert issubclass(RequestValidationError, ValueError)
+
+
+def test_user_features_fill_only_missing_fields():
+    calls = []
+
+    def user_features(user_id, amount, category, when):
+        calls.append((user_id, amount, category, when.hour))
+        return {'spending_velocity': 3.0, 'category_frequency': 0.9, 'budget_ratio': 0.1}
+
+    expense = ExpenseRequest.from_json(dict(VALID, user_id='u1', budget_ratio=0.7),
+                                       user_features=user_features)
+
+    assert calls == [('u1', 12.5, 'Food', 9)]
+    assert (expense.spending_velocity, expense.category_frequency, expense.budget_ratio) == (3.0, 0.9, 0.7)
+
+
+def test_user_features_skipped_without_user_id():
+    def user_features(*args):
+        raise AssertionError("looked up features for an anonymous request")
+
+    expense = ExpenseRequest.from_json(VALID, user_features=user_features)
+
+    assert expense.spending_velocity == 1.0
@@ -0,0 +1,61 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+from feature_store import FeatureStore
+
+NOW = datetime(2025, 3, 14, 12, 0)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = FeatureStore(str(tmp_path / 'features.sqlite3'), monthly_budget=1000.0)
+    store.record_many([
+        ('u1', 100.0, 'food', NOW - timedelta(days=1)),
+        ('u1', 50.0, 'food', NOW - timedelta(days=2)),
+        ('u1', 25.0, 'travel', NOW - timedelta(days=40)),
+        ('u2', 10.0, 'food', NOW),
+    ])
+    return store
+
+
+def test_features_follow_the_recorded_history(store):
+    features = store.features('u1', 200.0, 'food', NOW)
+
+    assert features == {
+        "spending_velocity": 2 / 30,
+        "category_frequency": 2 / 3,
+        "budget_ratio": (150.0 + 200.0) / 1000.0,
+    }
+
+
+def test_unknown_users_get_neutral_features(store):
+    assert store.features('nobody', 100.0, 'food', NOW) == {
+        "spending_velocity": 0.0, "category_frequency": 0.5, "budget_ratio": 0.1,
+    }
+
+
+def test_threads_read_concurrently_on_their_own_connections(store):
+    connections = set()
+    barrier = threading.Barrier(4)
+
+    def lookup(_):
+        barrier.wait()
+        connections.add(id(store._connect()))
+        return store.features('u1', 200.0, 'food', NOW)
+
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lookup, range(4)))
+
+    assert len(connections) == 4
+    assert all(result == results[0] for result in results)
+
+
+def test_reset_connection_reopens_and_keeps_the_data(store):
+    before = store._connect()
+    store.reset_connection()
+
+    assert store._connect() is not before
+    assert store.stats()["expenses"] == 4
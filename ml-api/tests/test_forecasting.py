@@ -0,0 +1,85 @@
+import math
+import random
+import warnings
+
+import pytest
+
+from forecasting import forecast_spending
+
+
+def js_round(value):
+    return math.floor(value + 0.5)
+
+
+def js_linear_regression(data, forecast_days):
+    """Line-for-line port of linearRegression in frontend/src/services/mlCoinService.js"""
+    n = len(data)
+    sum_x = sum(range(n))
+    sum_y = sum(data)
+    sum_xy = sum(i * val for i, val in enumerate(data))
+    sum_xx = sum(i * i for i in range(n))
+
+    slope = (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x * sum_x)
+    intercept = (sum_y - slope * sum_x) / n
+
+    total_prediction = sum(max(0, slope * i + intercept) for i in range(n, n + forecast_days))
+
+    trend = 'increasing' if slope > 1 else 'decreasing' if slope < -1 else 'stable'
+    variance = sum((val - (slope * i + intercept)) ** 2 for i, val in enumerate(data)) / n
+    confidence = 'high' if variance < 100 else 'medium' if variance < 500 else 'low'
+
+    return {
+        'prediction': js_round(total_prediction),
+        'confidence': confidence,
+        'trend': trend,
+        'dailyAverage': js_round(total_prediction / forecast_days),
+        'slope': js_round(slope * 100) / 100,
+    }
+
+
+def random_series(rng, users):
+    series = []
+    for _ in range(users):
+        days = rng.randint(2, 60)
+        base, drift, noise = rng.uniform(0, 80), rng.uniform(-4, 4), rng.uniform(0, 40)
+        series.append([max(0.0, base + drift * i + rng.gauss(0, noise)) for i in range(days)])
+    return series
+
+
+@pytest.mark.parametrize('forecast_days', [1, 7, 30])
+def test_matches_the_frontend_linear_regression(forecast_days):
+    series = random_series(random.Random(forecast_days), 300)
+
+    results = forecast_spending(series, forecast_days, expense_counts=[10] * len(series))
+
+    assert results == [js_linear_regression(s, forecast_days) for s in series]
+
+
+def test_short_histories_get_the_insufficient_data_result():
+    series = [[5.0, 6.0, 7.0], [5.0] * 8]
+
+    results = forecast_spending(series, expense_counts=[6, 7])
+
+    assert results[0] == {"prediction": 0, "confidence": "low", "trend": "insufficient_data"}
+    assert results[1] == js_linear_regression(series[1], 30)
+
+
+def test_users_split_across_chunks_keep_their_order(monkeypatch):
+    monkeypatch.setattr('forecasting.CHUNK_USERS', 7)
+    series = random_series(random.Random(1), 20)
+
+    results = forecast_spending(series, expense_counts=[10] * len(series))
+
+    assert results == [js_linear_regression(s, 30) for s in series]
+
+
+def test_rejects_non_finite_values():
+    with pytest.raises(ValueError, match="finite"):
+        forecast_spending([[1.0, float('nan')] + [1.0] * 6])
+
+
+def test_overflowing_values_raise_instead_of_warning():
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        with pytest.raises(ValueError, match="too large"):
+            forecast_spending([[1e307] * 5 + [-1e307] * 5])
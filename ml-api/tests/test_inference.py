@@ -0,0 +1,86 @@
+import csv
+import json
+import os
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from decoding import ExpenseRequest, build_category_index
+from inference import DenseStack, confidence_label, load_artifact
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'ml_model', 'ml_model')
+DATASET = os.path.join(os.path.dirname(__file__), '..', 'ml_model', 'finlit_expenses_dataset.csv')
+
+
+class Dense:
+    """The parts of a Keras Dense layer DenseStack.from_keras reads"""
+
+    def __init__(self, kernel, bias, activation='relu'):
+        self.kernel = np.asarray(kernel, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.activation = activation
+
+    def get_weights(self):
+        return [self.kernel, self.bias]
+
+    def get_config(self):
+        return {'activation': self.activation}
+
+
+class Dropout:
+    def __init__(self, rate):
+        self.rate = rate
+
+
+class Model:
+    def __init__(self, *layers):
+        self.layers = list(layers)
+
+
+def test_from_keras_attaches_dropout_to_the_preceding_dense():
+    model = Model(
+        Dense(np.eye(2), [0.0, 0.0]), Dropout(0.25),
+        Dense([[1.0], [1.0]], [0.5], 'linear'),
+    )
+    stack = DenseStack.from_keras(model)
+
+    assert stack.dropout_rates == [0.25, 0.0]
+    np.testing.assert_allclose(stack(np.array([[1.0, -2.0]])), [[1.5]])
+
+
+def test_from_keras_rejects_leading_dropout():
+    model = Model(Dropout(0.2), Dense(np.eye(2), [0.0, 0.0]))
+
+    with pytest.raises(ValueError, match="Dropout before the first Dense layer"):
+        DenseStack.from_keras(model)
+
+
+def test_from_keras_rejects_unknown_layers():
+    class BatchNormalization:
+        pass
+
+    with pytest.raises(ValueError, match="BatchNormalization"):
+        DenseStack.from_keras(Model(BatchNormalization()))
+
+
+def test_confidence_label_bounds_are_exclusive():
+    assert [confidence_label(std, (0.5, 1.0)) for std in (0.2, 0.5, 0.9, 1.0, 3.0)] == \
+        ['high', 'medium', 'medium', 'low', 'low']
+
+
+def test_shipped_model_confidence_labels_vary():
+    stack, scaler, encoder = load_artifact(os.path.join(MODEL_DIR, 'spending_model.npz'))
+    with open(os.path.join(MODEL_DIR, 'model_metadata.json')) as f:
+        calibration = json.load(f)['confidence']
+    category_index = build_category_index(encoder.classes_)
+    with open(DATASET, newline='') as f:
+        rows = [ExpenseRequest.from_json(dict(row, amount=float(row['amount'])), category_index).features()
+                for row in csv.DictReader(f)]
+
+    _, stds = stack.sample(scaler.transform(np.array(rows, dtype=np.float64)), 32, np.random.default_rng(0))
+    labels = Counter(confidence_label(std, (calibration['std_high'], calibration['std_medium'])) for std in stds)
+
+    # Calibrated on thirds of the holdout spread: no label dominates
+    assert set(labels) == {'high', 'medium', 'low'}
+    assert max(labels.values()) < 0.6 * len(rows)
@@ -0,0 +1,63 @@
+import csv
+import glob
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+from prediction_log import COLUMNS, PredictionLog
+
+
+def expense(amount):
+    return SimpleNamespace(amount=amount, category='food', when=datetime(2025, 3, 14, 12, 30),
+                           spending_velocity=2.0, category_frequency=0.3, budget_ratio=0.4, user_id=None)
+
+
+def result(coins):
+    return {"coins": coins, "confidence": "medium", "breakdown": {"method": "neural_network_primary"}}
+
+
+def read_rows(directory):
+    rows = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.csv'))):
+        with open(path, newline='') as f:
+            reader = csv.reader(f)
+            assert tuple(next(reader)) == COLUMNS
+            rows.extend(reader)
+    return rows
+
+
+def test_close_writes_out_the_buffer(tmp_path):
+    log = PredictionLog(str(tmp_path), flush_interval=3600)
+    log.record_many((expense(i), result(i)) for i in range(5))
+    log.close()
+    assert [row[0] for row in read_rows(tmp_path)] == ['0', '1', '2', '3', '4']
+    assert log.stats()["written"] == 5
+
+
+def test_full_buffer_drops_instead_of_blocking(tmp_path):
+    log = PredictionLog(str(tmp_path), capacity=4, flush_interval=3600)
+    log._wake.set = lambda: None  # keep the writer asleep so the buffer stays full
+    assert log.record_many((expense(i), result(i)) for i in range(6)) == 4
+    assert log.stats()["dropped"] == 2
+    del log._wake.set
+    log.close()
+    assert len(read_rows(tmp_path)) == 4
+
+
+def test_files_rotate_after_max_rows(tmp_path):
+    log = PredictionLog(str(tmp_path), flush_interval=3600, max_file_rows=2)
+    log.record_many((expense(i), result(i)) for i in range(5))
+    log.close()
+    assert len(glob.glob(os.path.join(tmp_path, '*.csv'))) == 3
+    assert len(read_rows(tmp_path)) == 5
+
+
+def test_records_after_close_are_dropped_and_counted(tmp_path):
+    log = PredictionLog(str(tmp_path), flush_interval=3600)
+    log.record(expense(1), result(1))
+    log.close()
+
+    assert log.record(expense(2), result(2)) is False
+    assert log.stats()["dropped"] == 1
+    assert log.stats()["buffered"] == 0
+    assert len(read_rows(tmp_path)) == 1
@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+from decoding import RequestValidationError
+from registry import ModelRegistry, parse_traffic
+
+
+class Bundle:
+    """The ModelBundle attributes the registry reports"""
+    model_format = 'npz'
+    precision = 'float32'
+    engine_name = 'numpy'
+
+    def __init__(self, source):
+        self.source = source
+
+    def __eq__(self, other):
+        return isinstance(other, Bundle) and other.source == self.source
+
+
+@pytest.fixture
+def registry():
+    registry = ModelRegistry()
+    registry.publish('1.0', Bundle('models/1.0'))
+    registry.publish('2.0', Bundle('models/2.0'))
+    return registry
+
+
+def test_first_published_version_is_the_default(registry):
+    assert registry.default_version == '1.0'
+    assert registry.route({}, random.Random(0)) == ('1.0', Bundle('models/1.0'))
+
+
+def test_explicit_version_wins_over_the_split(registry):
+    registry.set_routing({'1.0': 1})
+    assert registry.route({'model_version': '2.0'}, random.Random(0)) == ('2.0', Bundle('models/2.0'))
+
+
+@pytest.mark.parametrize('version', ['3.0', ['1.0'], {'v': 1}, 2.0, '', '../1.0'])
+def test_unknown_or_malformed_versions_are_validation_errors(registry, version):
+    with pytest.raises(RequestValidationError):
+        registry.route({'model_version': version}, random.Random(0))
+
+
+def test_weighted_split_follows_the_weights(registry):
+    registry.set_routing({'1.0': 90, '2.0': 10})
+    rng = random.Random(0)
+    versions = [registry.route({}, rng)[0] for _ in range(10000)]
+    assert versions.count('2.0') / len(versions) == pytest.approx(0.1, abs=0.02)
+
+
+def test_users_stay_on_one_version(registry):
+    registry.set_routing({'1.0': 50, '2.0': 50})
+    rng = random.Random(0)
+    for user in range(50):
+        assigned = {registry.route({'user_id': user}, rng)[0] for _ in range(5)}
+        assert len(assigned) == 1
+
+
+def test_zero_weights_are_never_routed_to(registry):
+    registry.set_routing({'1.0': 0, '2.0': 1})
+    rng = random.Random(0)
+    assert {registry.route({}, rng)[0] for _ in range(200)} == {'2.0'}
+
+
+@pytest.mark.parametrize('weights, default', [({'3.0': 1}, None), ({'1.0': -1}, None),
+                                              ({'1.0': 'x'}, None), ({'1.0': True}, None), (None, '3.0'),
+                                              (None, ['1.0']), (None, {'1.0': 1}), (None, 1.0)])
+def test_invalid_routing_is_rejected_and_leaves_the_split_unchanged(registry, weights, default):
+    registry.set_routing({'1.0': 1})
+    with pytest.raises(RequestValidationError):
+        registry.set_routing(weights, default)
+    assert registry.stats()['traffic'] == {'1.0': 1}
+    assert registry.default_version == '1.0'
+
+
+def test_stats_count_predictions_per_version(registry):
+    registry.record('2.0', [{'coins': 10, 'confidence': 'high', 'breakdown': {'method': 'neural_network_primary'}},
+                            {'coins': 12, 'confidence': 'low', 'breakdown': {'method': 'simple_fallback'}},
+                            {'error': 'bad row'}], 0.002)
+    stats = registry.stats()['versions']['2.0']
+    assert stats['requests'] == 1
+    assert stats['predictions'] == 2
+    assert stats['mean_coins'] == 11
+    assert stats['methods'] == {'neural_network_primary': 1, 'simple_fallback': 1}
+
+
+def test_traffic_setting_is_parsed():
+    assert parse_traffic('1.0=90, 2.0=10') == {'1.0': 90.0, '2.0': 10.0}
+    assert parse_traffic('') == {}
+
+
+@pytest.mark.parametrize('spec', ['v2=abc', 'v2', '=5', 'v1=-1', 'v1=nan', 'v1=inf', 'v1=0,v2=0'])
+def test_malformed_traffic_setting_names_the_variable(spec):
+    with pytest.raises(ValueError, match='ML_MODEL_TRAFFIC'):
+        parse_traffic(spec)
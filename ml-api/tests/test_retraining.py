@@ -0,0 +1,141 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from retraining import RetrainManager, RetrainUnavailable
+
+CATEGORIES = ['education', 'entertainment', 'food', 'healthcare', 'other',
+              'savings', 'shopping', 'transportation', 'travel', 'utilities']
+
+
+class FakeService:
+    def __init__(self):
+        self.bundle = None
+        self.swapped = []
+
+    def load_bundle(self, path):
+        return path
+
+    def swap_bundle(self, bundle):
+        self.bundle = bundle
+        self.swapped.append(bundle)
+
+
+class FakePool:
+    """Executor stand-in: hands back futures the test completes by hand"""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.futures = []
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        if self.error is not None:
+            raise self.error
+        self.args = args
+        future = Future()
+        self.futures.append(future)
+        return future
+
+    def shutdown(self, wait=True):
+        self.shut_down = True
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return RetrainManager(FakeService(), str(tmp_path), CATEGORIES, max_mae=2.5, tolerance=0.05)
+
+
+def metrics(holdout_mae, current_holdout_mae):
+    return {"train_rows": 80, "holdout_rows": 20, "train_seconds": 1.0,
+            "holdout_mae": holdout_mae, "current_holdout_mae": current_holdout_mae}
+
+
+def test_broken_pool_is_reported_and_replaced(manager):
+    broken = FakePool(BrokenProcessPool("worker killed"))
+    manager._executor = broken
+
+    with pytest.raises(RetrainUnavailable):
+        manager.submit({})
+    assert broken.shut_down
+    assert manager._executor is None
+    assert manager.stats()["running"] is None
+    assert manager.jobs == {}
+
+    pool = FakePool()
+    manager._executor = pool
+    job = manager.submit({})
+    assert job["status"] == "running"
+    assert manager.stats()["running"] == job["job_id"]
+
+
+def test_second_job_is_refused_while_one_runs(manager):
+    manager._executor = FakePool()
+    assert manager.submit({}) is not None
+    assert manager.submit({}) is None
+
+
+def test_worker_death_mid_job_fails_it_and_frees_the_slot(manager):
+    pool = FakePool()
+    manager._executor = pool
+    job = manager.submit({})
+    pool.futures[0].set_exception(BrokenProcessPool("worker killed"))
+
+    status = manager.status(job["job_id"])
+    assert status["status"] == "failed"
+    assert "died" in status["error"]
+    assert pool.shut_down and manager._executor is None
+    assert manager.stats()["running"] is None
+
+
+@pytest.mark.parametrize("holdout_mae, current", [(3.0, None), (float('nan'), None), (1.2, 1.0)])
+def test_rejected_candidates_are_not_swapped(manager, holdout_mae, current):
+    pool = FakePool()
+    manager._executor = pool
+    job = manager.submit({})
+    pool.futures[0].set_result(metrics(holdout_mae, current))
+
+    status = manager.status(job["job_id"])
+    assert status["status"] == "rejected"
+    assert manager.service.swapped == []
+    assert manager.stats()["running"] is None
+
+
+def test_passing_candidate_is_swapped_in(manager):
+    pool = FakePool()
+    manager._executor = pool
+    job = manager.submit({})
+    pool.futures[0].set_result(metrics(1.02, 1.0))
+
+    assert manager.status(job["job_id"])["status"] == "succeeded"
+    assert len(manager.service.swapped) == 1
+
+
+def test_invalid_requests_are_rejected_before_submitting(manager):
+    manager._executor = FakePool(BrokenProcessPool("must not be reached"))
+    with pytest.raises(Exception, match="epochs"):
+        manager.submit({"epochs": 0})
+    with pytest.raises(Exception, match="expenses"):
+        manager.submit({"include_base_dataset": False, "expenses": []})
+
+
+def test_candidates_are_compared_with_the_serving_model(manager):
+    class Bundle:
+        source = "/models/retrained/earlier"
+        precision = "int8"
+
+    manager.service.bundle = Bundle()
+    pool = FakePool()
+    manager._executor = pool
+    manager.submit({})
+    serving_dir, serving_precision = pool.args[-2:]
+    assert (serving_dir, serving_precision) == ("/models/retrained/earlier", "int8")
+
+
+def test_disabled_deployments_refuse_jobs(manager):
+    manager.disabled = "Retraining needs a single worker"
+    manager._executor = FakePool()
+    with pytest.raises(RetrainUnavailable, match="single worker"):
+        manager.submit({})
+    assert manager.stats()["disabled"] == "Retraining needs a single worker"